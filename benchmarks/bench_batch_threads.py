@@ -0,0 +1,41 @@
+"""Benchmark multi-thread scaling of the batch encryption path.
+
+Usage:
+
+    python benchmarks/bench_batch_threads.py --rows 200000 --threads 1 2 4 8
+"""
+import argparse
+import secrets
+import time
+
+from tink_fpe import CharacterGroup
+from tink_fpe import ExecutionMode
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="number of distinct values to encrypt")
+    parser.add_argument("--length", type=int, default=16, help="length of each value")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8], help="thread counts to compare")
+    args = parser.parse_args()
+
+    fpe = FpeFf3(key=secrets.token_bytes(32), alphabet=CharacterGroup.ALPHANUMERIC)
+    plaintexts = [f"{i:0{args.length}d}".encode() for i in range(args.rows)]
+
+    fpe.encrypt_batch(plaintexts[:1000])  # warm up
+    start = time.perf_counter()
+    fpe.encrypt_batch(plaintexts)
+    serial = time.perf_counter() - start
+    print(f"serial      {serial:8.2f}s {args.rows / serial:12,.0f} values/s")
+
+    for threads in args.threads:
+        start = time.perf_counter()
+        fpe.encrypt_batch(plaintexts, mode=ExecutionMode.THREAD, max_workers=threads)
+        elapsed = time.perf_counter() - start
+        print(f"{threads:2d} threads  {elapsed:8.2f}s {args.rows / elapsed:12,.0f} values/s  x{serial / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
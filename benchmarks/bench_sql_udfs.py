@@ -0,0 +1,77 @@
+"""Benchmark per-row vs vectorized FPE functions in DuckDB and sqlite3.
+
+Usage:
+
+    python benchmarks/bench_sql_udfs.py --rows 2000000 --distinct 100000
+"""
+import argparse
+import secrets
+import sqlite3
+import time
+import typing as t
+
+import duckdb
+
+from tink_fpe import CharacterGroup
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import register_duckdb
+from tink_fpe import register_sqlite
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000, help="number of rows to encrypt")
+    parser.add_argument("--distinct", type=int, default=100_000, help="number of distinct values")
+    parser.add_argument("--length", type=int, default=16, help="length of each value")
+    args = parser.parse_args()
+
+    params = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+    fpe = FpeFf3(key=secrets.token_bytes(32), alphabet=CharacterGroup.ALPHANUMERIC)
+    rows = [(f"{i % args.distinct:0{args.length}d}", "acme") for i in range(args.rows)]
+    query = "SELECT count(DISTINCT fpe_encrypt(value, key_ref, NULL)) FROM data"
+
+    def per_row(value: str, key_ref: str, tweak: str) -> str:
+        return fpe.encrypt(value.encode(), params).decode()
+
+    per_row_connection = _duckdb_table(args)
+    per_row_connection.create_function(
+        "fpe_encrypt", per_row, ["VARCHAR", "VARCHAR", "VARCHAR"], "VARCHAR", null_handling="special"
+    )
+    _report("duckdb per-row", args.rows, lambda: per_row_connection.execute(query).fetchone())
+
+    vectorized_connection = _duckdb_table(args)
+    register_duckdb(vectorized_connection, lambda key_ref: fpe, params)
+    _report("duckdb vectorized", args.rows, lambda: vectorized_connection.execute(query).fetchone())
+
+    sqlite = sqlite3.connect(":memory:")
+    sqlite.execute("CREATE TABLE data (value TEXT, key_ref TEXT)")
+    sqlite.executemany("INSERT INTO data VALUES (?, ?)", rows)
+    sqlite.create_function("fpe_encrypt", 3, per_row)
+    _report("sqlite3 per-row", args.rows, lambda: sqlite.execute(query).fetchone())
+
+    register_sqlite(sqlite, lambda key_ref: fpe, params)
+    _report("sqlite3 cached", args.rows, lambda: sqlite.execute(query).fetchone())
+
+
+def _duckdb_table(args: argparse.Namespace) -> duckdb.DuckDBPyConnection:
+    connection = duckdb.connect()
+    connection.execute(
+        "CREATE TABLE data AS SELECT lpad((i % $distinct)::VARCHAR, $length, '0') AS value, 'acme' AS key_ref "
+        "FROM range($rows) t(i)",
+        {"rows": args.rows, "distinct": args.distinct, "length": args.length},
+    )
+    return connection
+
+
+def _report(name: str, rows: int, run: t.Callable[[], object]) -> None:
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    print(f"{name:18s} {elapsed:8.2f}s {rows / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,48 @@
 """Tink FPE Python."""
 
+from tink_fpe import _batch
+from tink_fpe import _dataset
 from tink_fpe import _fpe
 from tink_fpe import _fpe_ffx_key_manager
 from tink_fpe import _fpe_key_templates
+from tink_fpe import _keyring
+from tink_fpe import _keyset_cache
+from tink_fpe import _metrics
+from tink_fpe import _planner
+from tink_fpe import _predicate
+from tink_fpe import _pseudonym_store
+from tink_fpe import _reloadable_fpe
+from tink_fpe import _sealed_fpe
+from tink_fpe import _sql
+from tink_fpe import _util
 
 
 Fpe = _fpe.Fpe
 FpeParams = _fpe.FpeParams
 UnknownCharacterStrategy = _fpe.UnknownCharacterStrategy
 CharacterGroup = _fpe.CharacterGroup
+ExecutionMode = _batch.ExecutionMode
+ExecutionPlan = _planner.ExecutionPlan
+pin_plan = _planner.pin_plan
+planner_metrics = _planner.metrics
+SealedFpe = _sealed_fpe.SealedFpe
+ReloadableFpe = _reloadable_fpe.ReloadableFpe
+Metrics = _metrics.Metrics
+FpeKeyring = _keyring.FpeKeyring
+KeysetCache = _keyset_cache.KeysetCache
+PseudonymStore = _pseudonym_store.PseudonymStore
+StoredFpe = _pseudonym_store.StoredFpe
+ColumnAnalysis = _util.ColumnAnalysis
+PreprocessedColumn = _util.PreprocessedColumn
+analyze = _util.analyze
+preprocess = _util.preprocess
+DatasetFormat = _dataset.DatasetFormat
+encrypt_dataset = _dataset.encrypt_dataset
+decrypt_dataset = _dataset.decrypt_dataset
+EncryptedFilter = _predicate.EncryptedFilter
+encrypt_filter = _predicate.encrypt_filter
+register_duckdb = _sql.register_duckdb
+register_sqlite = _sql.register_sqlite
 
 fpe_key_templates = _fpe_key_templates
 register = _fpe_ffx_key_manager.register
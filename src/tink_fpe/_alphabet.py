@@ -0,0 +1,88 @@
+"""This module provides interned state derived from FPE alphabets, shared by all primitives using an alphabet."""
+
+import sys
+import threading
+import types
+import typing as t
+import weakref
+
+from tink_fpe import _util
+from tink_fpe._ff3_engine import NumeralCodec
+from tink_fpe._ff3_engine import max_length
+from tink_fpe._ff3_engine import min_length
+
+
+class Alphabet:
+    """Alphabet holds the immutable state derived from an FPE alphabet.
+
+    Deployments with thousands of keys mostly use a handful of alphabets (e.g. CharacterGroup.ALPHANUMERIC). Use
+    alphabet_of() to get the interned instance of an alphabet, so that its state is only computed and held once,
+    regardless of the number of primitives using it.
+    """
+
+    __slots__ = ("chars", "radix", "index", "codec", "redaction_char", "min_len", "max_len", "__weakref__")
+
+    chars: str
+    """The characters of the alphabet."""
+
+    radix: int
+    """The number of characters in the alphabet."""
+
+    index: t.Mapping[str, int]
+    """Mapping from characters to their position in the alphabet."""
+
+    codec: NumeralCodec
+    """Converter of numeral strings of the alphabet to and from integers, using bit packing for power-of-two radices."""
+
+    redaction_char: str
+    """The default redaction character for the alphabet."""
+
+    min_len: int
+    """The min length of FF3-1 numeral strings of the alphabet radix."""
+
+    max_len: int
+    """The max length of FF3-1 numeral strings of the alphabet radix."""
+
+    def __init__(self, chars: str) -> None:
+        """Derive the state of an alphabet. Prefer alphabet_of(), which returns interned instances.
+
+        :param chars: the characters of the alphabet
+        """
+        radix = len(chars)
+        for name, value in (
+            ("chars", sys.intern(chars)),
+            ("radix", radix),
+            ("index", types.MappingProxyType({c: i for i, c in enumerate(chars)})),
+            ("codec", NumeralCodec(chars)),
+            ("redaction_char", _util.redaction_char_of(chars)),
+            ("min_len", min_length(radix) if radix > 1 else 0),
+            ("max_len", max_length(radix) if radix > 1 else 0),
+        ):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: t.Any) -> None:
+        """Prevent modification of the shared state."""
+        raise AttributeError("Alphabet is immutable")
+
+    def __repr__(self) -> str:
+        """Return a representation of the alphabet."""
+        return f"Alphabet({self.chars!r})"
+
+
+_alphabets: "weakref.WeakValueDictionary[str, Alphabet]" = weakref.WeakValueDictionary()
+_alphabets_lock = threading.Lock()
+
+
+def alphabet_of(chars: str) -> Alphabet:
+    """Return the interned Alphabet of some characters.
+
+    Alphabets are weakly cached, so an alphabet is released once no primitive uses it anymore.
+
+    :param chars: the characters of the alphabet
+    :return: the shared Alphabet instance
+    """
+    with _alphabets_lock:
+        alphabet = _alphabets.get(chars)
+        if alphabet is None:
+            alphabet = _alphabets[chars] = Alphabet(chars)
+    return alphabet
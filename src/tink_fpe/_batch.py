@@ -0,0 +1,75 @@
+"""This module contains the execution strategies for batch encryption/decryption."""
+
+import os
+import typing as t
+from concurrent.futures import Executor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+
+class ExecutionMode(Enum):
+    """ExecutionMode defines how batch encryption/decryption should be executed."""
+
+    SERIAL = 1
+    """Process the whole batch in the calling thread."""
+
+    THREAD = 2
+    """Split the batch into slices that are processed concurrently by a pool of threads.
+
+    Each thread uses its own cipher context. This pays off since AES is computed with the GIL released, and is the
+    preferred mode for threaded applications (e.g. web servers) where processes are not an option."""
+
+    PROCESS = 3
+    """Split the batch into slices that are processed by a pool of processes. The primitive must be picklable."""
+
+    AUTO = 4
+    """Sample the batch, and let a planner choose how to execute it (e.g. serially, using a codebook or a pool of
+    workers, and how many workers). Decisions and their throughput are recorded in tink_fpe.planner_metrics, and can be
+    overridden with tink_fpe.pin_plan()."""
+
+
+def execute(
+    fn: t.Callable[[t.List[bytes]], t.List[bytes]],
+    values: t.Sequence[bytes],
+    mode: ExecutionMode = ExecutionMode.SERIAL,
+    max_workers: t.Optional[int] = None,
+    dedup: bool = True,
+) -> t.List[bytes]:
+    """Execute a batch function over a batch of values.
+
+    For the concurrent modes, duplicate values are (by default) removed before the batch is split into one slice per
+    worker, so that no value is processed more than once.
+
+    :param fn: deterministic function that processes a batch (or a slice of a batch) in the calling thread
+    :param values: the values to process
+    :param mode: how to execute the batch
+    :param max_workers: max number of workers for the concurrent modes. Defaults to the number of CPUs.
+    :param dedup: whether to remove duplicate values before splitting the batch, for the concurrent modes
+    :raises ValueError: if the mode is ExecutionMode.AUTO, which must be resolved into a plan by the primitive
+    :return: the processed values, in the same order as the input values
+    """
+    if mode == ExecutionMode.AUTO:
+        raise ValueError("ExecutionMode.AUTO must be resolved into an execution plan first")
+    if mode == ExecutionMode.SERIAL:
+        return fn(list(values))
+
+    distinct = list(dict.fromkeys(values)) if dedup else list(values)
+    workers = max(1, min(max_workers or os.cpu_count() or 1, len(distinct)))
+    if workers == 1:
+        results = fn(distinct)
+    else:
+        bounds = [len(distinct) * i // workers for i in range(workers + 1)]
+        slices = [distinct[bounds[i] : bounds[i + 1]] for i in range(workers)]
+        executor: Executor = (
+            ThreadPoolExecutor(max_workers=workers)
+            if mode == ExecutionMode.THREAD
+            else ProcessPoolExecutor(max_workers=workers)
+        )
+        with executor:
+            results = [result for part in executor.map(fn, slices) for result in part]
+
+    if not dedup:
+        return results
+    lookup = dict(zip(distinct, results))
+    return [lookup[value] for value in values]
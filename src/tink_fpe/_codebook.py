@@ -0,0 +1,228 @@
+"""This module provides precomputed FF3-1 codebooks for small domains.
+
+For a given key, tweak and plaintext length, FF3-1 is a permutation of the integers ``[0, radix**length)``. If the
+domain is small enough, the full permutation (and its inverse) can be computed once and stored in compact
+``array``-backed tables, turning encryption and decryption into plain index lookups.
+
+Codebooks can be persisted to disk and memory-mapped when loaded. Persisted codebooks are protected by an HMAC that
+is keyed with material derived from the FPE key, so that a tampered table (or a table computed with another key) is
+rejected instead of silently producing wrong ciphertexts.
+"""
+
+import hashlib
+import hmac
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import tempfile
+import typing as t
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from tink_fpe._ff3_engine import Ff3Engine
+
+
+_TYPECODE: t.Final = "I"
+"""Array typecode of the codebook tables (4 bytes unsigned integers)."""
+
+MAX_DOMAIN_SIZE = 2**32
+"""The largest domain (radix**length) a codebook can be built for."""
+
+_MAGIC = b"TFPECB01"
+_HEADER = struct.Struct("<8sIIQ8s32s")
+"""Codebook file header: magic, radix, length, domain size, 64 bits tweak and HMAC-SHA256 tag (64 bytes in total)."""
+
+_INTEGRITY_LABEL = b"tink-fpe codebook integrity"
+_FILENAME_LABEL = b"tink-fpe codebook name"
+
+_BUILD_SLICE_SIZE = 1 << 16
+"""Number of values encrypted per batched engine call while building a codebook."""
+
+
+def _integrity_key_of(key: bytes) -> bytes:
+    return hmac.new(key, _INTEGRITY_LABEL, hashlib.sha256).digest()
+
+
+def _pad_tweak(tweak: bytes) -> bytes:
+    return tweak.ljust(8, b"\x00")
+
+
+def codebook_filename(key: bytes, radix: int, length: int, tweak: bytes) -> str:
+    """Return the file name of a persisted codebook.
+
+    The name is derived from the key by means of an HMAC, so it can be stored next to other codebooks without
+    revealing anything about the key or the tweak.
+
+    :param key: the FPE key
+    :param radix: the alphabet radix
+    :param length: the plaintext length
+    :param tweak: the tweak
+    :return: the file name
+    """
+    msg = _FILENAME_LABEL + struct.pack("<II", radix, length) + tweak
+    return hmac.new(key, msg, hashlib.sha256).hexdigest()[:32] + ".fpecb"
+
+
+def _encrypt_range(key: bytes, radix: int, length: int, tweak: bytes, start: int, stop: int) -> bytes:
+    """Encrypt the integers in ``[start, stop)``, returning the results as raw array bytes."""
+    engine = Ff3Engine(key=key, radix=radix)
+    result = array(_TYPECODE)
+    for pos in range(start, stop, _BUILD_SLICE_SIZE):
+        result.extend(engine.encrypt_ints(range(pos, min(pos + _BUILD_SLICE_SIZE, stop)), length, tweak))
+    return result.tobytes()
+
+
+class Codebook:
+    """Codebook holds the full FF3-1 permutation for a specific key, tweak, radix and length."""
+
+    def __init__(
+        self,
+        radix: int,
+        length: int,
+        forward: t.Sequence[int],
+        inverse: t.Sequence[int],
+        closer: t.Optional[t.Callable[[], None]] = None,
+    ) -> None:
+        self.radix = radix
+        self.length = length
+        self._forward = forward
+        self._inverse = inverse
+        self._closer = closer
+
+    def encrypt(self, value: int) -> int:
+        """Return the ciphertext integer of a plaintext integer."""
+        return self._forward[value]
+
+    def decrypt(self, value: int) -> int:
+        """Return the plaintext integer of a ciphertext integer."""
+        return self._inverse[value]
+
+    def close(self) -> None:
+        """Release the memory map backing the codebook (if any)."""
+        if self._closer is not None:
+            self._closer()
+            self._closer = None
+
+    def save(self, path: str, key: bytes, tweak: bytes) -> None:
+        """Persist the codebook to a file, protected by a keyed integrity check.
+
+        The file is written to a temporary file first, and then atomically moved into place.
+
+        :param path: the file to write
+        :param key: the FPE key the codebook was built with
+        :param tweak: the tweak the codebook was built with
+        """
+        forward = array(_TYPECODE, self._forward)
+        inverse = array(_TYPECODE, self._inverse)
+        if sys.byteorder == "big":
+            forward.byteswap()
+            inverse.byteswap()
+        domain = len(forward)
+        header = _HEADER.pack(_MAGIC, self.radix, self.length, domain, _pad_tweak(tweak), bytes(32))
+        mac = hmac.new(_integrity_key_of(key), header, hashlib.sha256)
+        mac.update(forward)
+        mac.update(inverse)
+        header = _HEADER.pack(_MAGIC, self.radix, self.length, domain, _pad_tweak(tweak), mac.digest())
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header)
+                forward.tofile(f)
+                inverse.tofile(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: str, key: bytes, radix: int, length: int, tweak: bytes) -> "Codebook":
+        """Load a persisted codebook, memory-mapping its tables.
+
+        :param path: the file to read
+        :param key: the FPE key the codebook is expected to be built with
+        :param radix: the expected alphabet radix
+        :param length: the expected plaintext length
+        :param tweak: the expected tweak
+        :raises ValueError: if the file is not a valid codebook for the given parameters
+        :return: the codebook
+        """
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            domain = radix**length
+            expected_size = _HEADER.size + 2 * domain * 4
+            if len(mm) != expected_size:
+                raise ValueError(f"Codebook {path} has unexpected size")
+            magic, f_radix, f_length, f_domain, f_tweak, tag = _HEADER.unpack_from(mm, 0)
+            if (magic, f_radix, f_length, f_domain, f_tweak) != (_MAGIC, radix, length, domain, _pad_tweak(tweak)):
+                raise ValueError(f"Codebook {path} does not match the requested parameters")
+            mac = hmac.new(_integrity_key_of(key), mm[: _HEADER.size - 32], hashlib.sha256)
+            mac.update(bytes(32))
+            mac.update(memoryview(mm)[_HEADER.size :])
+            if not hmac.compare_digest(mac.digest(), tag):
+                raise ValueError(f"Codebook {path} failed the integrity check")
+        except BaseException:
+            mm.close()
+            raise
+
+        if sys.byteorder == "big":
+            tables = array(_TYPECODE, mm[_HEADER.size :])
+            tables.byteswap()
+            mm.close()
+            return cls(radix, length, tables[:domain], tables[domain:])
+
+        view = memoryview(mm)[_HEADER.size :].cast(_TYPECODE)
+        forward, inverse = view[:domain], view[domain:]
+
+        def close() -> None:
+            forward.release()
+            inverse.release()
+            view.release()
+            mm.close()
+
+        return cls(radix, length, forward, inverse, closer=close)
+
+
+def build_codebook(key: bytes, radix: int, length: int, tweak: bytes, workers: int = 1) -> Codebook:
+    """Compute the full FF3-1 permutation (and its inverse) for a key, tweak, radix and length.
+
+    :param key: the FPE key
+    :param radix: the alphabet radix
+    :param length: the plaintext length
+    :param tweak: the tweak
+    :param workers: number of worker processes to build the forward table with. By default, the table is built in the
+                    calling process, which it also falls back to if a pool of processes cannot be used (e.g. within
+                    a daemonic worker process).
+    :raises ValueError: if the domain is too large for a codebook
+    :return: the codebook
+    """
+    domain = radix**length
+    if domain > MAX_DOMAIN_SIZE:
+        raise ValueError(f"Domain size {domain} exceeds the max codebook domain size {MAX_DOMAIN_SIZE}")
+    workers = max(1, min(workers, domain // _BUILD_SLICE_SIZE))
+    if multiprocessing.current_process().daemon:
+        workers = 1
+    forward = array(_TYPECODE)
+    if workers > 1:
+        bounds = [domain * i // workers for i in range(workers + 1)]
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parts = executor.map(
+                    _encrypt_range,
+                    *zip(*[(key, radix, length, tweak, bounds[i], bounds[i + 1]) for i in range(workers)]),
+                )
+                for part in parts:
+                    forward.frombytes(part)
+        except (OSError, BrokenProcessPool):
+            forward = array(_TYPECODE)
+    if not forward:
+        forward.frombytes(_encrypt_range(key, radix, length, tweak, 0, domain))
+
+    inverse = array(_TYPECODE, bytes(domain * 4))
+    for plain, cipher in enumerate(forward):
+        inverse[cipher] = plain
+    return Codebook(radix, length, forward, inverse)
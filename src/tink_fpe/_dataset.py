@@ -0,0 +1,578 @@
+"""This module provides encryption and decryption of columns in Parquet and Arrow IPC datasets.
+
+Requires pyarrow, which is an optional dependency (``pip install pyarrow``).
+"""
+
+import collections
+import contextlib
+import functools
+import hashlib
+import itertools
+import json
+import os
+import struct
+import typing as t
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+
+from tink_fpe import _fpe
+from tink_fpe._batch import ExecutionMode
+from tink_fpe._ff3_engine import min_length
+
+
+if t.TYPE_CHECKING:  # pragma: no cover
+    import pyarrow as pa
+
+
+DatasetSource = t.Union[str, "os.PathLike[str]", t.BinaryIO]
+"""A path to a dataset file, or a file-like object."""
+
+
+_CHECKPOINT_FILE = "_checkpoint.json"
+_CHECKPOINT_VERSION = 1
+
+_MIN_INTEGER_DIGITS = min_length(10)
+"""Integers with fewer digits are zero-padded to this many digits, the min length of FF3-1 numeral strings of digits."""
+
+_MAX_CYCLE_WALK_FACTOR = 100
+"""Max ratio between the domain of zero-padded integers and the range of an integer type (i.e. the expected number of
+cycle walking steps) for the type to hold encrypted integers."""
+
+_FINGERPRINT_PROBE = b"0" * 32
+"""Plaintext encrypted to fingerprint the key of a primitive, like a key check value."""
+
+
+class DatasetFormat(Enum):
+    """DatasetFormat defines the file format of a dataset."""
+
+    PARQUET = 1
+    """Apache Parquet. The dataset is processed one row group at a time."""
+
+    ARROW_IPC = 2
+    """Arrow IPC file format (a.k.a. Feather V2). The dataset is processed one record batch at a time."""
+
+    @property
+    def extension(self) -> str:
+        """The file name extension of the format."""
+        return ".parquet" if self == DatasetFormat.PARQUET else ".arrow"
+
+
+def encrypt_dataset(
+    fpe: _fpe.Fpe,
+    source: DatasetSource,
+    destination: DatasetSource,
+    columns: t.Sequence[str],
+    params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+    file_format: DatasetFormat = DatasetFormat.PARQUET,
+    mode: ExecutionMode = ExecutionMode.THREAD,
+    max_workers: t.Optional[int] = None,
+    max_in_flight: t.Optional[int] = None,
+    checkpoint_interval: int = 0,
+) -> int:
+    """Encrypt selected columns of a dataset, streaming it from source to destination.
+
+    See :func:`transform_dataset` for details.
+
+    :param fpe: the primitive to encrypt with
+    :param source: the dataset to read
+    :param destination: where to write the resulting dataset
+    :param columns: names of the string, binary or integer columns to encrypt
+    :param params: options that adjust how encryption will be performed
+    :param file_format: the file format of both source and destination
+    :param mode: how to process row groups (or record batches) concurrently
+    :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+    :param max_in_flight: max number of row groups (or record batches) held in memory at any time.
+                          Defaults to twice the number of workers.
+    :param checkpoint_interval: number of row groups (or record batches) per part file. If not 0, the destination is
+                                a directory of part files, and an interrupted run resumes from the last checkpoint.
+    :return: the number of rows processed
+    """
+    return transform_dataset(
+        fpe,
+        source,
+        destination,
+        columns,
+        params,
+        file_format,
+        mode,
+        max_workers,
+        max_in_flight,
+        decrypt=False,
+        checkpoint_interval=checkpoint_interval,
+    )
+
+
+def decrypt_dataset(
+    fpe: _fpe.Fpe,
+    source: DatasetSource,
+    destination: DatasetSource,
+    columns: t.Sequence[str],
+    params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+    file_format: DatasetFormat = DatasetFormat.PARQUET,
+    mode: ExecutionMode = ExecutionMode.THREAD,
+    max_workers: t.Optional[int] = None,
+    max_in_flight: t.Optional[int] = None,
+    checkpoint_interval: int = 0,
+) -> int:
+    """Decrypt selected columns of a dataset, streaming it from source to destination.
+
+    See :func:`transform_dataset` for details.
+
+    :param fpe: the primitive to decrypt with
+    :param source: the dataset to read
+    :param destination: where to write the resulting dataset
+    :param columns: names of the string, binary or integer columns to decrypt
+    :param params: options that adjust how decryption will be performed
+    :param file_format: the file format of both source and destination
+    :param mode: how to process row groups (or record batches) concurrently
+    :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+    :param max_in_flight: max number of row groups (or record batches) held in memory at any time.
+                          Defaults to twice the number of workers.
+    :param checkpoint_interval: number of row groups (or record batches) per part file. If not 0, the destination is
+                                a directory of part files, and an interrupted run resumes from the last checkpoint.
+    :return: the number of rows processed
+    """
+    return transform_dataset(
+        fpe,
+        source,
+        destination,
+        columns,
+        params,
+        file_format,
+        mode,
+        max_workers,
+        max_in_flight,
+        decrypt=True,
+        checkpoint_interval=checkpoint_interval,
+    )
+
+
+def transform_dataset(
+    fpe: _fpe.Fpe,
+    source: DatasetSource,
+    destination: DatasetSource,
+    columns: t.Sequence[str],
+    params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+    file_format: DatasetFormat = DatasetFormat.PARQUET,
+    mode: ExecutionMode = ExecutionMode.THREAD,
+    max_workers: t.Optional[int] = None,
+    max_in_flight: t.Optional[int] = None,
+    decrypt: bool = False,
+    checkpoint_interval: int = 0,
+) -> int:
+    """Encrypt or decrypt selected columns of a dataset, streaming it from source to destination.
+
+    The dataset is read one row group (Parquet) or record batch (Arrow IPC) at a time. Each row group is processed by
+    a worker, and written to the destination in the original order, so the row group layout and the schema (including
+    its metadata) of the source are preserved. Parquet column statistics are recomputed from the processed values.
+
+    Only the distinct values of a column are processed. Parquet dictionary pages are used as-is for this, other
+    columns are dictionary encoded first. Nulls are preserved.
+
+    Integer columns are processed as decimal digits, and thus require a primitive with a digits alphabet. The sign of
+    each value is preserved. Values of up to 6 digits (the min length of FF3-1 for digits) are zero-padded to 6
+    digits, so they are encrypted into values of up to 6 digits. Longer values keep their number of digits.
+    Ciphertexts that would have a leading zero or that would not fit the column type are encrypted again until they do
+    (i.e. cycle walking), so decryption restores the original values. Integer types narrower than 16 bits cannot hold
+    the encrypted values, and are rejected.
+
+    If a checkpoint interval is given, the destination is a directory holding a part file per ``checkpoint_interval``
+    row groups (e.g. ``part-00000.parquet``), which can be read as a single dataset by e.g. ``pyarrow.dataset``. Each
+    part is written to a temporary file and atomically moved into place, after which a checkpoint recording the next
+    row group, the number of parts and rows written, and a fingerprint of the key, params and source, is atomically
+    replaced. An interrupted run that is started again resumes from the last checkpoint, without reading or
+    processing the row groups before it. Since encryption is deterministic, a part that was written but not
+    checkpointed is simply written again. The fingerprint includes a hash of the ciphertext of a fixed probe value,
+    and thus acts as a key check value.
+
+    :param fpe: the primitive to use. Must be picklable if mode is ExecutionMode.PROCESS.
+    :param source: the dataset to read
+    :param destination: where to write the resulting dataset
+    :param columns: names of the string, binary or integer columns to process
+    :param params: options that adjust how encryption/decryption will be performed
+    :param file_format: the file format of both source and destination
+    :param mode: how to process row groups (or record batches) concurrently. With ExecutionMode.AUTO, row groups are
+                 processed one at a time, and the planner chooses how to process the values of each column.
+    :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+    :param max_in_flight: max number of row groups (or record batches) held in memory at any time.
+                          Defaults to twice the number of workers.
+    :param decrypt: True to decrypt, False to encrypt
+    :param checkpoint_interval: number of row groups (or record batches) per part file. If not 0, the destination is
+                                a directory of part files, and an interrupted run resumes from the last checkpoint.
+    :return: the number of rows processed. When resuming, this includes the rows processed by previous runs.
+    :raises ValueError: if a column does not exist, or is of a type that is not supported, or if the checkpoint of
+                        the destination was written with another key, params or source
+    """
+    auto = mode == ExecutionMode.AUTO
+    workers = 1 if mode == ExecutionMode.SERIAL or auto else max(1, max_workers or os.cpu_count() or 1)
+    in_flight = max(1, max_in_flight or 2 * workers)
+
+    checkpoint: t.Dict[str, t.Any] = {}
+    if checkpoint_interval:
+        if not isinstance(source, (str, os.PathLike)) or not isinstance(destination, (str, os.PathLike)):
+            raise ValueError("Checkpointing requires both source and destination to be paths")
+        fingerprint = _fingerprint_of(fpe, source, columns, params, file_format, decrypt)
+        checkpoint = _load_checkpoint(destination, fingerprint)
+        if checkpoint["complete"]:
+            return int(checkpoint["rows"])
+
+    schema, tables = _read_dataset(source, file_format, columns, start=checkpoint.get("next_row_group", 0))
+    for name in columns:
+        if schema.get_field_index(name) < 0:
+            raise ValueError(f"Column '{name}' does not exist in the dataset")
+        _check_column_type(name, schema.field(name).type)
+    process = functools.partial(
+        fpe.decrypt_batch if decrypt else fpe.encrypt_batch,
+        mode=ExecutionMode.AUTO if auto else ExecutionMode.SERIAL,
+        max_workers=max_workers,
+    )
+    transform = functools.partial(
+        _transform_table, process=process, columns=tuple(columns), schema=schema, params=params
+    )
+
+    processed = _process_tables(transform, tables, mode, workers, in_flight)
+    if checkpoint_interval:
+        return _write_parts(t.cast(str, destination), file_format, schema, processed, checkpoint, checkpoint_interval)
+
+    rows = 0
+    with _open_writer(destination, file_format, schema) as write:
+        for table in processed:
+            rows += write(table)
+    return rows
+
+
+def _process_tables(
+    transform: t.Callable[["pa.Table"], "pa.Table"],
+    tables: t.Iterable["pa.Table"],
+    mode: ExecutionMode,
+    workers: int,
+    in_flight: int,
+) -> t.Iterator["pa.Table"]:
+    """Transform tables by a pool of workers, holding at most in_flight tables, and yield them in the original order."""
+    if workers == 1:
+        yield from (transform(table) for table in tables)
+        return
+
+    executor: Executor = (
+        ThreadPoolExecutor(max_workers=workers)
+        if mode == ExecutionMode.THREAD
+        else ProcessPoolExecutor(max_workers=workers)
+    )
+    with executor:
+        pending: t.Deque["Future[pa.Table]"] = collections.deque()
+        for table in tables:
+            pending.append(executor.submit(transform, table))
+            if len(pending) >= in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _fingerprint_of(
+    fpe: _fpe.Fpe,
+    source: t.Union[str, "os.PathLike[str]"],
+    columns: t.Sequence[str],
+    params: _fpe.FpeParams,
+    file_format: DatasetFormat,
+    decrypt: bool,
+) -> str:
+    """Return a fingerprint of everything that determines the output of a run, to be recorded in its checkpoint."""
+    probe_params = _fpe.FpeParams(_fpe.UnknownCharacterStrategy.REDACT, tweak=params.tweak, charset=params.charset)
+    stat = os.stat(source)
+    fields = [
+        hashlib.sha256(fpe.encrypt(_FINGERPRINT_PROBE, probe_params)).digest(),
+        params.tweak,
+        str(params.unknown_character_strategy.value).encode("ascii"),
+        params.redaction_char.encode("utf-8"),
+        params.charset.encode("ascii"),
+        file_format.name.encode("ascii"),
+        b"decrypt" if decrypt else b"encrypt",
+        struct.pack(">QQ", stat.st_size, stat.st_mtime_ns),
+        *(name.encode("utf-8") for name in columns),
+    ]
+    return hashlib.sha256(b"".join(struct.pack(">I", len(field)) + field for field in fields)).hexdigest()
+
+
+def _load_checkpoint(destination: t.Union[str, "os.PathLike[str]"], fingerprint: str) -> t.Dict[str, t.Any]:
+    """Load the checkpoint of a destination directory, or create a new one, removing uncommitted part files."""
+    os.makedirs(destination, exist_ok=True)
+    for name in os.listdir(destination):
+        if name.endswith(".tmp"):
+            os.remove(os.path.join(destination, name))
+    try:
+        with open(os.path.join(destination, _CHECKPOINT_FILE), encoding="utf-8") as f:
+            checkpoint: t.Dict[str, t.Any] = json.load(f)
+    except FileNotFoundError:
+        return {
+            "version": _CHECKPOINT_VERSION,
+            "fingerprint": fingerprint,
+            "next_row_group": 0,
+            "parts": 0,
+            "rows": 0,
+            "complete": False,
+        }
+    if checkpoint.get("version") != _CHECKPOINT_VERSION or checkpoint.get("fingerprint") != fingerprint:
+        raise ValueError(
+            f"The checkpoint in {os.fspath(destination)} was written with another key, params or source. "
+            "Remove the destination to start over."
+        )
+    return checkpoint
+
+
+def _save_checkpoint(destination: str, checkpoint: t.Dict[str, t.Any]) -> None:
+    _replace_atomically(destination, _CHECKPOINT_FILE, lambda path: _write_json(path, checkpoint))
+
+
+def _write_json(path: str, value: t.Dict[str, t.Any]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+
+
+def _replace_atomically(directory: str, name: str, write: t.Callable[[str], None]) -> None:
+    """Write a file to a temporary file, flush it to disk, and atomically move it into place."""
+    path = os.path.join(directory, name)
+    tmp_path = path + ".tmp"
+    try:
+        write(tmp_path)
+        with open(tmp_path, "r+b") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_parts(
+    destination: str,
+    file_format: DatasetFormat,
+    schema: "pa.Schema",
+    tables: t.Iterator["pa.Table"],
+    checkpoint: t.Dict[str, t.Any],
+    checkpoint_interval: int,
+) -> int:
+    """Write tables to part files of checkpoint_interval tables each, recording committed parts in the checkpoint."""
+    for first in tables:
+        part = itertools.chain([first], itertools.islice(tables, checkpoint_interval - 1))
+        written = [0, 0]
+        write_part = functools.partial(_write_part, tables=part, file_format=file_format, schema=schema, written=written)
+        _replace_atomically(destination, f"part-{checkpoint['parts']:05d}{file_format.extension}", write_part)
+        checkpoint["next_row_group"] += written[0]
+        checkpoint["parts"] += 1
+        checkpoint["rows"] += written[1]
+        _save_checkpoint(destination, checkpoint)
+
+    checkpoint["complete"] = True
+    _save_checkpoint(destination, checkpoint)
+    return int(checkpoint["rows"])
+
+
+def _write_part(
+    path: str, tables: t.Iterable["pa.Table"], file_format: DatasetFormat, schema: "pa.Schema", written: t.List[int]
+) -> None:
+    """Write tables to a part file, adding the number of tables and rows written to written."""
+    with _open_writer(path, file_format, schema) as write:
+        for table in tables:
+            written[0] += 1
+            written[1] += write(table)
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("Dataset support requires pyarrow. Install it with: pip install pyarrow") from e
+
+
+def _read_dataset(
+    source: DatasetSource, file_format: DatasetFormat, columns: t.Sequence[str], start: int = 0
+) -> t.Tuple["pa.Schema", t.Iterator["pa.Table"]]:
+    """Open a dataset, returning its schema and an iterator over its row groups (or record batches) from start."""
+    _require_pyarrow()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if file_format == DatasetFormat.PARQUET:
+        schema = pq.ParquetFile(source).schema_arrow
+        # Read string and binary columns as dictionaries, to get the distinct values straight from the dictionary pages
+        dictionary_columns = [
+            name
+            for name in columns
+            if schema.get_field_index(name) >= 0 and not pa.types.is_integer(schema.field(name).type)
+        ]
+        parquet_file = pq.ParquetFile(source, read_dictionary=dictionary_columns)
+        return schema, (parquet_file.read_row_group(i) for i in range(start, parquet_file.num_row_groups))
+
+    reader = pa.ipc.open_file(source)
+    return reader.schema, (
+        pa.Table.from_batches([reader.get_batch(i)]) for i in range(start, reader.num_record_batches)
+    )
+
+
+@contextlib.contextmanager
+def _open_writer(
+    destination: DatasetSource, file_format: DatasetFormat, schema: "pa.Schema"
+) -> t.Iterator[t.Callable[["pa.Table"], int]]:
+    """Open a dataset for writing, yielding a function that writes a table and returns the number of rows written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if file_format == DatasetFormat.PARQUET:
+        writer = pq.ParquetWriter(destination, schema)
+    else:
+        writer = pa.ipc.new_file(destination, schema)
+
+    def write(table: "pa.Table") -> int:
+        if file_format == DatasetFormat.PARQUET:
+            # Keep the row group layout of the source
+            writer.write_table(table, row_group_size=max(1, table.num_rows))
+        else:
+            writer.write_table(table)
+        return int(table.num_rows)
+
+    try:
+        yield write
+    finally:
+        writer.close()
+
+
+def _check_column_type(name: str, column_type: "pa.DataType") -> None:
+    import pyarrow as pa
+
+    value_type = column_type.value_type if pa.types.is_dictionary(column_type) else column_type
+    if not (
+        pa.types.is_string(value_type)
+        or pa.types.is_large_string(value_type)
+        or pa.types.is_binary(value_type)
+        or pa.types.is_large_binary(value_type)
+        or pa.types.is_integer(value_type)
+    ):
+        raise ValueError(
+            f"Column '{name}' is of type {column_type}. Only string, binary and integer columns can be processed"
+        )
+    if pa.types.is_integer(value_type):
+        check_integer_bounds(integer_bounds(value_type), f"Column '{name}' of type {column_type}")
+
+
+_BatchFunction = t.Callable[[t.List[bytes], _fpe.FpeParams], t.List[bytes]]
+"""Batch function that encrypts or decrypts values, e.g. a partial of Fpe.encrypt_batch."""
+
+
+def _transform_table(
+    table: "pa.Table",
+    process: _BatchFunction,
+    columns: t.Tuple[str, ...],
+    schema: "pa.Schema",
+    params: _fpe.FpeParams,
+) -> "pa.Table":
+    """Process the selected columns of a table, returning a table with the given schema."""
+    import pyarrow as pa
+
+    arrays = [
+        (
+            _transform_column(table.column(field.name), field.type, process, params)
+            if field.name in columns
+            else table.column(field.name)
+        )
+        for field in schema
+    ]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def _transform_column(
+    column: "pa.ChunkedArray", column_type: "pa.DataType", process: _BatchFunction, params: _fpe.FpeParams
+) -> "pa.ChunkedArray":
+    """Process the distinct values of each chunk of a column, returning a column of the given type."""
+    import pyarrow as pa
+
+    chunks = []
+    for chunk in column.chunks:
+        encoded = chunk if pa.types.is_dictionary(chunk.type) else chunk.dictionary_encode()
+        dictionary = _transform_values(encoded.dictionary, process, params)
+        result = pa.DictionaryArray.from_arrays(encoded.indices, dictionary)
+        chunks.append(result if pa.types.is_dictionary(column_type) else result.dictionary_decode())
+    return pa.chunked_array(chunks, type=column_type)
+
+
+def _transform_values(values: "pa.Array", process: _BatchFunction, params: _fpe.FpeParams) -> "pa.Array":
+    """Process an array of distinct, non-null values."""
+    import pyarrow as pa
+
+    if pa.types.is_integer(values.type):
+        bounds = integer_bounds(values.type)
+        return pa.array(transform_integers(values.to_pylist(), bounds, process, params), type=values.type)
+    if pa.types.is_binary(values.type) or pa.types.is_large_binary(values.type):
+        return pa.array(process(values.to_pylist(), params), type=values.type)
+    texts = [value.encode(params.charset) for value in values.to_pylist()]
+    return pa.array([text.decode(params.charset) for text in process(texts, params)], type=values.type)
+
+
+def integer_bounds(value_type: "pa.DataType") -> t.Tuple[int, int]:
+    """Return the min and max value of an Arrow integer type."""
+    import pyarrow as pa
+
+    bits = value_type.bit_width
+    if pa.types.is_signed_integer(value_type):
+        return -(1 << (bits - 1)), (1 << (bits - 1)) - 1
+    return 0, (1 << bits) - 1
+
+
+def check_integer_bounds(bounds: t.Tuple[int, int], name: str) -> None:
+    """Check that a range of integers is large enough to hold encrypted integers.
+
+    :param bounds: min and max value (inclusive) of the range, e.g. those of an integer type
+    :param name: what the range belongs to, for the error message
+    :raises ValueError: if zero-padded integers would take too many cycle walking steps to land within the range
+    """
+    if (bounds[1] + 1) * _MAX_CYCLE_WALK_FACTOR < 10**_MIN_INTEGER_DIGITS:
+        raise ValueError(
+            f"{name} is too small to hold encrypted integers, which have at least {_MIN_INTEGER_DIGITS} digits. "
+            "Use a wider integer type (e.g. int32)"
+        )
+
+
+def transform_integers(
+    values: t.Sequence[int],
+    bounds: t.Tuple[int, int],
+    process: _BatchFunction,
+    params: _fpe.FpeParams,
+) -> t.List[int]:
+    """Process the decimal digits of integers, cycle walking until each result is within the bounds.
+
+    Integers with fewer digits than the min length of FF3-1 (6 digits) are zero-padded to that length, and the padding
+    is stripped from the results, so integers of up to 6 digits are permuted among themselves. Longer integers keep
+    their number of digits. All integers keep their sign.
+
+    :param values: the integers to process, within the bounds
+    :param bounds: min and max value (inclusive) of the results, e.g. those of the column type
+    :param process: batch function that encrypts or decrypts the digits
+    :param params: options that adjust how encryption/decryption will be performed
+    :raises ValueError: if the processed digits are not decimal digits, or if the bounds are too narrow
+    :return: the processed integers, in the same order
+    """
+    low, high = bounds
+    check_integer_bounds(bounds, f"The range [{low}, {high}]")
+    results = list(values)
+    digits = [str(abs(value)).zfill(_MIN_INTEGER_DIGITS).encode("ascii") for value in values]
+    pending = list(range(len(values)))
+    while pending:
+        walking = []
+        for i, text in zip(pending, process([digits[i] for i in pending], params)):
+            if not text.isdigit():
+                raise ValueError("Integer columns can only be processed by a primitive with a digits alphabet")
+            negative = values[i] < 0
+            result = -int(text) if negative else int(text)
+            if (
+                (len(text) > _MIN_INTEGER_DIGITS and text.startswith(b"0"))
+                or (negative and result == 0)
+                or not low <= result <= high
+            ):
+                walking.append(i)
+            else:
+                results[i] = result
+            digits[i] = text
+        pending = walking
+    return results
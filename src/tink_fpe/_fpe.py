@@ -1,8 +1,17 @@
 """This module defines the interface for Format-Preserving Encryption (FPE)."""
 
 import abc
+import functools
+import time
+import typing as t
 from enum import Enum
 
+from tink_fpe import _batch
+from tink_fpe import _planner
+from tink_fpe import _stream
+from tink_fpe._batch import ExecutionMode
+from tink_fpe._stream import ByteSource
+
 
 class UnknownCharacterStrategy(Enum):
     """UnknownCharacterStrategy defines how encryption/decryption should handle non-alphabet characters.
@@ -38,6 +47,12 @@ class CharacterGroup:
     """Numeric characters: 0123456789"""
     DIGITS = "0123456789"
 
+    HEX = "0123456789abcdef"
+    """Lowercase hexadecimal characters: 0123456789abcdef"""
+
+    BASE64URL = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+    """URL and filename safe base64 characters (RFC 4648): A-Z, a-z, 0-9, - and _"""
+
 
 class FpeParams:
     """FpeParams is used as an argument when invoking encrypt and decrypt functions.
@@ -78,3 +93,134 @@ class Fpe(metaclass=abc.ABCMeta):
     def decrypt(self, ciphertext: bytes, params: FpeParams = _DEFAULT_FPE_PARAMS) -> bytes:
         """Deterministically decrypt ciphertext using Format-Preserving Encryption."""
         raise NotImplementedError()
+
+    def encrypt_batch(
+        self,
+        plaintexts: t.Sequence[bytes],
+        params: FpeParams = _DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically encrypt a batch of plaintexts using Format-Preserving Encryption.
+
+        :param plaintexts: plaintexts to encrypt
+        :param params: options that adjust how encryption will be performed
+        :param mode: how to execute the batch, e.g. using a pool of threads
+        :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+        :return: resulting ciphertexts, in the same order as the plaintexts
+        """
+        if mode == ExecutionMode.AUTO:
+            return self._execute_auto(plaintexts, params, max_workers, decrypt=False)
+        return _batch.execute(functools.partial(self._encrypt_batch, params=params), plaintexts, mode, max_workers)
+
+    def decrypt_batch(
+        self,
+        ciphertexts: t.Sequence[bytes],
+        params: FpeParams = _DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically decrypt a batch of ciphertexts using Format-Preserving Encryption.
+
+        :param ciphertexts: ciphertexts to decrypt
+        :param params: options that adjust how decryption will be performed
+        :param mode: how to execute the batch, e.g. using a pool of threads
+        :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+        :return: resulting plaintexts, in the same order as the ciphertexts
+        """
+        if mode == ExecutionMode.AUTO:
+            return self._execute_auto(ciphertexts, params, max_workers, decrypt=True)
+        return _batch.execute(functools.partial(self._decrypt_batch, params=params), ciphertexts, mode, max_workers)
+
+    def encrypt_stream(
+        self,
+        source: ByteSource,
+        params: FpeParams = _DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically encrypt a single, possibly very large, plaintext read from a stream.
+
+        The concatenated output equals the ciphertext that encrypt() would return for the whole plaintext.
+        Implementations may override this to encrypt the plaintext incrementally, in constant memory. The default
+        implementation reads the whole plaintext into memory.
+
+        :param source: binary file-like object or iterable of bytes to read the plaintext from
+        :param params: options that adjust how encryption will be performed
+        :param read_size: number of bytes to read at a time from file-like objects
+        :return: an iterator over the parts of the resulting ciphertext
+        """
+        yield self.encrypt(b"".join(_stream.iter_bytes(source, read_size)), params)
+
+    def decrypt_stream(
+        self,
+        source: ByteSource,
+        params: FpeParams = _DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically decrypt a single, possibly very large, ciphertext read from a stream.
+
+        The concatenated output equals the plaintext that decrypt() would return for the whole ciphertext.
+        Implementations may override this to decrypt the ciphertext incrementally, in constant memory. The default
+        implementation reads the whole ciphertext into memory.
+
+        :param source: binary file-like object or iterable of bytes to read the ciphertext from
+        :param params: options that adjust how decryption will be performed
+        :param read_size: number of bytes to read at a time from file-like objects
+        :return: an iterator over the parts of the resulting plaintext
+        """
+        yield self.decrypt(b"".join(_stream.iter_bytes(source, read_size)), params)
+
+    def _key_primitives(self) -> t.List["Fpe"]:
+        """Return a primitive per key that data might have been encrypted with.
+
+        Primitives backed by a keyset return one primitive per key, so that e.g. data encrypted before a key rotation
+        can be matched.
+        """
+        return [self]
+
+    def _execute_auto(
+        self, values: t.Sequence[bytes], params: FpeParams, max_workers: t.Optional[int], decrypt: bool
+    ) -> t.List[bytes]:
+        """Execute a batch of ExecutionMode.AUTO with the pinned plan, or with a plan chosen from a sample of it."""
+        plan = _planner.pinned_plan()
+        profile = None
+        if plan is None:
+            plan, profile = self._plan_batch(values, params, max_workers, decrypt)
+        start = time.perf_counter()
+        results = self._execute_plan(plan, values, params, decrypt)
+        _planner.record(plan, profile, len(values), time.perf_counter() - start)
+        return results
+
+    def _plan_batch(
+        self, values: t.Sequence[bytes], params: FpeParams, max_workers: t.Optional[int], decrypt: bool
+    ) -> t.Tuple[_planner.ExecutionPlan, _planner.BatchProfile]:
+        """Choose how to execute a batch, returning the plan and the profile of the batch it was chosen from.
+
+        Implementations may override this to take their alphabet, chunking and codebooks into account. The default
+        implementation only considers the size of the batch, and never uses a pool of processes.
+        """
+        profile = _planner.profile_batch(values, params.charset)
+        return _planner.choose_plan(profile, max_workers), profile
+
+    def _execute_plan(
+        self, plan: _planner.ExecutionPlan, values: t.Sequence[bytes], params: FpeParams, decrypt: bool
+    ) -> t.List[bytes]:
+        """Execute a batch according to a plan, using the batch hooks."""
+        process = self._decrypt_batch if decrypt else self._encrypt_batch
+        return _batch.execute(
+            functools.partial(process, params=params), values, plan.mode, plan.max_workers, plan.dedup
+        )
+
+    def _encrypt_batch(self, plaintexts: t.List[bytes], params: FpeParams) -> t.List[bytes]:
+        """Encrypt a batch (or a slice of a batch) in the calling thread.
+
+        Implementations may override this to process the batch more efficiently than one plaintext at a time.
+        """
+        return [self.encrypt(plaintext, params) for plaintext in plaintexts]
+
+    def _decrypt_batch(self, ciphertexts: t.List[bytes], params: FpeParams) -> t.List[bytes]:
+        """Decrypt a batch (or a slice of a batch) in the calling thread.
+
+        Implementations may override this to process the batch more efficiently than one ciphertext at a time.
+        """
+        return [self.decrypt(ciphertext, params) for ciphertext in ciphertexts]
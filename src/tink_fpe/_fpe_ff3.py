@@ -1,25 +1,37 @@
 """This module provides an implementation of FF3-1 mode of Format-Preserving Encryption (FPE)."""
 
-from ff3 import FF3Cipher
+import functools
+import os
+import threading
+import typing as t
 
+from tink_fpe import _batch
+from tink_fpe import _planner
+from tink_fpe import _stream
 from tink_fpe import _util
+from tink_fpe._alphabet import alphabet_of
+from tink_fpe._codebook import MAX_DOMAIN_SIZE
+from tink_fpe._codebook import Codebook
+from tink_fpe._codebook import build_codebook
+from tink_fpe._codebook import codebook_filename
+from tink_fpe._ff3_engine import Ff3Engine
 from tink_fpe._fpe import _DEFAULT_FPE_PARAMS
 from tink_fpe._fpe import Fpe
 from tink_fpe._fpe import FpeParams
 from tink_fpe._fpe import UnknownCharacterStrategy
+from tink_fpe._stream import ByteSource
 
 
 # TODO: Describe the weakness for long texts that prevent the last characters from being encrypted
 
-_NULL_HEX_TWEAK = "00000000000000"
-""" NULL_HEX_TWEAK is hexadecimal string representation of the default tweak. It is used if a tweak is not explicitly
-specified by the user.
+_NULL_TWEAK = bytes(7)
+""" NULL_TWEAK is the default tweak (56 zero bits). It is used if a tweak is not explicitly specified by the user.
 
 The tweak is a value used as an additional input to the encryption process. A tweak ensures that the same plaintext
 and key will encrypt to different ciphertexts.</p>
 
 The size of the tweak is usually recommended to be 128 bits (16 characters string) to provide sufficient randomness
-and security. However, the underlying FF3-1 implementation (Mysto FPE (python)) enforces either 56 or 64 bits tweak
+and security. However, the FF3-1 implementation (like Mysto FPE (python)) enforces either 56 or 64 bits tweak
 lengths (a 7 or 8 characters string). Thus, for compatibility reasons, this is also enforced here.
 """
 
@@ -35,26 +47,161 @@ _MAX_CHUNK_SIZE = 30
 
 The underlying FF3-1 implementation has limitations for maximum plaintext length (depending on alphabet radix).
 If the supplied plaintext exceeds a certain length (MAX_CHUNK_SIZE), it is divided into chunks before being processed.
+For alphabets with a large radix, chunks are further limited to the max length supported for the radix.
 
 For more information, refer to: https://github.com/mysto/java-fpe#usage
 """
 
+_STREAM_WINDOW_CHUNKS = 1024
+"""STREAM_WINDOW_CHUNKS is the number of full chunks processed at a time when streaming.
 
-def _hex_tweak_of(b: bytes) -> str:
-    """Return either the default 'null tweak" (if empty) or the hex representation of the provided bytes."""
-    return _NULL_HEX_TWEAK if b is None or len(b) == 0 else b.hex()
+Streamed texts are processed in windows of whole chunks, so that they are chunked exactly like texts processed in one
+go.
+"""
+
+_STREAM_MAX_PENDING = 1 << 16
+"""STREAM_MAX_PENDING is the number of held back characters above which a streamed text is processed in whole chunks.
+
+With the SKIP strategy, non-alphabet characters are held back along with the alphabet characters preceding them, until
+the chunk of these alphabet characters is complete, since they are output after it. Once this many characters are held
+back, all complete chunks are processed rather than waiting for a whole window. This does not cap memory: a stretch of
+non-alphabet characters that splits a chunk is held back until the chunk is complete, however long it is.
+"""
+
+
+_MAX_CACHED_CODEBOOKS = 16
+"""MAX_CACHED_CODEBOOKS is the max number of codebooks (one per tweak and chunk length) that a primitive keeps.
+
+Beyond that, the codebook built or loaded first is dropped, and is rebuilt (or reloaded from the codebook directory)
+if it is needed again.
+"""
+
+
+def _tweak_of(b: bytes) -> bytes:
+    """Return either the default 'null tweak" (if empty) or the provided bytes."""
+    return _NULL_TWEAK if b is None or len(b) == 0 else b
 
 
 class FpeFf3(Fpe):
     """Fpe primitive for the FF3-1 mode of Format-Preserving Encryption.
 
-    The actual implementation of "chunk-wise encryption/decryption is delegated to the Mysto FPE library.
+    Texts are encrypted chunk by chunk. Chunks of equal length are processed together by the integer-domain FF3-1
+    engine, which encrypts the AES blocks of all chunks in a Feistel round with a single call.
+
+    Chunks whose domain size (radix^length) does not exceed the codebook threshold are instead looked up in a
+    precomputed codebook holding the full permutation for the given tweak and length. The codebook is built on first
+    use, and optionally persisted to (and memory-mapped from) the codebook directory, so that it can be reused across
+    processes and runs.
+
+    FpeFf3 primitives can be pickled, e.g. in order to ship them to Spark, Dask or multiprocessing workers. A pickled
+    primitive only holds the key material and options. The cipher is created lazily on first use, and unpickling the
+    same primitive several times within a process yields a single, shared instance.
+
+    FpeFf3 primitives are thread-safe. Each thread lazily gets its own cipher context, and codebooks are shared.
     """
 
-    def __init__(self, key: bytes, alphabet: str):
-        self._alphabet = alphabet
-        self._default_redaction_char = _util.redaction_char_of(alphabet)
-        self._ff3 = FF3Cipher.withCustomAlphabet(key=key.hex(), tweak=_NULL_HEX_TWEAK, alphabet=alphabet)
+    def __init__(
+        self, key: bytes, alphabet: str, codebook_threshold: int = 0, codebook_dir: t.Optional[str] = None
+    ) -> None:
+        """Create a new FF3-1 primitive.
+
+        :param key: the key material
+        :param alphabet: the characters that are subject to encryption
+        :param codebook_threshold: max domain size (radix^length) to precompute codebooks for. 0 disables codebooks.
+        :param codebook_dir: optional directory to persist codebooks to
+        :raises ValueError: if the codebook threshold exceeds the max supported codebook domain size
+        """
+        if codebook_threshold > MAX_DOMAIN_SIZE:
+            raise ValueError(f"Codebook threshold cannot exceed {MAX_DOMAIN_SIZE}")
+        self._key = key
+        self._alphabet = alphabet_of(alphabet)
+        self._chunk_size = min(_MAX_CHUNK_SIZE, self._alphabet.max_len)
+        self._local = threading.local()
+        self._codebook_threshold = codebook_threshold
+        self._codebook_dir = codebook_dir
+        self._codebooks: t.Dict[t.Tuple[bytes, int], Codebook] = {}
+        self._codebook_lock = threading.Lock()
+
+    def __reduce__(self) -> t.Tuple[t.Callable[..., "FpeFf3"], t.Tuple[bytes, str, int, t.Optional[str]]]:
+        """Reduce the primitive to its key material and options when pickled."""
+        return _restore_fpe_ff3, (self._key, self._alphabet.chars, self._codebook_threshold, self._codebook_dir)
+
+    def _engine(self) -> Ff3Engine:
+        """Return the FF3-1 engine of the current thread, creating it on first use."""
+        engine: t.Optional[Ff3Engine] = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = self._local.engine = Ff3Engine(key=self._key, radix=self._alphabet.radix)
+        return engine
+
+    def _codebook_of(self, tweak: bytes, length: int, threshold: int = 0) -> t.Optional[Codebook]:
+        """Return the codebook for a tweak and chunk length, or None if the domain is too large for a codebook.
+
+        A threshold above the threshold of the primitive allows codebooks to be built for larger domains.
+        """
+        codebook = self._codebooks.get((tweak, length))
+        if codebook is not None:
+            return codebook
+        radix = self._alphabet.radix
+        if length < self._alphabet.min_len or radix**length > max(threshold, self._codebook_threshold):
+            return None
+        with self._codebook_lock:
+            codebook = self._codebooks.get((tweak, length))
+            if codebook is None:
+                codebook = self._load_or_build_codebook(tweak, length)
+                if len(self._codebooks) >= _MAX_CACHED_CODEBOOKS:
+                    del self._codebooks[next(iter(self._codebooks))]
+                self._codebooks[(tweak, length)] = codebook
+        return codebook
+
+    def _load_or_build_codebook(self, tweak: bytes, length: int) -> Codebook:
+        radix = self._alphabet.radix
+        if self._codebook_dir is None:
+            return build_codebook(self._key, radix, length, tweak)
+        path = os.path.join(self._codebook_dir, codebook_filename(self._key, radix, length, tweak))
+        try:
+            return Codebook.load(path, self._key, radix, length, tweak)
+        except (OSError, ValueError):
+            codebook = build_codebook(self._key, radix, length, tweak)
+            os.makedirs(self._codebook_dir, exist_ok=True)
+            codebook.save(path, self._key, tweak)
+            return codebook
+
+    def _process_ints(
+        self, values: t.List[int], length: int, tweak: bytes, decrypt: bool, codebook_threshold: int = 0
+    ) -> t.List[int]:
+        """Encrypt or decrypt integers representing chunks of the given length."""
+        codebook = self._codebook_of(tweak, length, codebook_threshold)
+        if codebook is not None:
+            lookup = codebook.decrypt if decrypt else codebook.encrypt
+            return [lookup(value) for value in values]
+        engine = self._engine()
+        return engine.decrypt_ints(values, length, tweak) if decrypt else engine.encrypt_ints(values, length, tweak)
+
+    def _process_texts(
+        self, texts: t.Sequence[str], tweak: bytes, decrypt: bool, codebook_threshold: int = 0
+    ) -> t.List[str]:
+        """Encrypt or decrypt alphabet-compliant texts chunk by chunk, processing chunks of equal length together."""
+        size = self._chunk_size
+        chunks = [[text[pos : pos + size] for pos in range(0, len(text), size)] for text in texts]
+        positions_by_length: t.Dict[int, t.List[t.Tuple[int, int]]] = {}
+        for i, text_chunks in enumerate(chunks):
+            for j, chunk in enumerate(text_chunks):
+                if len(chunk) >= _MIN_CHUNK_SIZE:
+                    positions_by_length.setdefault(len(chunk), []).append((i, j))
+
+        codec = self._alphabet.codec
+        for length, positions in positions_by_length.items():
+            values = [codec.decode(chunks[i][j]) for i, j in positions]
+            for (i, j), value in zip(positions, self._process_ints(values, length, tweak, decrypt, codebook_threshold)):
+                chunks[i][j] = codec.encode(value, length)
+        return ["".join(text_chunks) for text_chunks in chunks]
+
+    @staticmethod
+    def _transform_distinct(texts: t.List[str], transform: t.Callable[[t.List[str]], t.List[str]]) -> t.List[str]:
+        """Apply a transformation once per distinct text (FF3-1 is deterministic), preserving the order of texts."""
+        distinct = list(dict.fromkeys(texts))
+        results = dict(zip(distinct, transform(distinct)))
+        return [results[text] for text in texts]
 
     def encrypt(self, plaintext: bytes, params: FpeParams = _DEFAULT_FPE_PARAMS) -> bytes:
         """Deterministically encrypt plaintext using FF3-1 mode.
@@ -64,32 +211,25 @@ class FpeFf3(Fpe):
         :return: resulting ciphertext
         """
         pt: str = plaintext.decode(params.charset)
-        tweak: str = _hex_tweak_of(params.tweak)
+        tweak = _tweak_of(params.tweak)
         char_skipper = None
 
         if params.unknown_character_strategy == UnknownCharacterStrategy.FAIL:
-            if _util.has_unknown_chars(text=pt, known_chars=self._alphabet):
-                raise ValueError(f"Plaintext can only contain characters from the alphabet {self._alphabet}")
+            if _util.has_unknown_chars(text=pt, known_chars=self._alphabet.chars):
+                raise ValueError(f"Plaintext can only contain characters from the alphabet {self._alphabet.chars}")
         elif params.unknown_character_strategy == UnknownCharacterStrategy.SKIP:
-            char_skipper = _util.CharacterSkipper(pt, self._alphabet)
+            char_skipper = _util.CharacterSkipper(pt, self._alphabet.chars)
             pt = char_skipper.get_processed_text()
         elif params.unknown_character_strategy == UnknownCharacterStrategy.DELETE:
-            pt = _util.remove_unknown_chars(text=pt, known_chars=self._alphabet)
+            pt = _util.remove_unknown_chars(text=pt, known_chars=self._alphabet.chars)
         elif params.unknown_character_strategy == UnknownCharacterStrategy.REDACT:
             pt = _util.redact_unknown_chars(
                 text=pt,
-                known_chars=self._alphabet,
-                redaction_char=params.redaction_char or self._default_redaction_char,
+                known_chars=self._alphabet.chars,
+                redaction_char=params.redaction_char or self._alphabet.redaction_char,
             )
 
-        ct = []
-        for pos in range(0, len(pt), _MAX_CHUNK_SIZE):
-            chunk = pt[pos : min(pos + _MAX_CHUNK_SIZE, len(pt))]
-            if len(chunk) < _MIN_CHUNK_SIZE:
-                ct.append(chunk)
-            else:
-                ct.append(self._ff3.encrypt_with_tweak(plaintext=chunk, tweak=tweak))
-        ciphertext = "".join(ct)
+        ciphertext = self._process_texts([pt], tweak, decrypt=False)[0]
 
         if char_skipper and char_skipper.has_skipped():
             ciphertext = char_skipper.inject_skipped_into(ciphertext)
@@ -105,23 +245,226 @@ class FpeFf3(Fpe):
         :return: resulting plaintext
         """
         ct: str = ciphertext.decode(params.charset)
-        tweak: str = _hex_tweak_of(params.tweak)
+        tweak = _tweak_of(params.tweak)
         char_skipper = None
 
         if params.unknown_character_strategy == UnknownCharacterStrategy.SKIP:
-            char_skipper = _util.CharacterSkipper(ct, self._alphabet)
+            char_skipper = _util.CharacterSkipper(ct, self._alphabet.chars)
             ct = char_skipper.get_processed_text()
 
-        pt = []
-        for pos in range(0, len(ct), _MAX_CHUNK_SIZE):
-            chunk = ct[pos : min(pos + _MAX_CHUNK_SIZE, len(ct))]
-            if len(chunk) < _MIN_CHUNK_SIZE:
-                pt.append(chunk)
-            else:
-                pt.append(self._ff3.decrypt_with_tweak(ciphertext=chunk, tweak=tweak))
-        plaintext = "".join(pt)
+        plaintext = self._process_texts([ct], tweak, decrypt=True)[0]
 
         if char_skipper and char_skipper.has_skipped():
             plaintext = char_skipper.inject_skipped_into(plaintext)
 
         return plaintext.encode(params.charset)
+
+    def encrypt_stream(
+        self,
+        source: ByteSource,
+        params: FpeParams = _DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically encrypt a single, possibly very large, plaintext read from a stream, in constant memory.
+
+        The plaintext is decoded incrementally, and encrypted a window of chunks at a time. The concatenated output
+        equals the ciphertext that encrypt() would return for the whole plaintext. With the SKIP strategy, non-alphabet
+        characters that split a chunk are held back until the chunk is complete (see STREAM_MAX_PENDING).
+
+        :param source: binary file-like object or iterable of bytes to read the plaintext from
+        :param params: options that adjust how encryption will be performed
+        :param read_size: number of bytes to read at a time from file-like objects
+        :return: an iterator over the parts of the resulting ciphertext. If using the FAIL strategy, a ValueError is
+                 raised when reaching a non-alphabet character, possibly after parts of the ciphertext have been
+                 yielded.
+        """
+        texts = _stream.iter_texts(source, params.charset, read_size)
+        return _stream.encode_texts(self._process_stream(texts, params, decrypt=False), params.charset)
+
+    def decrypt_stream(
+        self,
+        source: ByteSource,
+        params: FpeParams = _DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically decrypt a single, possibly very large, ciphertext read from a stream, in constant memory.
+
+        The ciphertext is decoded incrementally, and decrypted a window of chunks at a time. The concatenated output
+        equals the plaintext that decrypt() would return for the whole ciphertext.
+
+        :param source: binary file-like object or iterable of bytes to read the ciphertext from
+        :param params: options that adjust how decryption will be performed. This should usually be the same as the
+                       params used to encrypt.
+        :param read_size: number of bytes to read at a time from file-like objects
+        :return: an iterator over the parts of the resulting plaintext
+        """
+        texts = _stream.iter_texts(source, params.charset, read_size)
+        return _stream.encode_texts(self._process_stream(texts, params, decrypt=True), params.charset)
+
+    def _process_stream(self, texts: t.Iterable[str], params: FpeParams, decrypt: bool) -> t.Iterator[str]:
+        """Encrypt or decrypt a text that arrives in parts, a window of STREAM_WINDOW_CHUNKS chunks at a time.
+
+        Unknown characters are handled per part (or per window for the SKIP strategy), which gives the same result as
+        handling them for the whole text, since they are handled character by character. The text is only cut after
+        whole chunks of alphabet characters, so it is chunked exactly like a text processed in one go, and non-alphabet
+        characters before the next alphabet character are passed through as soon as they arrive.
+        """
+        tweak = _tweak_of(params.tweak)
+        strategy = params.unknown_character_strategy
+        skip = strategy == UnknownCharacterStrategy.SKIP
+        known_chars = self._alphabet.chars
+        unknown_run = _util.unknown_chars_pattern(known_chars, runs=True)
+        window_size = _STREAM_WINDOW_CHUNKS * self._chunk_size
+        held: t.List[str] = []
+        held_size = 0
+        held_known = 0
+
+        for text in texts:
+            if not decrypt:
+                text = self._preprocess_stream_part(text, params)
+            if skip and not held_known:
+                # Nothing is held back, so the non-alphabet characters up to the next alphabet character are final
+                lead = unknown_run.match(text)
+                if lead:
+                    yield lead.group()
+                    text = text[lead.end() :]
+            if not text:
+                continue
+            held.append(text)
+            held_size += len(text)
+            held_known += len(_util.remove_unknown_chars(text=text, known_chars=known_chars))
+            if held_known < window_size and (held_size < _STREAM_MAX_PENDING or held_known < self._chunk_size):
+                continue
+
+            pending = "".join(held)
+            while held_known >= window_size or (len(pending) >= _STREAM_MAX_PENDING and held_known >= self._chunk_size):
+                count = min(window_size, held_known - held_known % self._chunk_size)
+                prefix = _util.known_chars_prefix_pattern(known_chars, count).match(pending)
+                cut = t.cast(t.Match[str], prefix).end()
+                yield self._process_window(pending[:cut], tweak, skip, decrypt)
+                held_known -= count
+                lead = unknown_run.match(pending, cut) if skip else None
+                if lead:
+                    yield lead.group()
+                    cut = lead.end()
+                pending = pending[cut:]
+            held = [pending] if pending else []
+            held_size = len(pending)
+
+        if held:
+            yield self._process_window("".join(held), tweak, skip, decrypt)
+
+    def _preprocess_stream_part(self, text: str, params: FpeParams) -> str:
+        """Handle the unknown characters of a part of a streamed plaintext, except for the SKIP strategy."""
+        known_chars = self._alphabet.chars
+        strategy = params.unknown_character_strategy
+        if strategy == UnknownCharacterStrategy.FAIL:
+            if _util.has_unknown_chars(text=text, known_chars=known_chars):
+                raise ValueError(f"Plaintext can only contain characters from the alphabet {known_chars}")
+        elif strategy == UnknownCharacterStrategy.DELETE:
+            text = _util.remove_unknown_chars(text=text, known_chars=known_chars)
+        elif strategy == UnknownCharacterStrategy.REDACT:
+            text = _util.redact_unknown_chars(
+                text=text,
+                known_chars=known_chars,
+                redaction_char=params.redaction_char or self._alphabet.redaction_char,
+            )
+        return text
+
+    def _process_window(self, text: str, tweak: bytes, skip: bool, decrypt: bool) -> str:
+        """Encrypt or decrypt a window of a streamed text, leaving non-alphabet characters as-is if skip is True."""
+        if not skip:
+            return self._process_texts([text], tweak, decrypt)[0]
+        column = _util.preprocess([text], known_chars=self._alphabet.chars, strategy=UnknownCharacterStrategy.SKIP)
+        processed = self._process_texts(column.texts, tweak, decrypt)[0]
+        return _util.inject_chars(processed, column.skipped[0])
+
+    def _plan_batch(
+        self, values: t.Sequence[bytes], params: FpeParams, max_workers: t.Optional[int], decrypt: bool
+    ) -> t.Tuple[_planner.ExecutionPlan, _planner.BatchProfile]:
+        """Choose how to execute a batch, taking the alphabet, chunking and codebooks of the primitive into account."""
+        profile = _planner.profile_batch(values, params.charset, self._alphabet.chars)
+        plan = _planner.choose_plan(
+            profile,
+            max_workers,
+            radix=self._alphabet.radix,
+            max_codebook_domain=self._codebook_threshold,
+            chunk_size=self._chunk_size,
+            min_length=max(_MIN_CHUNK_SIZE, self._alphabet.min_len),
+            picklable=True,
+            fail_fast=not decrypt and params.unknown_character_strategy == UnknownCharacterStrategy.FAIL,
+        )
+        return plan, profile
+
+    def _execute_plan(
+        self, plan: _planner.ExecutionPlan, values: t.Sequence[bytes], params: FpeParams, decrypt: bool
+    ) -> t.List[bytes]:
+        """Execute a batch according to a plan, building codebooks up to the threshold of the plan."""
+        process = self._decrypt_batch if decrypt else self._encrypt_batch
+        fn = functools.partial(process, params=params, codebook_threshold=plan.codebook_threshold)
+        return _batch.execute(fn, values, plan.mode, plan.max_workers, plan.dedup)
+
+    def _encrypt_batch(
+        self, plaintexts: t.List[bytes], params: FpeParams, codebook_threshold: int = 0
+    ) -> t.List[bytes]:
+        """Encrypt a batch of plaintexts using FF3-1 mode, in the calling thread.
+
+        Unknown characters are handled for the whole batch in one preprocessing pass, and each distinct plaintext is
+        only encrypted once.
+
+        :param plaintexts: plaintexts to encrypt
+        :param params: options that adjust how encryption will be performed
+        :param codebook_threshold: max domain size to use (and build) codebooks for, if above that of the primitive
+        :raises ValueError: if using the FAIL strategy and any plaintext contains non-alphabet characters
+        :return: resulting ciphertexts, in the same order as the plaintexts
+        """
+        tweak = _tweak_of(params.tweak)
+        column = _util.preprocess(
+            [plaintext.decode(params.charset) for plaintext in plaintexts],
+            known_chars=self._alphabet.chars,
+            strategy=params.unknown_character_strategy,
+            redaction_char=params.redaction_char or self._alphabet.redaction_char,
+        )
+        if params.unknown_character_strategy == UnknownCharacterStrategy.FAIL and not all(column.valid):
+            raise ValueError(f"Plaintexts can only contain characters from the alphabet {self._alphabet.chars}")
+
+        ciphertexts = self._transform_distinct(
+            column.texts, lambda distinct: self._process_texts(distinct, tweak, False, codebook_threshold)
+        )
+        if column.skipped:
+            ciphertexts = [_util.inject_chars(ct, skipped) for ct, skipped in zip(ciphertexts, column.skipped)]
+        return [ciphertext.encode(params.charset) for ciphertext in ciphertexts]
+
+    def _decrypt_batch(
+        self, ciphertexts: t.List[bytes], params: FpeParams, codebook_threshold: int = 0
+    ) -> t.List[bytes]:
+        """Decrypt a batch of ciphertexts using FF3-1 mode, in the calling thread.
+
+        :param ciphertexts: ciphertexts to decrypt
+        :param params: options that adjust how decryption will be performed. This should usually be the same as the
+                       params used to encrypt.
+        :param codebook_threshold: max domain size to use (and build) codebooks for, if above that of the primitive
+        :return: resulting plaintexts, in the same order as the ciphertexts
+        """
+        tweak = _tweak_of(params.tweak)
+        texts = [ciphertext.decode(params.charset) for ciphertext in ciphertexts]
+        skipped: t.List[t.Sequence[t.Tuple[int, str]]] = []
+        if params.unknown_character_strategy == UnknownCharacterStrategy.SKIP:
+            column = _util.preprocess(texts, known_chars=self._alphabet.chars, strategy=UnknownCharacterStrategy.SKIP)
+            texts, skipped = column.texts, column.skipped
+
+        plaintexts = self._transform_distinct(
+            texts, lambda distinct: self._process_texts(distinct, tweak, True, codebook_threshold)
+        )
+        if skipped:
+            plaintexts = [_util.inject_chars(pt, s) for pt, s in zip(plaintexts, skipped)]
+        return [plaintext.encode(params.charset) for plaintext in plaintexts]
+
+
+_RESTORED_PRIMITIVES_CACHE_SIZE = 1024
+"""Max number of unpickled FpeFf3 primitives to keep per process."""
+
+
+@functools.lru_cache(maxsize=_RESTORED_PRIMITIVES_CACHE_SIZE)
+def _restore_fpe_ff3(key: bytes, alphabet: str, codebook_threshold: int, codebook_dir: t.Optional[str]) -> FpeFf3:
+    return FpeFf3(key=key, alphabet=alphabet, codebook_threshold=codebook_threshold, codebook_dir=codebook_dir)
@@ -1,4 +1,5 @@
 import secrets
+from typing import Optional
 from typing import Type
 
 import tink
@@ -15,10 +16,15 @@ _FPE_FFX_KEY_TYPE_URL = "type.googleapis.com/ssb.crypto.tink.FpeFfxKey"
 
 
 class FpeFfxKeyManager(tink.core.KeyManager[FpeFfxKey]):  # type: ignore
-    """Tink key manager for FPE FFX keys."""
+    """Tink key manager for FPE FFX keys.
 
-    def __init__(self) -> None:
+    Options given to the key manager are passed on to every primitive it creates.
+    """
+
+    def __init__(self, codebook_threshold: int = 0, codebook_dir: Optional[str] = None) -> None:
         self._type_url = _FPE_FFX_KEY_TYPE_URL
+        self._codebook_threshold = codebook_threshold
+        self._codebook_dir = codebook_dir
 
     def primitive_class(self) -> Type[_fpe.Fpe]:
         """Return the primitive type."""
@@ -28,7 +34,12 @@ class FpeFfxKeyManager(tink.core.KeyManager[FpeFfxKey]):  # type: ignore
         """Return the primitive."""
         fpe_ffx_key = FpeFfxKey()
         fpe_ffx_key.ParseFromString(key_data.value)
-        return _fpe_ff3.FpeFf3(key=fpe_ffx_key.key_value, alphabet=fpe_ffx_key.params.alphabet)
+        return _fpe_ff3.FpeFf3(
+            key=fpe_ffx_key.key_value,
+            alphabet=fpe_ffx_key.params.alphabet,
+            codebook_threshold=self._codebook_threshold,
+            codebook_dir=self._codebook_dir,
+        )
 
     def key_type(self) -> str:
         """Return the key type."""
@@ -51,9 +62,15 @@ class FpeFfxKeyManager(tink.core.KeyManager[FpeFfxKey]):  # type: ignore
         return key_data
 
 
-def register() -> None:
-    """Register the key manager with Tink."""
-    key_manager = FpeFfxKeyManager()
+def register(codebook_threshold: int = 0, codebook_dir: Optional[str] = None) -> None:
+    """Register the key manager with Tink.
+
+    Tink keeps the first key manager registered for a key type, so the options only take effect on the first call.
+
+    :param codebook_threshold: max domain size (radix^length) to precompute FF3-1 codebooks for. 0 disables codebooks.
+    :param codebook_dir: optional directory to persist codebooks to
+    """
+    key_manager = FpeFfxKeyManager(codebook_threshold=codebook_threshold, codebook_dir=codebook_dir)
     tink.core.Registry.register_key_manager(key_manager, new_key_allowed=True)
     fpe_wrapper = _fpe_wrapper.FpeWrapper()
     tink.core.Registry.register_primitive_wrapper(fpe_wrapper)
@@ -40,3 +40,15 @@ FPE_FF31_128_ALPHANUMERIC = _create_fpe_ffx_key_template(
 FPE_FF31_256_DIGITS = _create_fpe_ffx_key_template(key_size=256, mode=FfxMode.FF31, alphabet=CharacterGroup.DIGITS)
 FPE_FF31_192_DIGITS = _create_fpe_ffx_key_template(key_size=192, mode=FfxMode.FF31, alphabet=CharacterGroup.DIGITS)
 FPE_FF31_128_DIGITS = _create_fpe_ffx_key_template(key_size=128, mode=FfxMode.FF31, alphabet=CharacterGroup.DIGITS)
+FPE_FF31_256_HEX = _create_fpe_ffx_key_template(key_size=256, mode=FfxMode.FF31, alphabet=CharacterGroup.HEX)
+FPE_FF31_192_HEX = _create_fpe_ffx_key_template(key_size=192, mode=FfxMode.FF31, alphabet=CharacterGroup.HEX)
+FPE_FF31_128_HEX = _create_fpe_ffx_key_template(key_size=128, mode=FfxMode.FF31, alphabet=CharacterGroup.HEX)
+FPE_FF31_256_BASE64URL = _create_fpe_ffx_key_template(
+    key_size=256, mode=FfxMode.FF31, alphabet=CharacterGroup.BASE64URL
+)
+FPE_FF31_192_BASE64URL = _create_fpe_ffx_key_template(
+    key_size=192, mode=FfxMode.FF31, alphabet=CharacterGroup.BASE64URL
+)
+FPE_FF31_128_BASE64URL = _create_fpe_ffx_key_template(
+    key_size=128, mode=FfxMode.FF31, alphabet=CharacterGroup.BASE64URL
+)
@@ -1,19 +1,46 @@
 """Format-Preserving Encryption wrapper."""
 
+import functools
+from typing import Callable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
 from typing import Type
 from typing import cast
 
 from tink import core
+from tink.proto import tink_pb2
 
 from tink_fpe import _fpe
+from tink_fpe import _stream
+from tink_fpe._batch import ExecutionMode
+
+
+_PrimitiveEntry = Tuple[_fpe.Fpe, int, int, int]
+"""A primitive set entry, reduced to (primitive, status, output prefix type, key id) when pickling."""
 
 
 class _WrappedFpe(_fpe.Fpe):
-    """Implements FPE for a set of Fpe primitives."""
+    """Implements FPE for a set of Fpe primitives.
+
+    A _WrappedFpe can be pickled as long as its primitives can. Unpickling the same keyset several times within a
+    process yields a single, shared instance.
+    """
 
     def __init__(self, pset: core.PrimitiveSet):
         self._primitive_set = pset
 
+    def __reduce__(self) -> Tuple[Callable[..., "_WrappedFpe"], Tuple[Tuple[_PrimitiveEntry, ...], int]]:
+        """Reduce the primitive set to its entries and primary key id when pickled."""
+        entries = tuple(
+            (e.primitive, e.status, e.output_prefix_type, e.key_id)
+            for entries in self._primitive_set.all()
+            for e in entries
+        )
+        return _restore_wrapped_fpe, (entries, self._primitive_set.primary().key_id)
+
     def encrypt(self, plaintext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
         """Deterministically encrypt plaintext using Format-Preserving Encryption."""
         primary = self._primitive_set.primary()
@@ -31,6 +58,80 @@ class _WrappedFpe(_fpe.Fpe):
         # nothing works.
         raise core.TinkError("Decryption failed.")
 
+    def _key_primitives(self) -> List[_fpe.Fpe]:
+        """Return the primitive of each key in the keyset."""
+        return [p for entry in self._primitive_set.raw_primitives() for p in entry.primitive._key_primitives()]
+
+    def _execute_auto(
+        self, values: Sequence[bytes], params: _fpe.FpeParams, max_workers: Optional[int], decrypt: bool
+    ) -> List[bytes]:
+        """Let the primitive of the primary key (or of each RAW key when decrypting) plan and execute the batch."""
+        if not decrypt:
+            primary = self._primitive_set.primary()
+            return cast(List[bytes], primary.primitive.encrypt_batch(values, params, ExecutionMode.AUTO, max_workers))
+        # Let's try all RAW keys.
+        for entry in self._primitive_set.raw_primitives():
+            try:
+                return cast(List[bytes], entry.primitive.decrypt_batch(values, params, ExecutionMode.AUTO, max_workers))
+            except core.TinkError:
+                pass
+        # nothing works.
+        raise core.TinkError("Decryption failed.")
+
+    def _encrypt_batch(self, plaintexts: List[bytes], params: _fpe.FpeParams) -> List[bytes]:
+        """Encrypt a batch of plaintexts in the calling thread."""
+        primary = self._primitive_set.primary()
+        return cast(List[bytes], primary.primitive.encrypt_batch(plaintexts, params))
+
+    def _decrypt_batch(self, ciphertexts: List[bytes], params: _fpe.FpeParams) -> List[bytes]:
+        """Decrypt a batch of ciphertexts in the calling thread."""
+        # Let's try all RAW keys.
+        for entry in self._primitive_set.raw_primitives():
+            try:
+                return cast(List[bytes], entry.primitive.decrypt_batch(ciphertexts, params))
+            except core.TinkError:
+                pass
+        # nothing works.
+        raise core.TinkError("Decryption failed.")
+
+    def encrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> Iterator[bytes]:
+        """Deterministically encrypt a plaintext read from a stream, using the primary key."""
+        primary = self._primitive_set.primary()
+        return cast(Iterator[bytes], primary.primitive.encrypt_stream(source, params, read_size))
+
+    def decrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> Iterator[bytes]:
+        """Deterministically decrypt a ciphertext read from a stream, using the first RAW key."""
+        # A stream can only be consumed once, so unlike decrypt() there is no falling back to other keys.
+        raw_primitives = self._primitive_set.raw_primitives()
+        if not raw_primitives:
+            raise core.TinkError("Decryption failed.")
+        return cast(Iterator[bytes], raw_primitives[0].primitive.decrypt_stream(source, params, read_size))
+
+
+_RESTORED_PRIMITIVES_CACHE_SIZE = 1024
+"""Max number of unpickled wrapped primitives to keep per process."""
+
+
+@functools.lru_cache(maxsize=_RESTORED_PRIMITIVES_CACHE_SIZE)
+def _restore_wrapped_fpe(entries: Tuple[_PrimitiveEntry, ...], primary_key_id: int) -> _WrappedFpe:
+    pset = core.new_primitive_set(_fpe.Fpe)
+    for primitive, status, output_prefix_type, key_id in entries:
+        key = tink_pb2.Keyset.Key(key_id=key_id, status=status, output_prefix_type=output_prefix_type)
+        entry = pset.add_primitive(primitive, key)
+        if key_id == primary_key_id:
+            pset.set_primary(entry)
+    return _WrappedFpe(pset)
+
 
 class FpeWrapper(core.PrimitiveWrapper[_fpe.Fpe, _fpe.Fpe]):  # type: ignore
     """FpeWrapper is a PrimitiveWrapper for Format-Preserving Encryption.
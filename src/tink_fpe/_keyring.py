@@ -0,0 +1,194 @@
+"""This module provides a keyring of Fpe primitives, for processing data that belongs to many tenants."""
+
+import collections
+import os
+import threading
+import typing as t
+
+from tink import aead
+
+from tink_fpe import _fpe
+from tink_fpe._batch import ExecutionMode
+from tink_fpe._metrics import Metrics
+from tink_fpe._reloadable_fpe import keyset_handle_of
+
+
+KeyringSource = t.Union[str, "os.PathLike[str]", t.Callable[[str], str]]
+"""A directory holding a JSON keyset file named ``<key reference>.json`` per key reference, or a callable that
+returns the JSON keyset of a key reference."""
+
+
+def read_keyset(source: KeyringSource, key_ref: str) -> str:
+    """Read the JSON keyset of a key reference from a keyring source.
+
+    :param source: directory holding a JSON keyset file per key reference, or a callable that returns the JSON keyset
+                   of a key reference
+    :param key_ref: the key reference
+    :raises ValueError: if the key reference is not a valid file name
+    :return: the JSON keyset
+    """
+    if callable(source):
+        return source(key_ref)
+    if not key_ref or key_ref in (os.curdir, os.pardir) or any(sep and sep in key_ref for sep in (os.sep, os.altsep)):
+        raise ValueError(f"Invalid key reference '{key_ref}'")
+    with open(os.path.join(source, f"{key_ref}.json"), encoding="utf-8") as f:
+        return f.read()
+
+
+class FpeKeyring:
+    """FpeKeyring holds the Fpe primitives of many keysets, e.g. one keyset per tenant or dataset.
+
+    Keysets are loaded lazily, when a key reference is first used. The resulting primitives are kept in a bounded
+    cache, evicting the least recently used primitive when full, so that switching between keys does not require the
+    keyset to be parsed and the primitive to be created again.
+
+    The batch methods take a key reference per value. Values are grouped by key reference, each group is processed
+    with the batch method of its primitive, and the results are returned in the original order.
+
+    The following metrics are recorded: ``keyring.hits``, ``keyring.misses``, ``keyring.evictions`` and
+    ``keyring.size``.
+    """
+
+    def __init__(
+        self,
+        source: KeyringSource,
+        master_key_aead: t.Optional[aead.Aead] = None,
+        max_size: int = 256,
+        metrics: t.Optional[Metrics] = None,
+    ) -> None:
+        """Create a keyring.
+
+        :param source: directory holding a JSON keyset file per key reference, or a callable that returns the JSON
+                       keyset of a key reference
+        :param master_key_aead: AEAD (e.g. KMS backed) to unwrap encrypted keysets with. If None, keysets are
+                                expected to be in cleartext.
+        :param max_size: max number of primitives to keep
+        :param metrics: where to record cache metrics
+        :raises ValueError: if max_size is less than 1
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self._source = source
+        self._master_key_aead = master_key_aead
+        self._max_size = max_size
+        self.metrics = metrics or Metrics()
+        self._primitives: t.OrderedDict[str, _fpe.Fpe] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def primitive(self, key_ref: str) -> _fpe.Fpe:
+        """Return the primitive of a key reference, loading its keyset if not already cached.
+
+        :param key_ref: the key reference, e.g. a tenant id
+        :return: the primitive
+        """
+        with self._lock:
+            fpe = self._primitives.get(key_ref)
+            if fpe is not None:
+                self._primitives.move_to_end(key_ref)
+                self.metrics.increment("keyring.hits")
+                return fpe
+
+        self.metrics.increment("keyring.misses")
+        keyset_handle = keyset_handle_of(read_keyset(self._source, key_ref), self._master_key_aead)
+        loaded = t.cast(_fpe.Fpe, keyset_handle.primitive(_fpe.Fpe))
+
+        with self._lock:
+            # Another thread might have loaded the same keyset in the meantime
+            fpe = self._primitives.setdefault(key_ref, loaded)
+            self._primitives.move_to_end(key_ref)
+            while len(self._primitives) > self._max_size:
+                self._primitives.popitem(last=False)
+                self.metrics.increment("keyring.evictions")
+            self.metrics.set("keyring.size", len(self._primitives))
+        return fpe
+
+    def evict(self, key_ref: str) -> None:
+        """Drop the cached primitive of a key reference, e.g. after its keyset has been rotated.
+
+        :param key_ref: the key reference
+        """
+        with self._lock:
+            self._primitives.pop(key_ref, None)
+            self.metrics.set("keyring.size", len(self._primitives))
+
+    def encrypt(self, key_ref: str, plaintext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically encrypt plaintext using the primitive of a key reference.
+
+        :param key_ref: the key reference
+        :param plaintext: plaintext to encrypt
+        :param params: options that adjust how encryption will be performed
+        :return: resulting ciphertext
+        """
+        return self.primitive(key_ref).encrypt(plaintext, params)
+
+    def decrypt(self, key_ref: str, ciphertext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically decrypt ciphertext using the primitive of a key reference.
+
+        :param key_ref: the key reference
+        :param ciphertext: ciphertext to decrypt
+        :param params: options that adjust how decryption will be performed
+        :return: resulting plaintext
+        """
+        return self.primitive(key_ref).decrypt(ciphertext, params)
+
+    def encrypt_batch(
+        self,
+        key_refs: t.Sequence[str],
+        plaintexts: t.Sequence[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically encrypt a batch of plaintexts, each using the primitive of its key reference.
+
+        :param key_refs: key reference per plaintext
+        :param plaintexts: plaintexts to encrypt
+        :param params: options that adjust how encryption will be performed
+        :param mode: how to execute the batch of each key reference, e.g. using a pool of threads
+        :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+        :return: resulting ciphertexts, in the same order as the plaintexts
+        """
+        return self._process_batch(key_refs, plaintexts, params, mode, max_workers, decrypt=False)
+
+    def decrypt_batch(
+        self,
+        key_refs: t.Sequence[str],
+        ciphertexts: t.Sequence[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically decrypt a batch of ciphertexts, each using the primitive of its key reference.
+
+        :param key_refs: key reference per ciphertext
+        :param ciphertexts: ciphertexts to decrypt
+        :param params: options that adjust how decryption will be performed
+        :param mode: how to execute the batch of each key reference, e.g. using a pool of threads
+        :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+        :return: resulting plaintexts, in the same order as the ciphertexts
+        """
+        return self._process_batch(key_refs, ciphertexts, params, mode, max_workers, decrypt=True)
+
+    def _process_batch(
+        self,
+        key_refs: t.Sequence[str],
+        values: t.Sequence[bytes],
+        params: _fpe.FpeParams,
+        mode: ExecutionMode,
+        max_workers: t.Optional[int],
+        decrypt: bool,
+    ) -> t.List[bytes]:
+        """Group values by key reference, process each group in a batch, and restore the original order."""
+        if len(key_refs) != len(values):
+            raise ValueError(f"Got {len(key_refs)} key references for {len(values)} values")
+        positions_by_key_ref: t.Dict[str, t.List[int]] = {}
+        for i, key_ref in enumerate(key_refs):
+            positions_by_key_ref.setdefault(key_ref, []).append(i)
+
+        results: t.List[bytes] = [b""] * len(values)
+        for key_ref, positions in positions_by_key_ref.items():
+            fpe = self.primitive(key_ref)
+            process = fpe.decrypt_batch if decrypt else fpe.encrypt_batch
+            for i, result in zip(positions, process([values[i] for i in positions], params, mode, max_workers)):
+                results[i] = result
+        return results
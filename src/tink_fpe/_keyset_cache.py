@@ -0,0 +1,227 @@
+"""This module provides a cache of unwrapped keysets, which spares a KMS round-trip each time a keyset is used."""
+
+import collections
+import concurrent.futures
+import threading
+import time
+import typing as t
+
+import tink
+from tink import aead
+
+from tink_fpe import _fpe
+from tink_fpe._keyring import KeyringSource
+from tink_fpe._keyring import read_keyset
+from tink_fpe._metrics import Metrics
+from tink_fpe._reloadable_fpe import keyset_handle_of
+
+
+_REFRESH_RETRY_INTERVAL = 5.0
+"""Min number of seconds between attempts to refresh a keyset after a failed refresh."""
+
+
+class _Entry(t.NamedTuple):
+    """A cached keyset, with its primitive and the (clock) times it is to be refreshed at and expires at."""
+
+    keyset_handle: tink.KeysetHandle
+    primitive: _fpe.Fpe
+    refresh_at: float
+    expires_at: float
+
+
+class KeysetCache:
+    """KeysetCache holds unwrapped keyset handles (and their Fpe primitives) in memory for a limited time.
+
+    Unwrapping an encrypted keyset costs a round-trip to the KMS holding the master key. KeysetCache loads the keyset
+    of a key reference once, and serves it from memory until its time to live (TTL) has passed, so that the KMS is
+    only asked again every once in a while, e.g. to honour a revoked master key.
+
+    Keysets are refreshed ahead of expiry: the first use of a keyset after ``refresh_after`` seconds returns the
+    cached keyset, and reloads it in a background thread. Keysets that are in use thus never expire, and using them
+    never waits for the KMS. If a refresh fails, the cached keyset is kept (and the refresh retried) until it expires.
+
+    Concurrent loads of the same keyset are collapsed into one (single-flight): the first caller loads the keyset, and
+    the others wait for its result. The cache is bounded, evicting the least recently used keyset when full.
+
+    The following metrics are recorded: ``keyset_cache.hits``, ``keyset_cache.misses``, ``keyset_cache.loads``,
+    ``keyset_cache.load_failures``, ``keyset_cache.refreshes``, ``keyset_cache.refresh_failures``,
+    ``keyset_cache.evictions``, ``keyset_cache.size`` and ``keyset_cache.last_load_duration_seconds``. Listeners are
+    notified about ``load_failed`` and ``refresh_failed`` events.
+    """
+
+    def __init__(
+        self,
+        source: KeyringSource,
+        master_key_aead: t.Optional[aead.Aead] = None,
+        ttl: float = 300.0,
+        refresh_after: t.Optional[float] = None,
+        max_size: int = 256,
+        max_workers: int = 2,
+        metrics: t.Optional[Metrics] = None,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        """Create a keyset cache.
+
+        :param source: directory holding a JSON keyset file per key reference, or a callable that returns the JSON
+                       keyset of a key reference
+        :param master_key_aead: AEAD (e.g. KMS backed) to unwrap encrypted keysets with. If None, keysets are
+                                expected to be in cleartext.
+        :param ttl: seconds a loaded keyset is used for
+        :param refresh_after: seconds after which a used keyset is reloaded in the background. Defaults to 80% of the
+                              TTL.
+        :param max_size: max number of keysets to keep
+        :param max_workers: max number of threads refreshing and prefetching keysets in the background
+        :param metrics: where to record cache metrics
+        :param clock: monotonic clock returning seconds
+        :raises ValueError: if ttl is not positive, refresh_after is not within (0, ttl], or max_size or max_workers is
+                            less than 1
+        """
+        if refresh_after is None:
+            refresh_after = ttl * 0.8
+        if ttl <= 0:
+            raise ValueError("ttl must be positive")
+        if not 0 < refresh_after <= ttl:
+            raise ValueError("refresh_after must be positive, and at most ttl")
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self._source = source
+        self._master_key_aead = master_key_aead
+        self._ttl = ttl
+        self._refresh_after = refresh_after
+        self._max_size = max_size
+        self._max_workers = max_workers
+        self.metrics = metrics or Metrics()
+        self._clock = clock
+        self._entries: t.OrderedDict[str, _Entry] = collections.OrderedDict()
+        self._loading: t.Dict[str, "concurrent.futures.Future[_Entry]"] = {}
+        self._executor: t.Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def keyset_handle(self, key_ref: str) -> tink.KeysetHandle:
+        """Return the keyset handle of a key reference, loading it if not cached (or expired).
+
+        :param key_ref: the key reference, e.g. a tenant id
+        :return: the keyset handle
+        """
+        return self._get(key_ref).keyset_handle
+
+    def primitive(self, key_ref: str) -> _fpe.Fpe:
+        """Return the Fpe primitive of a key reference, loading its keyset if not cached (or expired).
+
+        :param key_ref: the key reference, e.g. a tenant id
+        :return: the primitive
+        """
+        return self._get(key_ref).primitive
+
+    def prefetch(self, key_refs: t.Iterable[str]) -> None:
+        """Load the keysets of key references in the background, unless they are cached or already being loaded.
+
+        :param key_refs: the key references, e.g. the tenants of an upcoming job
+        """
+        now = self._clock()
+        with self._lock:
+            for key_ref in key_refs:
+                entry = self._entries.get(key_ref)
+                if entry is None or now >= entry.refresh_at:
+                    self._load_in_background(key_ref, refresh=entry is not None and now < entry.expires_at)
+
+    def evict(self, key_ref: str) -> None:
+        """Drop the cached keyset of a key reference, e.g. after it has been rotated.
+
+        :param key_ref: the key reference
+        """
+        with self._lock:
+            self._entries.pop(key_ref, None)
+            self.metrics.set("keyset_cache.size", len(self._entries))
+
+    def close(self) -> None:
+        """Wait for background loads to complete, and stop loading keysets in the background."""
+        with self._lock:
+            self._closed = True
+            executor = self._executor
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self) -> "KeysetCache":
+        """Return the cache itself, to be closed on exit."""
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        """Stop loading keysets in the background."""
+        self.close()
+
+    def _get(self, key_ref: str) -> _Entry:
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key_ref)
+            if entry is not None and now < entry.expires_at:
+                self._entries.move_to_end(key_ref)
+                self.metrics.increment("keyset_cache.hits")
+                if now >= entry.refresh_at:
+                    self._load_in_background(key_ref, refresh=True)
+                return entry
+
+            self.metrics.increment("keyset_cache.misses")
+            future = self._loading.get(key_ref)
+            loading = future is not None
+            if future is None:
+                future = self._loading[key_ref] = concurrent.futures.Future()
+
+        if not loading:
+            # Other threads asking for the keyset in the meantime wait for the result of this load
+            self._load(key_ref, future, refresh=False)
+        return future.result()
+
+    def _load_in_background(self, key_ref: str, refresh: bool) -> None:
+        """Start loading a keyset in a background thread, unless it is already being loaded. Requires the lock."""
+        if self._closed or key_ref in self._loading:
+            return
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="tink-fpe-keyset-loader"
+            )
+        future = self._loading[key_ref] = concurrent.futures.Future()
+        self._executor.submit(self._load, key_ref, future, refresh)
+
+    def _load(self, key_ref: str, future: "concurrent.futures.Future[_Entry]", refresh: bool) -> None:
+        """Load a keyset, cache it, and hand it to the callers waiting for it."""
+        start, started = self._clock(), time.perf_counter()
+        try:
+            keyset_handle = keyset_handle_of(read_keyset(self._source, key_ref), self._master_key_aead)
+            entry = _Entry(
+                keyset_handle=keyset_handle,
+                primitive=t.cast(_fpe.Fpe, keyset_handle.primitive(_fpe.Fpe)),
+                refresh_at=start + self._refresh_after,
+                expires_at=start + self._ttl,
+            )
+        except BaseException as e:  # noqa: B902 - handed to the callers waiting for the keyset
+            with self._lock:
+                del self._loading[key_ref]
+                stale = self._entries.get(key_ref)
+                if refresh and stale is not None:
+                    self._entries[key_ref] = stale._replace(refresh_at=self._clock() + _REFRESH_RETRY_INTERVAL)
+            future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            if refresh:
+                self.metrics.increment("keyset_cache.refresh_failures")
+                self.metrics.emit("refresh_failed", key_ref=key_ref, error=e)
+            else:
+                self.metrics.increment("keyset_cache.load_failures")
+                self.metrics.emit("load_failed", key_ref=key_ref, error=e)
+            return
+
+        with self._lock:
+            del self._loading[key_ref]
+            self._entries[key_ref] = entry
+            self._entries.move_to_end(key_ref)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self.metrics.increment("keyset_cache.evictions")
+            self.metrics.set("keyset_cache.size", len(self._entries))
+        self.metrics.increment("keyset_cache.refreshes" if refresh else "keyset_cache.loads")
+        self.metrics.set("keyset_cache.last_load_duration_seconds", time.perf_counter() - started)
+        future.set_result(entry)
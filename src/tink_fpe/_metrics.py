@@ -0,0 +1,58 @@
+"""This module provides a minimal instrumentation surface for Tink FPE components."""
+
+import threading
+import typing as t
+
+
+MetricsListener = t.Callable[[str, t.Mapping[str, t.Any]], None]
+"""Callable notified of instrumentation events with the event name and its attributes."""
+
+
+class Metrics:
+    """Metrics holds named counters and gauges, and notifies listeners about events.
+
+    Listeners can be used to bridge events to a monitoring system (e.g. Prometheus or OpenTelemetry). They are
+    invoked synchronously by the thread emitting the event, and must thus be quick and must not raise.
+    """
+
+    def __init__(self) -> None:
+        self._values: t.Dict[str, float] = {}
+        self._listeners: t.List[MetricsListener] = []
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: float = 1) -> None:
+        """Increment a counter."""
+        with self._lock:
+            self._values[name] = self._values.get(name, 0) + amount
+
+    def set(self, name: str, value: float) -> None:
+        """Set a gauge."""
+        with self._lock:
+            self._values[name] = value
+
+    def get(self, name: str, default: float = 0) -> float:
+        """Return the current value of a counter or gauge."""
+        with self._lock:
+            return self._values.get(name, default)
+
+    def snapshot(self) -> t.Dict[str, float]:
+        """Return a copy of all counters and gauges."""
+        with self._lock:
+            return dict(self._values)
+
+    def add_listener(self, listener: MetricsListener) -> None:
+        """Register a listener to be notified about events."""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: MetricsListener) -> None:
+        """Unregister a listener."""
+        with self._lock:
+            self._listeners.remove(listener)
+
+    def emit(self, event: str, **attributes: t.Any) -> None:
+        """Notify all listeners about an event."""
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(event, attributes)
@@ -0,0 +1,239 @@
+"""This module provides the planner behind ExecutionMode.AUTO, which chooses how to execute a batch from a sample."""
+
+import collections
+import contextlib
+import contextvars
+import math
+import os
+import typing as t
+
+from tink_fpe._batch import ExecutionMode
+from tink_fpe._metrics import Metrics
+
+
+_SAMPLE_SIZE = 1024
+"""Max number of values to sample when profiling a batch."""
+
+_DEDUP_MAX_DISTINCT_RATIO = 0.9
+"""Above this ratio of distinct values, removing duplicates before splitting a batch costs more than it saves."""
+
+_MAX_AUTO_CODEBOOK_DOMAIN = 1 << 20
+"""The largest domain (radix^length) the planner builds codebooks for, i.e. max 8 MiB per codebook."""
+
+_CODEBOOK_PAYOFF = 2
+"""A codebook is built if its domain is at most this many times the (estimated) number of distinct values.
+
+Building a codebook costs one encryption per domain value, so it breaks even with encrypting the distinct values of a
+batch at 1. The codebook is kept by the primitive, though, and serves later batches of the same tweak and length, and
+their decryption, so it is built even if it costs up to twice as much as the batch at hand."""
+
+_MIN_CHUNKS_PER_WORKER = 5_000
+"""Min number of chunks to encrypt per worker for a pool of threads to pay off."""
+
+_MIN_CHUNKS_PER_PROCESS = 50_000
+"""Min number of chunks to encrypt per worker for a pool of processes to pay off, given their startup cost."""
+
+_DEFAULT_CHUNK_SIZE = 30
+"""Chunk size assumed when estimating the work of primitives that do not tell their chunk size."""
+
+
+metrics = Metrics()
+"""Planner metrics: ``planner.plans.<strategy>`` and ``planner.values`` counters, ``planner.last_throughput`` and
+``planner.last_duration_seconds`` gauges, and a ``batch_plan`` event per executed plan."""
+
+_pinned: "contextvars.ContextVar[t.Optional[ExecutionPlan]]" = contextvars.ContextVar("pinned_plan", default=None)
+
+
+class BatchProfile(t.NamedTuple):
+    """Statistics of a batch, estimated from a sample of its values."""
+
+    size: int
+    """Number of values in the batch."""
+
+    sample_size: int
+    """Number of values sampled."""
+
+    distinct_ratio: float
+    """Estimated ratio of distinct values in the batch."""
+
+    conforming_ratio: float
+    """Ratio of sampled values that only contain alphabet characters."""
+
+    mean_length: float
+    """Mean number of alphabet characters per sampled value."""
+
+    lengths: t.FrozenSet[int]
+    """Distinct numbers of alphabet characters of the sampled values."""
+
+    @property
+    def distinct_estimate(self) -> int:
+        """Estimated number of distinct values in the batch."""
+        return max(1, round(self.size * self.distinct_ratio))
+
+
+class ExecutionPlan(t.NamedTuple):
+    """ExecutionPlan describes how a batch is executed. It is chosen by the planner, or pinned with pin_plan()."""
+
+    mode: ExecutionMode = ExecutionMode.SERIAL
+    """How to execute the batch. Never ExecutionMode.AUTO."""
+
+    max_workers: int = 1
+    """Number of threads or processes to use for the concurrent modes."""
+
+    dedup: bool = True
+    """Whether to remove duplicate values before splitting the batch between workers."""
+
+    codebook_threshold: int = 0
+    """Max domain size (radix^length) to use precomputed codebooks for. 0 only uses the codebooks of the primitive."""
+
+    @property
+    def strategy(self) -> str:
+        """Name of the strategy: codebook, vectorized (i.e. serial), thread or process."""
+        if self.codebook_threshold:
+            return "codebook"
+        return {ExecutionMode.THREAD: "thread", ExecutionMode.PROCESS: "process"}.get(self.mode, "vectorized")
+
+
+@contextlib.contextmanager
+def pin_plan(plan: ExecutionPlan) -> t.Iterator[ExecutionPlan]:
+    """Execute batches of ExecutionMode.AUTO with a fixed plan within a context, e.g. for deterministic benchmarking.
+
+    :param plan: the plan to execute batches with
+    :raises ValueError: if the mode of the plan is ExecutionMode.AUTO
+    :return: a context manager yielding the plan
+    """
+    if plan.mode == ExecutionMode.AUTO:
+        raise ValueError("A pinned plan must have a concrete execution mode")
+    token = _pinned.set(plan)
+    try:
+        yield plan
+    finally:
+        _pinned.reset(token)
+
+
+def pinned_plan() -> t.Optional[ExecutionPlan]:
+    """Return the plan pinned in the current context, if any."""
+    return _pinned.get()
+
+
+def profile_batch(
+    values: t.Sequence[bytes], charset: str, known_chars: t.Optional[str] = None, sample_size: int = _SAMPLE_SIZE
+) -> BatchProfile:
+    """Estimate the statistics of a batch from an evenly spaced sample of its values.
+
+    The number of distinct values is estimated with the bias-corrected Chao1 estimator, from the number of values
+    seen once and twice in the sample. The ratio of distinct values in the sample itself would approach 1 for large
+    batches, however many duplicates they have. A sample without any duplicates is taken to mean that the batch has
+    none either.
+
+    :param values: the values of the batch
+    :param charset: the charset of the values
+    :param known_chars: the alphabet of the primitive. If None, all characters are considered alphabet characters.
+    :param sample_size: max number of values to sample
+    :return: the estimated statistics
+    """
+    sample = list(values[:: max(1, len(values) // sample_size)][:sample_size])
+    if not sample:
+        return BatchProfile(0, 0, 1.0, 1.0, 0.0, frozenset())
+    texts = [value.decode(charset, errors="replace") for value in sample]
+    if known_chars is None:
+        lengths = [len(text) for text in texts]
+        conforming = len(texts)
+    else:
+        known = frozenset(known_chars)
+        lengths = [sum(char in known for char in text) for text in texts]
+        conforming = sum(length == len(text) for length, text in zip(lengths, texts))
+    return BatchProfile(
+        size=len(values),
+        sample_size=len(sample),
+        distinct_ratio=_estimate_distinct(sample, len(values)) / len(values),
+        conforming_ratio=conforming / len(sample),
+        mean_length=sum(lengths) / len(sample),
+        lengths=frozenset(lengths),
+    )
+
+
+def _estimate_distinct(sample: t.List[bytes], size: int) -> int:
+    """Estimate the number of distinct values in a batch from a sample of it."""
+    counts = collections.Counter(sample)
+    if len(sample) == size:
+        return len(counts)
+    frequencies = collections.Counter(counts.values())
+    once, twice = frequencies[1], frequencies[2]
+    if once == len(sample):
+        return size
+    return min(size, len(counts) + once * (once - 1) // (2 * (twice + 1)))
+
+
+def choose_plan(
+    profile: BatchProfile,
+    max_workers: t.Optional[int] = None,
+    radix: t.Optional[int] = None,
+    max_codebook_domain: int = 0,
+    chunk_size: int = _DEFAULT_CHUNK_SIZE,
+    min_length: int = 1,
+    picklable: bool = False,
+    fail_fast: bool = False,
+) -> ExecutionPlan:
+    """Choose how to execute a batch.
+
+    Batches of values with small domains, where the primitive allows codebooks and a codebook can be built for at
+    most CODEBOOK_PAYOFF times the cost of encrypting the distinct values, are looked up in codebooks. Other batches
+    are processed serially (vectorized per chunk length) unless there is enough work to keep several workers busy, in
+    which case they are split between a pool of threads, or a pool of processes for picklable primitives and very
+    large batches.
+
+    :param profile: the statistics of the batch
+    :param max_workers: max number of workers. Defaults to the number of CPUs.
+    :param radix: the alphabet radix of the primitive. If None, codebooks are not considered.
+    :param max_codebook_domain: the largest domain the primitive builds codebooks for, i.e. its codebook threshold.
+                                0 means codebooks are not considered.
+    :param chunk_size: the max number of characters that the primitive encrypts at a time
+    :param min_length: the min number of characters that the primitive can encrypt
+    :param picklable: whether the primitive can be sent to a pool of processes
+    :param fail_fast: whether the batch fails on non-alphabet characters
+    :return: the plan
+    """
+    dedup = profile.distinct_ratio < _DEDUP_MAX_DISTINCT_RATIO
+    if fail_fast and profile.conforming_ratio < 1:
+        # The batch is going to fail, so fail without starting a pool of workers
+        return ExecutionPlan(ExecutionMode.SERIAL, 1, dedup)
+
+    distinct = profile.distinct_estimate
+    if radix is not None and max_codebook_domain:
+        chunk_lengths = {
+            length
+            for value_length in profile.lengths
+            for length in (min(value_length, chunk_size), value_length % chunk_size)
+            if length >= min_length
+        }
+        if chunk_lengths:
+            domain = radix ** max(chunk_lengths)
+            if domain <= min(max_codebook_domain, _MAX_AUTO_CODEBOOK_DOMAIN, distinct * _CODEBOOK_PAYOFF):
+                return ExecutionPlan(ExecutionMode.SERIAL, 1, dedup, codebook_threshold=domain)
+
+    chunks = distinct * max(1, math.ceil(profile.mean_length / chunk_size))
+    workers = min(max_workers or os.cpu_count() or 1, chunks // _MIN_CHUNKS_PER_WORKER)
+    if workers <= 1:
+        return ExecutionPlan(ExecutionMode.SERIAL, 1, dedup)
+    if picklable and chunks // workers >= _MIN_CHUNKS_PER_PROCESS:
+        return ExecutionPlan(ExecutionMode.PROCESS, workers, dedup)
+    return ExecutionPlan(ExecutionMode.THREAD, workers, dedup)
+
+
+def record(plan: ExecutionPlan, profile: t.Optional[BatchProfile], size: int, duration: float) -> None:
+    """Record an executed plan and its measured throughput.
+
+    :param plan: the executed plan
+    :param profile: the statistics the plan was chosen from, or None if the plan was pinned
+    :param size: the number of values processed
+    :param duration: the time it took to execute the plan, in seconds
+    """
+    throughput = size / duration if duration > 0 else 0.0
+    metrics.increment(f"planner.plans.{plan.strategy}")
+    metrics.increment("planner.values", size)
+    metrics.set("planner.last_duration_seconds", duration)
+    metrics.set("planner.last_throughput", throughput)
+    metrics.emit(
+        "batch_plan", plan=plan, profile=profile, values=size, duration_seconds=duration, throughput=throughput
+    )
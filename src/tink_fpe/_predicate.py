@@ -0,0 +1,97 @@
+"""This module provides filtering of encrypted data by plaintext values, without decrypting the data."""
+
+import typing as t
+
+from tink_fpe import _fpe
+from tink_fpe._dataset import integer_bounds
+from tink_fpe._dataset import transform_integers
+
+
+if t.TYPE_CHECKING:  # pragma: no cover
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+
+FilterValue = t.Union[str, bytes, int]
+"""A plaintext filter value. Integers are encrypted the same way as integer columns of datasets."""
+
+_INT64_BOUNDS = (-(1 << 63), (1 << 63) - 1)
+
+
+class EncryptedFilter:
+    """EncryptedFilter is a set-membership filter on encrypted values, matching the ciphertexts of plaintext values.
+
+    Since FPE is deterministic, a plaintext always encrypts to the same ciphertext under a given key and params. The
+    filter can thus be applied directly to encrypted data, e.g. as a PyArrow dataset scan filter (which allows row
+    groups to be skipped using Parquet statistics) or as a pandas mask.
+    """
+
+    def __init__(self, ciphertexts: t.Iterable[FilterValue]) -> None:
+        """Create a filter matching a set of ciphertexts.
+
+        :param ciphertexts: the ciphertexts to match
+        """
+        self.ciphertexts: t.FrozenSet[FilterValue] = frozenset(ciphertexts)
+
+    def __contains__(self, value: object) -> bool:
+        """Return True if a ciphertext matches the filter."""
+        return value in self.ciphertexts
+
+    def __len__(self) -> int:
+        """Return the number of ciphertexts to match."""
+        return len(self.ciphertexts)
+
+    def to_arrow(self, column: str) -> "pc.Expression":
+        """Return the filter as a PyArrow compute expression on a column, e.g. for ``dataset.to_table(filter=...)``.
+
+        :param column: name of the encrypted column
+        :return: the filter expression
+        """
+        import pyarrow.compute as pc
+
+        return pc.field(column).isin(list(self.ciphertexts))
+
+    def to_pandas(self, series: t.Any) -> t.Any:
+        """Return the filter as a boolean mask for a pandas Series of encrypted values, e.g. for ``df[mask]``.
+
+        :param series: the pandas Series holding the encrypted column
+        :return: the boolean mask
+        """
+        return series.isin(self.ciphertexts)
+
+
+def encrypt_filter(
+    fpe: _fpe.Fpe,
+    values: t.Iterable[FilterValue],
+    params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+    integer_type: t.Optional["pa.DataType"] = None,
+) -> EncryptedFilter:
+    """Rewrite a set-membership filter on plaintext values into a filter on encrypted values.
+
+    Only the filter values are encrypted, so the cost scales with the number of filter values, not with the size of
+    the data. If the primitive is backed by a keyset with several keys (e.g. after a key rotation), the values are
+    encrypted with each key, so that data encrypted with any of the keys is matched.
+
+    :param fpe: the primitive that the data was encrypted with
+    :param values: the plaintext values to filter on
+    :param params: the options that the data was encrypted with
+    :param integer_type: Arrow type of encrypted integer columns, which determines the range that integers are
+                         encrypted within. Defaults to int64.
+    :return: the filter on encrypted values
+    """
+    distinct = list(dict.fromkeys(values))
+    texts = [value for value in distinct if isinstance(value, str)]
+    binaries = [value for value in distinct if isinstance(value, bytes)]
+    integers = [value for value in distinct if isinstance(value, int)]
+    bounds = _INT64_BOUNDS if integer_type is None else integer_bounds(integer_type)
+
+    ciphertexts: t.Set[FilterValue] = set()
+    for primitive in fpe._key_primitives():
+        if texts:
+            encrypted = primitive.encrypt_batch([text.encode(params.charset) for text in texts], params)
+            ciphertexts.update(ciphertext.decode(params.charset) for ciphertext in encrypted)
+        if binaries:
+            ciphertexts.update(primitive.encrypt_batch(binaries, params))
+        if integers:
+            ciphertexts.update(transform_integers(integers, bounds, primitive.encrypt_batch, params))
+    return EncryptedFilter(ciphertexts)
@@ -0,0 +1,269 @@
+"""This module provides a persistent store of ciphertexts (pseudonyms), so that recurring values are encrypted once."""
+
+import hashlib
+import hmac
+import os
+import sqlite3
+import struct
+import threading
+import typing as t
+
+from tink_fpe import _fpe
+from tink_fpe import _stream
+from tink_fpe._batch import ExecutionMode
+from tink_fpe._metrics import Metrics
+
+
+_DIGEST_SIZE = 16
+_MAX_QUERY_PARAMS = 500
+"""Max number of digests per query, well below SQLite's limit on the number of query parameters."""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pseudonyms (
+    key_id TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    ciphertext BLOB NOT NULL,
+    PRIMARY KEY (key_id, digest)
+)
+"""
+
+
+class PseudonymStore:
+    """PseudonymStore persists ciphertexts in an SQLite database, indexed by key id and an HMAC of the plaintext.
+
+    Plaintexts are never stored, only keyed digests of them, so the store cannot be used to look up the plaintext of
+    a ciphertext. The database is opened in write-ahead logging mode, so that any number of threads and processes
+    can read it while one of them writes to it. Each thread uses its own connection.
+
+    If a max number of entries is given, entries are evicted first in, first out: every write keeps only the entries
+    among the last ``max_entries`` inserted, however recently the older ones were looked up. Entries removed by
+    invalidate() still count towards that window until they leave it.
+    """
+
+    def __init__(self, path: t.Union[str, "os.PathLike[str]"], max_entries: int = 0) -> None:
+        """Open (or create) a pseudonym store.
+
+        :param path: path to the SQLite database file
+        :param max_entries: max number of entries to keep. 0 means no limit.
+        """
+        self._path = os.fspath(path)
+        self._max_entries = max_entries
+        self._local = threading.local()
+        self._connections: t.List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        with self._connection() as connection:
+            connection.execute(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return the connection of the current thread, opening it on first use."""
+        connection: t.Optional[sqlite3.Connection] = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self._path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get_many(self, key_id: str, digests: t.Sequence[bytes]) -> t.Dict[bytes, bytes]:
+        """Look up the ciphertexts of a number of digests.
+
+        :param key_id: the id of the key that the ciphertexts were created with
+        :param digests: the digests to look up
+        :return: the ciphertext of each digest that was found
+        """
+        connection = self._connection()
+        found: t.Dict[bytes, bytes] = {}
+        for pos in range(0, len(digests), _MAX_QUERY_PARAMS):
+            part = digests[pos : pos + _MAX_QUERY_PARAMS]
+            # Only the ? placeholders of the digests are interpolated into the query
+            marks = ",".join("?" * len(part))
+            query = f"SELECT digest, ciphertext FROM pseudonyms WHERE key_id = ? AND digest IN ({marks})"  # noqa: S608
+            rows = connection.execute(query, (key_id, *part))
+            found.update(rows)
+        return found
+
+    def put_many(self, key_id: str, items: t.Iterable[t.Tuple[bytes, bytes]]) -> None:
+        """Store the ciphertexts of a number of digests, evicting the entries inserted first if the store is full.
+
+        Rowids are assigned in insertion order, so eviction deletes a range of rowids below the newest one, without
+        counting the entries in the store.
+
+        :param key_id: the id of the key that the ciphertexts were created with
+        :param items: (digest, ciphertext) pairs
+        """
+        with self._connection() as connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO pseudonyms (key_id, digest, ciphertext) VALUES (?, ?, ?)",
+                ((key_id, digest, ciphertext) for digest, ciphertext in items),
+            )
+            if self._max_entries:
+                connection.execute(
+                    "DELETE FROM pseudonyms WHERE rowid <= (SELECT MAX(rowid) FROM pseudonyms) - ?",
+                    (self._max_entries,),
+                )
+
+    def invalidate(self, key_id: str) -> int:
+        """Remove all entries of a key, e.g. after the key has been rotated.
+
+        :param key_id: the id of the key
+        :return: the number of entries removed
+        """
+        with self._connection() as connection:
+            return connection.execute("DELETE FROM pseudonyms WHERE key_id = ?", (key_id,)).rowcount
+
+    def __len__(self) -> int:
+        """Return the number of entries in the store."""
+        return int(self._connection().execute("SELECT COUNT(*) FROM pseudonyms").fetchone()[0])
+
+    def close(self) -> None:
+        """Close the connections of all threads."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class StoredFpe(_fpe.Fpe):
+    """StoredFpe wraps an Fpe primitive so that ciphertexts are looked up in a PseudonymStore before being computed.
+
+    Encryption results are kept in the store, indexed by an HMAC of the key id, the params and the plaintext. The
+    HMAC key (index key) must be kept as secret as the FPE key, since anyone holding it can test whether a given
+    plaintext is in the store. Decryption is not stored, and is passed on to the wrapped primitive.
+
+    The following metrics are recorded: ``store.hits`` and ``store.misses``.
+    """
+
+    def __init__(
+        self,
+        fpe: _fpe.Fpe,
+        store: PseudonymStore,
+        key_id: str,
+        index_key: bytes,
+        metrics: t.Optional[Metrics] = None,
+    ) -> None:
+        """Wrap an Fpe primitive.
+
+        :param fpe: the primitive to wrap
+        :param store: the store to look up and keep ciphertexts in
+        :param key_id: id of the key used by the primitive, e.g. the Tink primary key id. Entries of a key id can be
+                       removed with PseudonymStore.invalidate() when the key is rotated.
+        :param index_key: secret key for the HMAC that indexes the store. Must be the same across runs.
+        :param metrics: where to record store metrics
+        :raises ValueError: if the index key is shorter than 16 bytes
+        """
+        if len(index_key) < 16:
+            raise ValueError("The index key must be at least 16 bytes")
+        self._fpe = fpe
+        self._store = store
+        self._key_id = key_id
+        self._index_key = index_key
+        self.metrics = metrics or Metrics()
+
+    def _digests_of(self, plaintexts: t.Iterable[bytes], params: _fpe.FpeParams) -> t.List[bytes]:
+        """Return the index digest of each plaintext."""
+        context = b"".join(
+            struct.pack(">I", len(field)) + field
+            for field in (
+                self._key_id.encode("utf-8"),
+                params.tweak,
+                str(params.unknown_character_strategy.value).encode("ascii"),
+                params.redaction_char.encode("utf-8"),
+                params.charset.encode("ascii"),
+            )
+        )
+        mac = hmac.new(self._index_key, context, hashlib.sha256)
+        digests = []
+        for plaintext in plaintexts:
+            m = mac.copy()
+            m.update(plaintext)
+            digests.append(m.digest()[:_DIGEST_SIZE])
+        return digests
+
+    def warm_up(
+        self,
+        plaintexts: t.Iterable[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+        batch_size: int = 10_000,
+    ) -> None:
+        """Encrypt plaintexts ahead of time, so that later encryption of them are store lookups.
+
+        :param plaintexts: plaintexts to encrypt, e.g. all identifiers of a dataset
+        :param params: options that adjust how encryption will be performed
+        :param mode: how to execute each batch, e.g. using a pool of processes
+        :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+        :param batch_size: number of plaintexts to encrypt at a time
+        """
+        batch: t.List[bytes] = []
+        for plaintext in plaintexts:
+            batch.append(plaintext)
+            if len(batch) >= batch_size:
+                self.encrypt_batch(batch, params, mode, max_workers)
+                batch = []
+        if batch:
+            self.encrypt_batch(batch, params, mode, max_workers)
+
+    def encrypt(self, plaintext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically encrypt plaintext, looking up the ciphertext in the store first."""
+        return self.encrypt_batch([plaintext], params)[0]
+
+    def decrypt(self, ciphertext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically decrypt ciphertext using the wrapped primitive."""
+        return self._fpe.decrypt(ciphertext, params)
+
+    def encrypt_batch(
+        self,
+        plaintexts: t.Sequence[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically encrypt a batch of plaintexts, only computing the ciphertexts not found in the store."""
+        digests = self._digests_of(plaintexts, params)
+        found = self._store.get_many(self._key_id, list(dict.fromkeys(digests)))
+
+        missing = dict(zip(digests, plaintexts))
+        for digest in found:
+            del missing[digest]
+        self.metrics.increment("store.hits", len(found))
+        self.metrics.increment("store.misses", len(missing))
+        if missing:
+            computed = dict(zip(missing, self._fpe.encrypt_batch(list(missing.values()), params, mode, max_workers)))
+            self._store.put_many(self._key_id, computed.items())
+            found.update(computed)
+        return [found[digest] for digest in digests]
+
+    def decrypt_batch(
+        self,
+        ciphertexts: t.Sequence[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically decrypt a batch of ciphertexts using the wrapped primitive."""
+        return self._fpe.decrypt_batch(ciphertexts, params, mode, max_workers)
+
+    def _key_primitives(self) -> t.List[_fpe.Fpe]:
+        """Return the key primitives of the wrapped primitive."""
+        return self._fpe._key_primitives()
+
+    def encrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically encrypt a plaintext read from a stream using the wrapped primitive, bypassing the store."""
+        return self._fpe.encrypt_stream(source, params, read_size)
+
+    def decrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically decrypt a ciphertext read from a stream using the wrapped primitive."""
+        return self._fpe.decrypt_stream(source, params, read_size)
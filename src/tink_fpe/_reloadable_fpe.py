@@ -0,0 +1,215 @@
+"""This module provides an Fpe primitive that picks up keyset changes without restarting."""
+
+import hashlib
+import os
+import threading
+import time
+import typing as t
+
+import tink
+from tink import JsonKeysetReader
+from tink import aead
+from tink import cleartext_keyset_handle
+
+from tink_fpe import _fpe
+from tink_fpe import _stream
+from tink_fpe._batch import ExecutionMode
+from tink_fpe._metrics import Metrics
+
+
+KeysetSource = t.Union[str, "os.PathLike[str]", t.Callable[[], str]]
+"""A path to a JSON keyset file, or a callable that returns a JSON keyset."""
+
+_WARMUP_TEXT = b"Tink FPE warmup 0123456789 ABCDEFGHIJKLMNOPQRSTUVWXYZ abcdefghijklmnopqrstuvwxyz"
+
+
+def keyset_handle_of(keyset_json: str, master_key_aead: t.Optional[aead.Aead] = None) -> tink.KeysetHandle:
+    """Read a JSON keyset, which is expected to be encrypted if a master key is given.
+
+    :param keyset_json: the JSON keyset
+    :param master_key_aead: AEAD (e.g. KMS backed) to unwrap an encrypted keyset with
+    :return: the keyset handle
+    """
+    reader = JsonKeysetReader(keyset_json)
+    if master_key_aead is None:
+        return cleartext_keyset_handle.read(reader)
+    return tink.read_keyset_handle(reader, master_key_aead)
+
+
+def warm_up(fpe: _fpe.Fpe) -> None:
+    """Exercise an Fpe primitive, so that lazily created state is in place before it is used for real.
+
+    The primitive of every key is exercised, not only the primary one, since decryption may fall back to any of them.
+
+    :param fpe: the primitive to warm up
+    """
+    params = _fpe.FpeParams(strategy=_fpe.UnknownCharacterStrategy.SKIP)
+    for primitive in fpe._key_primitives():
+        primitive.decrypt(primitive.encrypt(_WARMUP_TEXT, params), params)
+
+
+class ReloadableFpe(_fpe.Fpe):
+    """ReloadableFpe is an Fpe primitive backed by a keyset that is reloaded when it changes.
+
+    The keyset source is polled in a background thread. When the keyset has changed, a new primitive is created and
+    warmed up in the background, and then swapped in atomically. Calls that are in flight when the swap happens
+    complete on the previous primitive, so a reload causes neither downtime nor a latency spike. If a reload fails,
+    the previous primitive is kept.
+
+    The following metrics are recorded: ``reload.count``, ``reload.failures``, ``reload.last_duration_seconds``,
+    ``reload.last_success_timestamp`` and ``swap.count``. Listeners are notified about ``reload_failed`` and ``swap``
+    events.
+    """
+
+    def __init__(
+        self,
+        source: KeysetSource,
+        master_key_aead: t.Optional[aead.Aead] = None,
+        poll_interval: float = 30.0,
+        warmup: t.Callable[[_fpe.Fpe], None] = warm_up,
+        metrics: t.Optional[Metrics] = None,
+    ) -> None:
+        """Load the keyset, and start watching it for changes.
+
+        :param source: path to a JSON keyset file, or a callable that returns a JSON keyset
+        :param master_key_aead: AEAD (e.g. KMS backed) to unwrap encrypted keysets with. If None, the keyset is
+                                expected to be in cleartext.
+        :param poll_interval: seconds between each check for keyset changes. 0 disables background polling.
+        :param warmup: callable that prepares a new primitive before it is swapped in
+        :param metrics: where to record reload metrics
+        """
+        self._source = source
+        self._master_key_aead = master_key_aead
+        self._warmup = warmup
+        self.metrics = metrics or Metrics()
+        self._reload_lock = threading.Lock()
+        self._fingerprint = b""
+        self._current: t.Optional[_fpe.Fpe] = None
+        self._stopped = threading.Event()
+        self.reload()
+
+        self._watcher: t.Optional[threading.Thread] = None
+        if poll_interval > 0:
+            self._watcher = threading.Thread(
+                target=self._watch, args=(poll_interval,), name="tink-fpe-keyset-watcher", daemon=True
+            )
+            self._watcher.start()
+
+    def _read_source(self) -> str:
+        if callable(self._source):
+            return self._source()
+        with open(self._source, encoding="utf-8") as f:
+            return f.read()
+
+    def reload(self) -> bool:
+        """Reload the keyset now, if it has changed.
+
+        A failed reload is recorded in the metrics whether it was triggered by the background thread or not.
+
+        :return: True if a new primitive was swapped in
+        :raises Exception: whatever reading, unwrapping or warming up the new keyset raised. The previous primitive
+                           is kept.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            try:
+                keyset_json = self._read_source()
+                fingerprint = hashlib.sha256(keyset_json.encode("utf-8")).digest()
+                if fingerprint == self._fingerprint:
+                    return False
+
+                keyset_handle = keyset_handle_of(keyset_json, self._master_key_aead)
+                fpe = t.cast(_fpe.Fpe, keyset_handle.primitive(_fpe.Fpe))
+                self._warmup(fpe)
+            except Exception as e:  # noqa: B902 - record the failure, and let the caller handle it
+                self.metrics.increment("reload.failures")
+                self.metrics.emit("reload_failed", error=e)
+                raise
+            self._current = fpe
+            self._fingerprint = fingerprint
+
+            duration = time.perf_counter() - start
+            self.metrics.increment("reload.count")
+            self.metrics.set("reload.last_duration_seconds", duration)
+            self.metrics.set("reload.last_success_timestamp", time.time())
+            self.metrics.increment("swap.count")
+            self.metrics.emit(
+                "swap", duration_seconds=duration, primary_key_id=keyset_handle.keyset_info().primary_key_id
+            )
+            return True
+
+    def _watch(self, poll_interval: float) -> None:
+        while not self._stopped.wait(poll_interval):
+            try:
+                self.reload()
+            except Exception:  # noqa: B902, S112 - recorded by reload(), keep serving the current keyset
+                continue
+
+    def close(self) -> None:
+        """Stop watching the keyset source."""
+        self._stopped.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def __enter__(self) -> "ReloadableFpe":
+        """Return the primitive itself, to be closed on exit."""
+        return self
+
+    def __exit__(self, *exc_info: t.Any) -> None:
+        """Stop watching the keyset source."""
+        self.close()
+
+    @property
+    def current(self) -> _fpe.Fpe:
+        """Return the primitive currently in use."""
+        return t.cast(_fpe.Fpe, self._current)
+
+    def encrypt(self, plaintext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically encrypt plaintext using the current primitive."""
+        return self.current.encrypt(plaintext, params)
+
+    def decrypt(self, ciphertext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically decrypt ciphertext using the current primitive."""
+        return self.current.decrypt(ciphertext, params)
+
+    def _key_primitives(self) -> t.List[_fpe.Fpe]:
+        """Return the key primitives of the current primitive."""
+        return self.current._key_primitives()
+
+    def encrypt_batch(
+        self,
+        plaintexts: t.Sequence[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically encrypt a batch of plaintexts using the current primitive."""
+        return self.current.encrypt_batch(plaintexts, params, mode, max_workers)
+
+    def decrypt_batch(
+        self,
+        ciphertexts: t.Sequence[bytes],
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        mode: ExecutionMode = ExecutionMode.SERIAL,
+        max_workers: t.Optional[int] = None,
+    ) -> t.List[bytes]:
+        """Deterministically decrypt a batch of ciphertexts using the current primitive."""
+        return self.current.decrypt_batch(ciphertexts, params, mode, max_workers)
+
+    def encrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically encrypt a plaintext read from a stream using the current primitive."""
+        return self.current.encrypt_stream(source, params, read_size)
+
+    def decrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically decrypt a ciphertext read from a stream using the current primitive."""
+        return self.current.decrypt_stream(source, params, read_size)
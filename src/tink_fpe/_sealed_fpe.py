@@ -0,0 +1,112 @@
+"""This module provides an Fpe decorator that keeps the key material encrypted with a KEK when pickled."""
+
+import hashlib
+import pickle  # noqa: S403
+import threading
+import typing as t
+
+from tink import aead
+
+from tink_fpe import _fpe
+from tink_fpe import _stream
+
+
+_ASSOCIATED_DATA = b"tink-fpe sealed primitive"
+
+KekProvider = t.Callable[[], aead.Aead]
+"""A picklable, zero-argument callable that returns the key encryption key (KEK), e.g. a KMS backed Aead."""
+
+_unsealed_cache: t.Dict[bytes, _fpe.Fpe] = {}
+_unsealed_cache_lock = threading.Lock()
+_UNSEALED_CACHE_SIZE = 1024
+"""Max number of unsealed primitives to keep per process."""
+
+
+class SealedFpe(_fpe.Fpe):
+    """SealedFpe wraps an Fpe primitive so that it is pickled encrypted with a caller-provided KEK.
+
+    This is useful for shipping primitives to distributed workers (Spark, Dask, Ray, multiprocessing) without exposing
+    the key material in task payloads. The KEK is obtained from the KEK provider, which must itself be picklable
+    (e.g. a module-level function or a functools.partial). When unpickled, the primitive is decrypted lazily on first
+    use, at most once per process: subsequent tasks that ship the same sealed primitive reuse the decrypted one.
+    """
+
+    def __init__(self, fpe: _fpe.Fpe, kek_provider: KekProvider) -> None:
+        """Seal an Fpe primitive.
+
+        :param fpe: the (picklable) primitive to seal
+        :param kek_provider: callable that returns the KEK to seal the primitive with
+        """
+        self._kek_provider = kek_provider
+        self._sealed = kek_provider().encrypt(pickle.dumps(fpe), _ASSOCIATED_DATA)
+        self._fpe: t.Optional[_fpe.Fpe] = fpe
+
+    def __reduce__(self) -> t.Tuple[t.Callable[..., "SealedFpe"], t.Tuple[KekProvider, bytes]]:
+        """Reduce the primitive to its KEK provider and sealed state when pickled."""
+        return _restore_sealed_fpe, (self._kek_provider, self._sealed)
+
+    def _primitive(self) -> _fpe.Fpe:
+        """Return the wrapped primitive, unsealing it on first use."""
+        if self._fpe is None:
+            self._fpe = _unseal(self._kek_provider, self._sealed)
+        return self._fpe
+
+    def encrypt(self, plaintext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically encrypt plaintext using the sealed primitive."""
+        return self._primitive().encrypt(plaintext, params)
+
+    def decrypt(self, ciphertext: bytes, params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS) -> bytes:
+        """Deterministically decrypt ciphertext using the sealed primitive."""
+        return self._primitive().decrypt(ciphertext, params)
+
+    def encrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically encrypt a plaintext read from a stream using the sealed primitive."""
+        return self._primitive().encrypt_stream(source, params, read_size)
+
+    def decrypt_stream(
+        self,
+        source: _stream.ByteSource,
+        params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+        read_size: int = _stream.DEFAULT_READ_SIZE,
+    ) -> t.Iterator[bytes]:
+        """Deterministically decrypt a ciphertext read from a stream using the sealed primitive."""
+        return self._primitive().decrypt_stream(source, params, read_size)
+
+    def _key_primitives(self) -> t.List[_fpe.Fpe]:
+        """Return the key primitives of the sealed primitive."""
+        return self._primitive()._key_primitives()
+
+    def _encrypt_batch(self, plaintexts: t.List[bytes], params: _fpe.FpeParams) -> t.List[bytes]:
+        """Encrypt a batch of plaintexts using the sealed primitive, in the calling thread."""
+        return self._primitive().encrypt_batch(plaintexts, params)
+
+    def _decrypt_batch(self, ciphertexts: t.List[bytes], params: _fpe.FpeParams) -> t.List[bytes]:
+        """Decrypt a batch of ciphertexts using the sealed primitive, in the calling thread."""
+        return self._primitive().decrypt_batch(ciphertexts, params)
+
+
+def _unseal(kek_provider: KekProvider, sealed: bytes) -> _fpe.Fpe:
+    """Decrypt and unpickle a sealed primitive, using a per-process cache to avoid repeated KEK calls."""
+    digest = hashlib.sha256(sealed).digest()
+    fpe = _unsealed_cache.get(digest)
+    if fpe is None:
+        # The pickle is authenticated by the KEK, so only state sealed by a KEK holder is ever unpickled
+        fpe = pickle.loads(kek_provider().decrypt(sealed, _ASSOCIATED_DATA))  # noqa: S301
+        with _unsealed_cache_lock:
+            if len(_unsealed_cache) >= _UNSEALED_CACHE_SIZE:
+                _unsealed_cache.pop(next(iter(_unsealed_cache)))
+            fpe = _unsealed_cache.setdefault(digest, t.cast(_fpe.Fpe, fpe))
+    return fpe
+
+
+def _restore_sealed_fpe(kek_provider: KekProvider, sealed: bytes) -> SealedFpe:
+    sealed_fpe = SealedFpe.__new__(SealedFpe)
+    sealed_fpe._kek_provider = kek_provider
+    sealed_fpe._sealed = sealed
+    sealed_fpe._fpe = None
+    return sealed_fpe
@@ -0,0 +1,212 @@
+"""This module provides FPE functions for SQL engines that run in-process: DuckDB and sqlite3.
+
+The functions are registered as ``fpe_encrypt(value, key_ref, tweak)`` and ``fpe_decrypt(value, key_ref, tweak)``.
+DuckDB support requires duckdb and pyarrow, which are optional dependencies (``pip install duckdb pyarrow``).
+"""
+
+import sqlite3
+import typing as t
+
+from tink_fpe import _fpe
+from tink_fpe._batch import ExecutionMode
+
+
+if t.TYPE_CHECKING:  # pragma: no cover
+    import pyarrow as pa
+
+
+KeyResolver = t.Callable[[str], _fpe.Fpe]
+"""Callable that returns the Fpe primitive of a key reference, e.g. FpeKeyring.primitive or KeysetCache.primitive."""
+
+SqliteValue = t.Union[str, bytes, None]
+"""A TEXT, BLOB or NULL value passed to or returned from a sqlite3 function."""
+
+_DEFAULT_CACHE_SIZE = 65_536
+"""Max number of results to remember per sqlite3 statement."""
+
+
+def register_duckdb(
+    connection: t.Any,
+    keys: KeyResolver,
+    params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+    mode: ExecutionMode = ExecutionMode.SERIAL,
+    max_workers: t.Optional[int] = None,
+    prefix: str = "fpe",
+) -> None:
+    """Register vectorized ``<prefix>_encrypt(value, key_ref, tweak)`` and ``<prefix>_decrypt(...)`` on DuckDB.
+
+    The functions are vectorized: DuckDB passes them a vector of rows at a time (as Arrow arrays), whose distinct
+    values are encrypted or decrypted in a batch per key reference and tweak. A NULL value or key reference results
+    in NULL. A NULL tweak means the tweak of the params.
+
+    :param connection: the DuckDB connection
+    :param keys: callable that returns the Fpe primitive of a key reference
+    :param params: options that adjust how encryption and decryption will be performed. The tweak passed to the
+                   functions (if not NULL) is encoded with the charset of the params.
+    :param mode: how to execute the batches, e.g. ExecutionMode.AUTO
+    :param max_workers: max number of threads or processes to use. Defaults to the number of CPUs.
+    :param prefix: prefix of the function names
+    :raises ImportError: if pyarrow is not installed
+    """
+    _require_pyarrow()
+
+    # DuckDB evaluates the annotations of functions, so the optional pyarrow types are not used here
+    def function_of(decrypt: bool) -> t.Callable[[t.Any, t.Any, t.Any], t.Any]:
+        def process(values: t.Any, key_refs: t.Any, tweaks: t.Any) -> t.Any:
+            return _process_arrow(values, key_refs, tweaks, keys, params, mode, max_workers, decrypt)
+
+        return process
+
+    for name, decrypt in (("encrypt", False), ("decrypt", True)):
+        connection.create_function(
+            f"{prefix}_{name}",
+            function_of(decrypt),
+            ["VARCHAR", "VARCHAR", "VARCHAR"],
+            "VARCHAR",
+            type="arrow",
+            null_handling="special",
+        )
+
+
+def register_sqlite(
+    connection: sqlite3.Connection,
+    keys: KeyResolver,
+    params: _fpe.FpeParams = _fpe._DEFAULT_FPE_PARAMS,
+    cache_size: int = _DEFAULT_CACHE_SIZE,
+    prefix: str = "fpe",
+) -> None:
+    """Register ``<prefix>_encrypt(value, key_ref, tweak)`` and ``<prefix>_decrypt(...)`` on a sqlite3 connection.
+
+    sqlite3 calls functions one row at a time, so the rows cannot be processed in batches. Instead, the primitive of
+    each key reference is resolved once per statement, and the results of each statement are remembered, so that
+    repeated values are only encrypted or decrypted once. The caches are cleared when a statement starts, using the
+    trace callback of the connection (which thus replaces any trace callback set before).
+
+    TEXT values result in TEXT, and BLOB values in BLOB. A NULL value or key reference results in NULL. A NULL tweak
+    means the tweak of the params. The functions are not registered as deterministic, since the key that a key
+    reference resolves to can change, e.g. when the key is rotated, so they cannot be used in indexes or generated
+    columns.
+
+    :param connection: the sqlite3 connection
+    :param keys: callable that returns the Fpe primitive of a key reference
+    :param params: options that adjust how encryption and decryption will be performed. TEXT tweaks passed to the
+                   functions are encoded with the charset of the params.
+    :param cache_size: max number of results to remember per statement
+    :param prefix: prefix of the function names
+    """
+    functions = _SqliteFunctions(keys, params, cache_size)
+    connection.create_function(f"{prefix}_encrypt", 3, functions.encrypt)
+    connection.create_function(f"{prefix}_decrypt", 3, functions.decrypt)
+    connection.set_trace_callback(functions.reset)
+
+
+def _require_pyarrow() -> None:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ImportError("DuckDB functions require pyarrow. Install it with: pip install pyarrow") from e
+
+
+def _params_with_tweak(params: _fpe.FpeParams, tweak: t.Union[str, bytes, None]) -> _fpe.FpeParams:
+    """Return the params with the tweak passed to a SQL function, unless NULL."""
+    if tweak is None:
+        return params
+    return _fpe.FpeParams(
+        strategy=params.unknown_character_strategy,
+        tweak=tweak.encode(params.charset) if isinstance(tweak, str) else bytes(tweak),
+        redaction_char=params.redaction_char,
+        charset=params.charset,
+    )
+
+
+def _process_arrow(
+    values: "pa.ChunkedArray",
+    key_refs: "pa.ChunkedArray",
+    tweaks: "pa.ChunkedArray",
+    keys: KeyResolver,
+    params: _fpe.FpeParams,
+    mode: ExecutionMode,
+    max_workers: t.Optional[int],
+    decrypt: bool,
+) -> "pa.Array":
+    """Process a vector of rows, in a batch of distinct values per key reference and tweak."""
+    import pyarrow as pa
+
+    rows_by_group: t.Dict[t.Tuple[t.Optional[str], t.Optional[str]], t.List[int]] = {}
+    for i, group in enumerate(zip(key_refs.to_pylist(), tweaks.to_pylist())):
+        rows_by_group.setdefault(group, []).append(i)
+
+    texts = values.combine_chunks() if isinstance(values, pa.ChunkedArray) else values
+    results = []
+    for (key_ref, tweak), rows in rows_by_group.items():
+        group_texts = texts if len(rows_by_group) == 1 else texts.take(pa.array(rows))
+        if key_ref is None:
+            results.append(pa.nulls(len(rows), type=pa.string()))
+            continue
+        fpe = keys(key_ref)
+        process = fpe.decrypt_batch if decrypt else fpe.encrypt_batch
+        group_params = _params_with_tweak(params, tweak)
+
+        # Process each distinct value once. NULL values are left out of the dictionary, and remain NULL.
+        encoded = group_texts.dictionary_encode()
+        distinct = [text.encode(params.charset) for text in encoded.dictionary.to_pylist()]
+        processed = [text.decode(params.charset) for text in process(distinct, group_params, mode, max_workers)]
+        dictionary = pa.array(processed, type=pa.string())
+        results.append(pa.DictionaryArray.from_arrays(encoded.indices, dictionary).dictionary_decode())
+
+    if len(results) == 1:
+        return results[0]
+    merged: t.List[t.Optional[str]] = [None] * len(texts)
+    for rows, result in zip(rows_by_group.values(), results):
+        for i, text in zip(rows, result.to_pylist()):
+            merged[i] = text
+    return pa.array(merged, type=pa.string())
+
+
+class _SqliteFunctions:
+    """The sqlite3 functions of a connection, with the primitives and results cached for the current statement."""
+
+    def __init__(self, keys: KeyResolver, params: _fpe.FpeParams, cache_size: int) -> None:
+        self._keys = keys
+        self._params = params
+        self._cache_size = cache_size
+        self._primitives: t.Dict[str, _fpe.Fpe] = {}
+        self._results: t.Dict[t.Tuple[SqliteValue, str, SqliteValue, bool], SqliteValue] = {}
+
+    def reset(self, statement: str) -> None:
+        """Clear the caches when a statement starts."""
+        self._primitives.clear()
+        self._results.clear()
+
+    def encrypt(self, value: SqliteValue, key_ref: t.Optional[str], tweak: SqliteValue) -> SqliteValue:
+        """Encrypt a TEXT or BLOB value."""
+        return self._process(value, key_ref, tweak, decrypt=False)
+
+    def decrypt(self, value: SqliteValue, key_ref: t.Optional[str], tweak: SqliteValue) -> SqliteValue:
+        """Decrypt a TEXT or BLOB value."""
+        return self._process(value, key_ref, tweak, decrypt=True)
+
+    def _process(self, value: SqliteValue, key_ref: t.Optional[str], tweak: SqliteValue, decrypt: bool) -> SqliteValue:
+        if value is None or key_ref is None:
+            return None
+        cache_key = (value, key_ref, tweak, decrypt)
+        result = self._results.get(cache_key)
+        if result is not None:
+            return result
+
+        if not isinstance(value, (str, bytes)):
+            raise TypeError(f"Only TEXT and BLOB values can be processed, got {type(value).__name__}")
+        fpe = self._primitives.get(key_ref)
+        if fpe is None:
+            fpe = self._primitives[key_ref] = self._keys(key_ref)
+        params = _params_with_tweak(self._params, tweak)
+        process = fpe.decrypt if decrypt else fpe.encrypt
+        if isinstance(value, str):
+            result = process(value.encode(params.charset), params).decode(params.charset)
+        else:
+            result = process(value, params)
+
+        if len(self._results) >= self._cache_size:
+            self._results.clear()
+        self._results[cache_key] = result
+        return result
@@ -0,0 +1,59 @@
+"""This module contains utilities for incremental (streaming) encryption/decryption."""
+
+import codecs
+import typing as t
+
+
+ByteSource = t.Union[t.BinaryIO, t.Iterable[bytes]]
+"""A binary file-like object, or an iterable of bytes (e.g. a generator yielding parts of a large value)."""
+
+DEFAULT_READ_SIZE = 64 * 1024
+"""Number of bytes to read at a time from file-like objects."""
+
+
+def iter_bytes(source: ByteSource, read_size: int = DEFAULT_READ_SIZE) -> t.Iterator[bytes]:
+    """Iterate over the bytes of a source, in parts of at most read_size bytes for file-like objects.
+
+    :param source: a binary file-like object or an iterable of bytes
+    :param read_size: number of bytes to read at a time from file-like objects
+    :return: an iterator over the non-empty parts of the source
+    """
+    if hasattr(source, "read"):
+        read = t.cast(t.BinaryIO, source).read
+        return iter(lambda: read(read_size), b"")
+    return (part for part in source if part)
+
+
+def iter_texts(source: ByteSource, charset: str, read_size: int = DEFAULT_READ_SIZE) -> t.Iterator[str]:
+    """Decode a source incrementally, so that multi-byte sequences split across parts are decoded correctly.
+
+    :param source: a binary file-like object or an iterable of bytes
+    :param charset: the charset to decode with
+    :param read_size: number of bytes to read at a time from file-like objects
+    :return: an iterator over the decoded parts of the source
+    """
+    decoder = codecs.getincrementaldecoder(charset)()
+    for part in iter_bytes(source, read_size):
+        text = decoder.decode(part)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def encode_texts(texts: t.Iterable[str], charset: str) -> t.Iterator[bytes]:
+    """Encode texts incrementally, so that e.g. a byte order mark is only emitted once.
+
+    :param texts: the texts to encode
+    :param charset: the charset to encode with
+    :return: an iterator over the encoded texts
+    """
+    encoder = codecs.getincrementalencoder(charset)()
+    for text in texts:
+        data = encoder.encode(text)
+        if data:
+            yield data
+    data = encoder.encode("", final=True)
+    if data:
+        yield data
@@ -1,6 +1,10 @@
 """This module contains misc utility methods used by the FPE primitive implementations."""
+import functools
+import re
 import typing as t
 
+from tink_fpe._fpe import UnknownCharacterStrategy
+
 
 def redaction_char_of(alphabet: str) -> str:
     """Deduce redaction character (a character that can be used for substitution) from an alphabet."""
@@ -66,6 +70,130 @@ class CharacterSkipper:
         :param text: the string to be injected with skipped characters
         :return: a string injected with skipped characters
         """
-        for index, char in self._skipped:
-            text = text[:index] + char + text[index:]
-        return text
+        return inject_chars(text, self._skipped)
+
+
+def inject_chars(text: str, chars: t.Iterable[t.Tuple[int, str]]) -> str:
+    """Inject characters (or runs of characters) at their respective indexes into a string.
+
+    :param text: the string to be injected with characters
+    :param chars: (index, characters) pairs, ordered by index. Indexes refer to positions in the resulting string.
+    :return: a string injected with the characters
+    """
+    parts = []
+    pos = 0
+    length = 0
+    for index, run in chars:
+        take = index - length
+        parts.append(text[pos : pos + take])
+        parts.append(run)
+        pos += take
+        length = index + len(run)
+    parts.append(text[pos:])
+    return "".join(parts)
+
+
+@functools.lru_cache(maxsize=256)
+def unknown_chars_pattern(known_chars: str, runs: bool = False) -> "re.Pattern[str]":
+    """Return a compiled regex that matches characters not present in a string.
+
+    :param known_chars: string representing a set of "known" characters
+    :param runs: if True, match runs of consecutive unknown characters instead of single characters
+    :return: the compiled regex
+    """
+    char_class = f"[^{re.escape(known_chars)}]" if known_chars else "(?s:.)"
+    return re.compile(char_class + "+" if runs else char_class)
+
+
+@functools.lru_cache(maxsize=256)
+def known_chars_prefix_pattern(known_chars: str, count: int) -> "re.Pattern[str]":
+    """Return a compiled regex that matches the shortest prefix of a string holding a number of known characters.
+
+    :param known_chars: string representing a set of "known" characters
+    :param count: the number of known characters the prefix must hold
+    :return: the compiled regex
+    """
+    known = re.escape(known_chars)
+    return re.compile(f"(?:[^{known}]*[{known}]){{{count}}}")
+
+
+class ColumnAnalysis(t.NamedTuple):
+    """Result of analyzing a column of texts for characters outside of an alphabet."""
+
+    valid: t.List[bool]
+    """Per row, True if the text only contains known characters (i.e. it can be processed with the FAIL strategy)."""
+
+    unknown_counts: t.List[int]
+    """Per row, the number of unknown characters that a SKIP, REDACT or DELETE strategy would touch."""
+
+
+class PreprocessedColumn(t.NamedTuple):
+    """Result of preprocessing a column of texts according to an UnknownCharacterStrategy."""
+
+    texts: t.List[str]
+    """Per row, the text to process. Rows containing unknown characters are left unchanged for the FAIL strategy."""
+
+    valid: t.List[bool]
+    """Per row, True if the original text only contains known characters."""
+
+    unknown_counts: t.List[int]
+    """Per row, the number of unknown characters in the original text."""
+
+    skipped: t.List[t.Sequence[t.Tuple[int, str]]]
+    """Per row, runs of skipped characters and their original indexes. Only populated for the SKIP strategy."""
+
+
+def analyze(texts: t.Sequence[str], known_chars: str) -> ColumnAnalysis:
+    """Find the rows of a column that contain characters not present in another string, without processing them.
+
+    :param texts: the column of strings to analyze
+    :param known_chars: string representing a set of "known" characters
+    :return: validity mask and unknown character count for each row
+    """
+    pattern = unknown_chars_pattern(known_chars)
+    counts = [len(pattern.findall(text)) for text in texts]
+    return ColumnAnalysis(valid=[count == 0 for count in counts], unknown_counts=counts)
+
+
+def preprocess(
+    texts: t.Sequence[str], known_chars: str, strategy: UnknownCharacterStrategy, redaction_char: str = ""
+) -> PreprocessedColumn:
+    """Preprocess a column of texts according to how unknown characters should be handled.
+
+    The resulting texts only contain known characters (except for invalid rows when using the FAIL strategy), and
+    can thus be passed on to the FPE algorithm as they are.
+
+    :param texts: the column of strings to preprocess
+    :param known_chars: string representing a set of "known" characters
+    :param strategy: how to handle characters not present in known_chars
+    :param redaction_char: character to substitute unknown characters with. Required for the REDACT strategy.
+    :raises ValueError: if the REDACT strategy is used without a redaction character
+    :return: preprocessed texts, validity mask, unknown character counts and skipped characters
+    """
+    pattern = unknown_chars_pattern(known_chars)
+    skipped: t.List[t.Sequence[t.Tuple[int, str]]] = []
+
+    if strategy == UnknownCharacterStrategy.FAIL:
+        processed = list(texts)
+        counts = analyze(texts, known_chars).unknown_counts
+    elif strategy == UnknownCharacterStrategy.REDACT:
+        if not redaction_char:
+            raise ValueError("A redaction character is required for the REDACT strategy")
+        replacement = redaction_char.replace("\\", "\\\\")
+        processed, counts = _unzip([pattern.subn(replacement, text) for text in texts])
+    else:
+        processed, counts = _unzip([pattern.subn("", text) for text in texts])
+        if strategy == UnknownCharacterStrategy.SKIP:
+            runs = unknown_chars_pattern(known_chars, runs=True)
+            skipped = [
+                [(m.start(), m.group()) for m in runs.finditer(text)] if count else ()
+                for text, count in zip(texts, counts)
+            ]
+
+    return PreprocessedColumn(
+        texts=processed, valid=[count == 0 for count in counts], unknown_counts=counts, skipped=skipped
+    )
+
+
+def _unzip(pairs: t.List[t.Tuple[str, int]]) -> t.Tuple[t.List[str], t.List[int]]:
+    return [text for text, _ in pairs], [count for _, count in pairs]
@@ -0,0 +1,51 @@
+"""Unit tests for interned alphabets."""
+import gc
+import string
+import weakref
+
+import pytest
+
+from tink_fpe import CharacterGroup
+from tink_fpe import FpeParams
+from tink_fpe._alphabet import Alphabet
+from tink_fpe._alphabet import alphabet_of
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+def test_alphabets_are_interned() -> None:
+    alphabet = alphabet_of(CharacterGroup.DIGITS)
+    assert alphabet_of("".join(CharacterGroup.DIGITS)) is alphabet
+    assert (alphabet.radix, alphabet.min_len, alphabet.max_len, alphabet.redaction_char) == (10, 6, 56, "0")
+    assert alphabet.index["7"] == 7
+
+
+def test_alphabets_are_shared_by_primitives() -> None:
+    fpe1 = FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.ALPHANUMERIC)
+    fpe2 = FpeFf3(key=bytes(range(16)), alphabet="".join(CharacterGroup.ALPHANUMERIC))
+    assert fpe1._alphabet is fpe2._alphabet
+
+
+def test_alphabets_are_released_when_unused() -> None:
+    alphabet = weakref.ref(alphabet_of("abcdefghijklmnopqrstuvwxyz*"))
+    gc.collect()
+    assert alphabet() is None
+
+
+def test_alphabets_are_immutable() -> None:
+    alphabet = alphabet_of(CharacterGroup.DIGITS)
+    with pytest.raises(AttributeError):
+        alphabet.chars = "01"
+    with pytest.raises(TypeError):
+        alphabet.index["0"] = 1  # type: ignore[index]
+    assert repr(alphabet) == "Alphabet('0123456789')"
+    assert isinstance(alphabet, Alphabet)
+
+
+def test_chunks_are_limited_by_radix() -> None:
+    # The max FF3-1 numeral string length for a radix of 100 is 28, less than the default chunk size
+    alphabet = string.printable
+    fpe = FpeFf3(key=bytes(range(32)), alphabet=alphabet)
+    plaintext = (alphabet * 2).encode()
+    ciphertext = fpe.encrypt(plaintext, FpeParams())
+    assert ciphertext != plaintext
+    assert fpe.decrypt(ciphertext, FpeParams()) == plaintext
@@ -0,0 +1,46 @@
+"""Unit tests for batch encryption/decryption."""
+import threading
+import typing as t
+
+import pytest
+
+from tink_fpe import CharacterGroup
+from tink_fpe import ExecutionMode
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+PLAINTEXTS = [f"Value #{i % 50} of {i % 7}, with some padding".encode() for i in range(200)]
+
+
+@pytest.fixture(scope="module")
+def fpe() -> FpeFf3:
+    return FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.ALPHANUMERIC)
+
+
+@pytest.mark.parametrize("mode", [ExecutionMode.THREAD, ExecutionMode.PROCESS])
+def test_concurrent_modes_match_serial(fpe: FpeFf3, mode: ExecutionMode) -> None:
+    expected = fpe.encrypt_batch(PLAINTEXTS, PARAMS)
+    ciphertexts = fpe.encrypt_batch(PLAINTEXTS, PARAMS, mode=mode, max_workers=3)
+    assert ciphertexts == expected
+    assert fpe.decrypt_batch(ciphertexts, PARAMS, mode=mode, max_workers=3) == PLAINTEXTS
+
+
+def test_concurrent_use_from_many_threads(fpe: FpeFf3) -> None:
+    expected = [fpe.encrypt(plaintext, PARAMS) for plaintext in PLAINTEXTS]
+    results: t.Dict[int, t.List[bytes]] = {}
+
+    def work(i: int) -> None:
+        rotated = PLAINTEXTS[i:] + PLAINTEXTS[:i]
+        ciphertexts = fpe.encrypt_batch(rotated, PARAMS, mode=ExecutionMode.THREAD, max_workers=2)
+        assert fpe.decrypt_batch(ciphertexts, PARAMS) == rotated
+        results[i] = ciphertexts[len(PLAINTEXTS) - i :] + ciphertexts[: len(PLAINTEXTS) - i]
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: expected for i in range(8)}
@@ -0,0 +1,134 @@
+"""Unit tests for the _codebook module."""
+import multiprocessing
+import os
+import typing as t
+from array import array
+from pathlib import Path
+
+import pytest
+from ff3 import FF3Cipher
+
+from tink_fpe import CharacterGroup
+from tink_fpe import FpeParams
+from tink_fpe import _codebook
+from tink_fpe import _fpe_ff3
+from tink_fpe._codebook import Codebook
+from tink_fpe._ff3_engine import decode_numeral
+from tink_fpe._ff3_engine import encode_numeral
+
+
+KEY = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3cef4359d8d580aa4f7f036d6f04fc6a94")
+TWEAK = bytes(7)
+DIGITS = CharacterGroup.DIGITS
+DIGITS_INDEX = {c: i for i, c in enumerate(DIGITS)}
+
+
+@pytest.fixture(scope="module")
+def digits_codebook() -> Codebook:
+    return _codebook.build_codebook(KEY, radix=10, length=6, tweak=TWEAK, workers=1)
+
+
+@pytest.mark.parametrize("plaintext", ["000000", "123456", "999999", "740211"])
+def test_codebook_matches_mysto(digits_codebook: Codebook, plaintext: str) -> None:
+    ff3 = FF3Cipher.withCustomAlphabet(key=KEY.hex(), tweak=TWEAK.hex(), alphabet=DIGITS)
+    value = decode_numeral(plaintext, DIGITS_INDEX, 10)
+    ciphertext = encode_numeral(digits_codebook.encrypt(value), DIGITS, 6)
+    assert ciphertext == ff3.encrypt_with_tweak(plaintext, TWEAK.hex())
+    assert digits_codebook.decrypt(digits_codebook.encrypt(value)) == value
+
+
+def test_build_rejects_too_large_domain() -> None:
+    with pytest.raises(ValueError):
+        _codebook.build_codebook(KEY, radix=62, length=6, tweak=TWEAK)
+
+
+@pytest.mark.parametrize("daemon", [False, True])
+def test_build_falls_back_to_calling_process(daemon: bool, monkeypatch: pytest.MonkeyPatch) -> None:
+    def no_pool(max_workers: int) -> None:
+        assert not daemon, "a daemonic process cannot start a pool of processes"
+        raise OSError("Cannot start processes")
+
+    def reverse_range(key: bytes, radix: int, length: int, tweak: bytes, start: int, stop: int) -> bytes:
+        return array("I", range(10**6 - 1 - start, 10**6 - 1 - stop, -1)).tobytes()
+
+    monkeypatch.setattr(_codebook, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(_codebook, "_encrypt_range", reverse_range)
+    monkeypatch.setattr(multiprocessing.current_process(), "daemon", daemon)
+    codebook = _codebook.build_codebook(KEY, radix=10, length=6, tweak=TWEAK, workers=4)
+    assert codebook.encrypt(0) == 999_999
+    assert codebook.decrypt(999_999) == 0
+
+
+def test_save_and_load(digits_codebook: Codebook, tmp_path: Path) -> None:
+    path = str(tmp_path / "digits.fpecb")
+    digits_codebook.save(path, KEY, TWEAK)
+
+    loaded = Codebook.load(path, KEY, radix=10, length=6, tweak=TWEAK)
+    try:
+        for value in (0, 1, 123456, 999999):
+            assert loaded.encrypt(value) == digits_codebook.encrypt(value)
+            assert loaded.decrypt(value) == digits_codebook.decrypt(value)
+    finally:
+        loaded.close()
+
+
+def test_load_rejects_tampered_or_foreign_codebooks(digits_codebook: Codebook, tmp_path: Path) -> None:
+    path = str(tmp_path / "digits.fpecb")
+    digits_codebook.save(path, KEY, TWEAK)
+
+    with pytest.raises(ValueError):
+        Codebook.load(path, bytes(32), radix=10, length=6, tweak=TWEAK)
+    with pytest.raises(ValueError):
+        Codebook.load(path, KEY, radix=10, length=6, tweak=b"\x01" * 7)
+
+    with open(path, "r+b") as f:
+        f.seek(-4, os.SEEK_END)
+        f.write(b"\x00\x00\x00\x00")
+    with pytest.raises(ValueError):
+        Codebook.load(path, KEY, radix=10, length=6, tweak=TWEAK)
+
+
+def test_fpe_ff3_uses_codebook_for_small_domains(
+    digits_codebook: Codebook, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    builds: t.List[int] = []
+
+    def fake_build_codebook(key: bytes, radix: int, length: int, tweak: bytes) -> Codebook:
+        assert (key, radix, length, tweak) == (KEY, 10, 6, TWEAK)
+        builds.append(length)
+        return digits_codebook
+
+    monkeypatch.setattr(_fpe_ff3, "build_codebook", fake_build_codebook)
+    plain = _fpe_ff3.FpeFf3(key=KEY, alphabet=DIGITS)
+    fpe = _fpe_ff3.FpeFf3(key=KEY, alphabet=DIGITS, codebook_threshold=10**6, codebook_dir=str(tmp_path))
+
+    # Chunks of 6 digits are looked up in the codebook, while longer chunks are encrypted as usual
+    for plaintext in (b"123456", b"000000", b"12345678901", b"123456789012345678901234567890123456"):
+        ciphertext = fpe.encrypt(plaintext)
+        assert ciphertext == plain.encrypt(plaintext)
+        assert fpe.decrypt(ciphertext) == plaintext
+    assert builds == [6]
+
+    # Another primitive with the same key memory-maps the persisted codebook instead of building it again
+    reloaded = _fpe_ff3.FpeFf3(key=KEY, alphabet=DIGITS, codebook_threshold=10**6, codebook_dir=str(tmp_path))
+    assert reloaded.encrypt(b"123456", FpeParams()) == plain.encrypt(b"123456")
+    assert builds == [6]
+
+
+def test_fpe_ff3_keeps_a_bounded_number_of_codebooks(
+    digits_codebook: Codebook, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    builds: t.List[bytes] = []
+
+    def fake_build_codebook(key: bytes, radix: int, length: int, tweak: bytes) -> Codebook:
+        builds.append(tweak)
+        return digits_codebook
+
+    monkeypatch.setattr(_fpe_ff3, "build_codebook", fake_build_codebook)
+    monkeypatch.setattr(_fpe_ff3, "_MAX_CACHED_CODEBOOKS", 2)
+    fpe = _fpe_ff3.FpeFf3(key=KEY, alphabet=DIGITS, codebook_threshold=10**6)
+    for tweak in (b"tweak-1", b"tweak-2", b"tweak-3", b"tweak-3", b"tweak-1"):
+        fpe.encrypt(b"123456", FpeParams(tweak=tweak))
+    assert len(fpe._codebooks) == 2
+    # The codebook built first is dropped when a third one is built, and rebuilt when needed again
+    assert builds == [b"tweak-1", b"tweak-2", b"tweak-3", b"tweak-1"]
@@ -0,0 +1,240 @@
+"""Unit tests for encryption of Parquet and Arrow IPC datasets."""
+
+import pathlib
+import typing as t
+
+import pytest
+
+from tink_fpe import CharacterGroup
+from tink_fpe import DatasetFormat
+from tink_fpe import ExecutionMode
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import decrypt_dataset
+from tink_fpe import encrypt_dataset
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+NAMES = ["Alice Liddell", "Bob Builder", None, "Alice Liddell", "Charlie Brown", "Bob Builder"] * 50
+
+
+@pytest.fixture(scope="module")
+def fpe() -> FpeFf3:
+    return FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.ALPHANUMERIC)
+
+
+@pytest.fixture(scope="module")
+def digits_fpe() -> FpeFf3:
+    return FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.DIGITS)
+
+
+def _table() -> t.Any:
+    schema = pa.schema([("id", pa.int64()), ("name", pa.string()), ("tag", pa.binary())], metadata={b"owner": b"ssb"})
+    return pa.table(
+        {
+            "id": list(range(len(NAMES))),
+            "name": NAMES,
+            "tag": [b"tag-%d" % (i % 7) for i in range(len(NAMES))],
+        },
+        schema=schema,
+    )
+
+
+@pytest.mark.parametrize("mode", [ExecutionMode.SERIAL, ExecutionMode.THREAD, ExecutionMode.PROCESS])
+def test_parquet_roundtrip(tmp_path: pathlib.Path, fpe: FpeFf3, mode: ExecutionMode) -> None:
+    source, encrypted, decrypted = (
+        tmp_path / "source.parquet",
+        tmp_path / "encrypted.parquet",
+        tmp_path / "decrypted.parquet",
+    )
+    pq.write_table(_table(), source, row_group_size=64)
+
+    rows = encrypt_dataset(fpe, source, encrypted, ["name", "tag"], PARAMS, mode=mode, max_workers=2, max_in_flight=1)
+    assert rows == len(NAMES)
+
+    result = pq.read_table(encrypted)
+    assert result.schema == _table().schema
+    assert result.schema.metadata[b"owner"] == b"ssb"
+    assert result.column("id").to_pylist() == list(range(len(NAMES)))
+    assert result.column("name").to_pylist() == [
+        None if name is None else fpe.encrypt(name.encode(), PARAMS).decode() for name in NAMES
+    ]
+    assert result.column("tag").to_pylist() == [fpe.encrypt(b"tag-%d" % (i % 7), PARAMS) for i in range(len(NAMES))]
+
+    metadata = pq.ParquetFile(encrypted).metadata
+    assert metadata.num_row_groups == pq.ParquetFile(source).metadata.num_row_groups
+    statistics = metadata.row_group(0).column(1).statistics
+    names = [name for name in result.column("name").to_pylist()[:64] if name is not None]
+    assert (statistics.min, statistics.max) == (min(names), max(names))
+
+    decrypt_dataset(fpe, encrypted, decrypted, ["name", "tag"], PARAMS, mode=mode, max_workers=2)
+    assert pq.read_table(decrypted).equals(_table())
+
+
+def test_arrow_ipc_roundtrip(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    source, encrypted, decrypted = tmp_path / "source.arrow", tmp_path / "encrypted.arrow", tmp_path / "decrypted.arrow"
+    table = _table()
+    with pa.ipc.new_file(source, table.schema) as writer:
+        writer.write_table(table, max_chunksize=100)
+
+    encrypt_dataset(fpe, source, encrypted, ["name"], PARAMS, file_format=DatasetFormat.ARROW_IPC)
+    with pa.ipc.open_file(encrypted) as reader:
+        assert reader.num_record_batches == 3
+        assert reader.read_all().column("name").to_pylist()[:2] == [
+            fpe.encrypt(b"Alice Liddell", PARAMS).decode(),
+            fpe.encrypt(b"Bob Builder", PARAMS).decode(),
+        ]
+
+    decrypt_dataset(fpe, encrypted, decrypted, ["name"], PARAMS, file_format=DatasetFormat.ARROW_IPC)
+    with pa.ipc.open_file(decrypted) as reader:
+        assert reader.read_all().equals(table)
+
+
+def test_integer_columns_roundtrip(tmp_path: pathlib.Path, digits_fpe: FpeFf3) -> None:
+    integers = [123456, -987654, 2147483000, -2147483000, 1000000]
+    values = [*integers, None]
+    table = pa.table({"small": pa.array(values, pa.int32()), "big": pa.array(values, pa.int64())})
+    source, encrypted, decrypted = (
+        tmp_path / "source.parquet",
+        tmp_path / "encrypted.parquet",
+        tmp_path / "decrypted.parquet",
+    )
+    pq.write_table(table, source)
+
+    encrypt_dataset(digits_fpe, source, encrypted, ["small", "big"], PARAMS)
+    result = pq.read_table(encrypted)
+    for name in ["small", "big"]:
+        ciphertexts = result.column(name).to_pylist()
+        assert ciphertexts[-1] is None
+        assert ciphertexts[:-1] != values[:-1]
+        # Values of up to 6 digits are zero-padded, so only longer values keep their exact number of digits
+        assert [len(str(c)) if abs(c) >= 10**6 else 6 for c in ciphertexts[:-1]] == [
+            len(str(v)) if abs(v) >= 10**6 else 6 for v in integers
+        ]
+    assert all(-(2**31) <= c < 2**31 for c in result.column("small").to_pylist()[:-1])
+
+    decrypt_dataset(digits_fpe, encrypted, decrypted, ["small", "big"], PARAMS)
+    assert pq.read_table(decrypted).equals(table)
+
+
+def test_short_integers_are_padded(tmp_path: pathlib.Path, digits_fpe: FpeFf3) -> None:
+    integers = [0, 5, 42, 999, 1234, 12345, -7, -32768, 32767]
+    values = [*integers, None]
+    table = pa.table({"small": pa.array(values, pa.int16()), "big": pa.array(values, pa.int64())})
+    source, encrypted, decrypted = (
+        tmp_path / "source.parquet",
+        tmp_path / "encrypted.parquet",
+        tmp_path / "decrypted.parquet",
+    )
+    pq.write_table(table, source)
+
+    encrypt_dataset(digits_fpe, source, encrypted, ["small", "big"], PARAMS)
+    result = pq.read_table(encrypted)
+    for name in ["small", "big"]:
+        ciphertexts = result.column(name).to_pylist()
+        assert all(c != v for c, v in zip(ciphertexts[:-1], integers))
+        assert all(abs(c) < 10**6 and (c < 0) == (v < 0) for c, v in zip(ciphertexts[:-1], integers))
+    assert all(-(2**15) <= c < 2**15 for c in result.column("small").to_pylist()[:-1])
+
+    decrypt_dataset(digits_fpe, encrypted, decrypted, ["small", "big"], PARAMS)
+    assert pq.read_table(decrypted).equals(table)
+
+
+def test_narrow_integer_columns_are_rejected(tmp_path: pathlib.Path, digits_fpe: FpeFf3) -> None:
+    source = tmp_path / "source.parquet"
+    pq.write_table(pa.table({"age": pa.array([42], pa.int8())}), source)
+
+    with pytest.raises(ValueError, match="too small to hold encrypted integers"):
+        encrypt_dataset(digits_fpe, source, tmp_path / "out.parquet", ["age"], PARAMS)
+
+
+def test_invalid_columns(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    source = tmp_path / "source.parquet"
+    pq.write_table(pa.table({"name": ["Alice"], "score": [1.5]}), source)
+
+    with pytest.raises(ValueError, match="does not exist"):
+        encrypt_dataset(fpe, source, tmp_path / "out.parquet", ["missing"], PARAMS)
+    with pytest.raises(ValueError, match="Only string, binary and integer columns"):
+        encrypt_dataset(fpe, source, tmp_path / "out.parquet", ["score"], PARAMS)
+
+
+class _InterruptedFpe(FpeFf3):
+    """FpeFf3 that counts its batch calls, and fails after a given number of them (e.g. a preempted node)."""
+
+    def __init__(self, fail_after: int = -1) -> None:
+        super().__init__(key=bytes(range(32)), alphabet=CharacterGroup.ALPHANUMERIC)
+        self.fail_after = fail_after
+        self.calls = 0
+
+    def _encrypt_batch(
+        self, plaintexts: t.List[bytes], params: FpeParams, codebook_threshold: int = 0
+    ) -> t.List[bytes]:
+        if self.calls == self.fail_after:
+            raise KeyboardInterrupt()
+        self.calls += 1
+        return super()._encrypt_batch(plaintexts, params, codebook_threshold)
+
+
+def test_checkpointed_parquet_resumes(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    ds = pytest.importorskip("pyarrow.dataset")
+    source, expected, encrypted = tmp_path / "source.parquet", tmp_path / "expected.parquet", tmp_path / "encrypted"
+    pq.write_table(_table(), source, row_group_size=64)
+    encrypt_dataset(fpe, source, expected, ["name"], PARAMS)
+
+    with pytest.raises(KeyboardInterrupt):
+        encrypt_dataset(
+            _InterruptedFpe(fail_after=3),
+            source,
+            encrypted,
+            ["name"],
+            PARAMS,
+            mode=ExecutionMode.SERIAL,
+            checkpoint_interval=2,
+        )
+    assert sorted(path.name for path in encrypted.iterdir()) == ["_checkpoint.json", "part-00000.parquet"]
+
+    resumed = _InterruptedFpe()
+    rows = encrypt_dataset(
+        resumed, source, encrypted, ["name"], PARAMS, mode=ExecutionMode.SERIAL, checkpoint_interval=2
+    )
+    assert rows == len(NAMES)
+    assert resumed.calls == 3
+    assert sorted(path.name for path in encrypted.iterdir()) == [
+        "_checkpoint.json",
+        "part-00000.parquet",
+        "part-00001.parquet",
+        "part-00002.parquet",
+    ]
+    assert ds.dataset(encrypted).to_table().equals(pq.read_table(expected))
+
+    # A complete run is not repeated
+    assert encrypt_dataset(resumed, source, encrypted, ["name"], PARAMS, checkpoint_interval=2) == len(NAMES)
+    assert resumed.calls == 3
+
+
+def test_checkpoint_of_another_key(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    source, encrypted = tmp_path / "source.arrow", tmp_path / "encrypted"
+    with pa.ipc.new_file(source, _table().schema) as writer:
+        writer.write_table(_table(), max_chunksize=100)
+    with pytest.raises(KeyboardInterrupt):
+        encrypt_dataset(
+            _InterruptedFpe(fail_after=1),
+            source,
+            encrypted,
+            ["name"],
+            PARAMS,
+            DatasetFormat.ARROW_IPC,
+            checkpoint_interval=1,
+        )
+
+    other_fpe = FpeFf3(key=bytes(32), alphabet=CharacterGroup.ALPHANUMERIC)
+    with pytest.raises(ValueError, match="another key"):
+        encrypt_dataset(other_fpe, source, encrypted, ["name"], PARAMS, DatasetFormat.ARROW_IPC, checkpoint_interval=1)
+
+    rows = encrypt_dataset(fpe, source, encrypted, ["name"], PARAMS, DatasetFormat.ARROW_IPC, checkpoint_interval=1)
+    assert rows == len(NAMES)
+    assert len(list(encrypted.glob("part-*.arrow"))) == 3
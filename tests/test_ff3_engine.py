@@ -0,0 +1,71 @@
+"""Unit tests for the _ff3_engine module."""
+import random
+import string
+
+import pytest
+from ff3 import FF3Cipher
+
+from tink_fpe import CharacterGroup
+from tink_fpe._ff3_engine import Ff3Engine
+from tink_fpe._ff3_engine import NumeralCodec
+from tink_fpe._ff3_engine import decode_numeral
+from tink_fpe._ff3_engine import encode_numeral
+
+
+KEY = bytes.fromhex("ef4359d8d580aa4f7f036d6f04fc6a94")
+
+
+@pytest.mark.parametrize(
+    "alphabet, length, tweak",
+    [
+        (CharacterGroup.DIGITS, 6, bytes(7)),
+        (CharacterGroup.DIGITS, 30, bytes.fromhex("d8e7920afa330a73")),
+        (CharacterGroup.ALPHANUMERIC, 4, bytes.fromhex("9a768a92f60e12")),
+        (CharacterGroup.ALPHANUMERIC, 29, bytes(7)),
+        (string.ascii_lowercase, 5, bytes.fromhex("3737373737373737")),
+        (CharacterGroup.HEX, 5, bytes.fromhex("9a768a92f60e12")),
+        (CharacterGroup.HEX, 30, bytes(7)),
+        (CharacterGroup.BASE64URL, 4, bytes.fromhex("d8e7920afa330a73")),
+        (CharacterGroup.BASE64URL, 21, bytes(7)),
+    ],
+)
+def test_engine_matches_mysto(alphabet: str, length: int, tweak: bytes) -> None:
+    rng = random.Random(length)  # noqa: S311 - reproducible test data, not key material
+    index = {c: i for i, c in enumerate(alphabet)}
+    texts = ["".join(rng.choice(alphabet) for _ in range(length)) for _ in range(20)]
+    ff3 = FF3Cipher.withCustomAlphabet(key=KEY.hex(), tweak=tweak.hex(), alphabet=alphabet)
+    engine = Ff3Engine(KEY, len(alphabet))
+
+    encrypted = engine.encrypt_ints([decode_numeral(text, index, len(alphabet)) for text in texts], length, tweak)
+    ciphertexts = [encode_numeral(value, alphabet, length) for value in encrypted]
+    assert ciphertexts == [ff3.encrypt_with_tweak(text, tweak.hex()) for text in texts]
+
+    decrypted = engine.decrypt_ints(encrypted, length, tweak)
+    assert [encode_numeral(value, alphabet, length) for value in decrypted] == texts
+
+
+def test_engine_rejects_invalid_input() -> None:
+    engine = Ff3Engine(KEY, 10)
+    with pytest.raises(ValueError):
+        engine.encrypt_ints([1234], 4, bytes(7))
+    with pytest.raises(ValueError):
+        engine.encrypt_ints([123456], 6, bytes(6))
+    with pytest.raises(ValueError):
+        Ff3Engine(bytes(15), 10)
+    with pytest.raises(ValueError):
+        decode_numeral("12a", {c: i for i, c in enumerate(CharacterGroup.DIGITS)}, 10)
+
+
+@pytest.mark.parametrize("radix", [2, 4, 8, 10, 16, 32, 64, 128, 256])
+def test_codec_matches_generic_conversion(radix: int) -> None:
+    rng = random.Random(radix)  # noqa: S311 - reproducible test data, not key material
+    alphabet = "".join(rng.sample([chr(c) for c in range(0x100, 0x300)], radix))
+    index = {c: i for i, c in enumerate(alphabet)}
+    codec = NumeralCodec(alphabet)
+    for length in range(40):
+        texts = ["".join(rng.choice(alphabet) for _ in range(length)) for _ in range(10)]
+        values = [decode_numeral(text, index, radix) for text in texts]
+        assert [codec.decode(text) for text in texts] == values
+        assert [codec.encode(value, length) for value in values] == texts
+    with pytest.raises(ValueError, match="not found in alphabet"):
+        codec.decode(alphabet[0] + "!")
@@ -1,4 +1,5 @@
 """Unit tests for the _fpe_ff3 module."""
+import io
 import typing as t
 from typing import cast
 
@@ -8,9 +9,12 @@ from tink import JsonKeysetReader
 from tink import cleartext_keyset_handle
 
 import tink_fpe
+from tink_fpe import CharacterGroup
 from tink_fpe import Fpe
 from tink_fpe import FpeParams
 from tink_fpe import UnknownCharacterStrategy
+from tink_fpe._fpe_ff3 import _STREAM_MAX_PENDING
+from tink_fpe._fpe_ff3 import FpeFf3
 
 
 @pytest.fixture(scope="class")
@@ -191,3 +195,100 @@ def test_encrypt_decrypt_with_different_string_encoding(ff31_256_alphanumeric: F
     # Ensure the original and restored plaintexts match, regardless of the encoding used.
     assert plaintext_str == utf8_plaintext_restored_bytes.decode("utf-8")
     assert plaintext_str == latin1_plaintext_restored_bytes.decode("iso-8859-1")
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    [UnknownCharacterStrategy.SKIP, UnknownCharacterStrategy.REDACT, UnknownCharacterStrategy.DELETE],
+)
+def test_encrypt_decrypt_batch(ff31_256_alphanumeric: Fpe, strategy: UnknownCharacterStrategy) -> None:
+    fpe = ff31_256_alphanumeric
+    params = FpeParams(strategy=strategy)
+    plaintexts = [
+        b"Foobar",
+        b"Foo bar",
+        b"If I could gather all the stars and hold them in my hand",
+        b"A",
+        b"",
+        b"ab cd",
+        b"Foo bar",
+        b"012345678901234567890123456789#",
+    ]
+    ciphertexts = fpe.encrypt_batch(plaintexts, params)
+    assert ciphertexts == [fpe.encrypt(plaintext, params) for plaintext in plaintexts]
+    assert fpe.decrypt_batch(ciphertexts, params) == [fpe.decrypt(ciphertext, params) for ciphertext in ciphertexts]
+
+
+def test_encrypt_batch_with_fail(ff31_256_alphanumeric: Fpe) -> None:
+    fpe = ff31_256_alphanumeric
+    params = FpeParams(strategy=UnknownCharacterStrategy.FAIL)
+    assert fpe.encrypt_batch([b"Foobar", b"abcd"], params) == [b"b7kOqd", b"NcFL"]
+    with pytest.raises(ValueError):
+        fpe.encrypt_batch([b"Foobar", b"Foo bar"], params)
+
+
+@pytest.mark.parametrize(
+    "strategy",
+    [UnknownCharacterStrategy.SKIP, UnknownCharacterStrategy.REDACT, UnknownCharacterStrategy.DELETE],
+)
+def test_encrypt_decrypt_stream(ff31_256_alphanumeric: Fpe, strategy: UnknownCharacterStrategy) -> None:
+    fpe = ff31_256_alphanumeric
+    params = FpeParams(strategy=strategy)
+    # Spans several stream windows, with non-alphabet and multi-byte characters
+    plaintext = "Lörem ïpsum dôlor sit ämêt, consectetur 0123456789 😀\n".encode() * 2000
+
+    ciphertext = b"".join(fpe.encrypt_stream(io.BytesIO(plaintext), params, read_size=1000))
+    assert ciphertext == fpe.encrypt(plaintext, params)
+    assert b"".join(fpe.decrypt_stream(io.BytesIO(ciphertext), params)) == fpe.decrypt(ciphertext, params)
+
+
+def test_encrypt_stream_splits_multi_byte_chars(ff31_256_alphanumeric: Fpe) -> None:
+    fpe = ff31_256_alphanumeric
+    params = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+    plaintext = "Blåbærsyltetøy på brødskiva 😀".encode()
+
+    parts = (plaintext[i : i + 1] for i in range(len(plaintext)))
+    ciphertext = b"".join(fpe.encrypt_stream(parts, params))
+    assert ciphertext == fpe.encrypt(plaintext, params)
+    assert b"".join(fpe.decrypt_stream([ciphertext[:5], ciphertext[5:]], params)) == plaintext
+
+
+def test_stream_of_mostly_non_alphabet_chars_is_bounded(ff31_256_alphanumeric: Fpe) -> None:
+    fpe = ff31_256_alphanumeric
+    params = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+    plaintext = ("Ab1 " + "·" * 1000).encode() * 2000 + b"Tail of the stream"
+
+    parts = list(fpe.encrypt_stream(io.BytesIO(plaintext), params, read_size=4096))
+    # Non-alphabet characters are not held back until a window of alphabet characters is complete
+    assert max(len(part.decode()) for part in parts) <= 2 * _STREAM_MAX_PENDING
+    ciphertext = b"".join(parts)
+    assert ciphertext == fpe.encrypt(plaintext, params)
+    assert b"".join(fpe.decrypt_stream(io.BytesIO(ciphertext), params, read_size=100_000)) == plaintext
+
+
+@pytest.mark.parametrize(
+    "alphabet,plaintext",
+    [
+        (CharacterGroup.ALPHANUMERIC, ("Ab1 " + "·" * 100_000) * 20 + "Tail of the stream"),
+        (CharacterGroup.ALPHANUMERIC, "Ola" + "中" * 70_000),
+        (CharacterGroup.ALPHANUMERIC, "Ola" + "中" * 70_000 + "fur" + "中" * 70_000),
+        (CharacterGroup.DIGITS, "12" + "-" * 70_000 + "345" + "-" * 70_000 + "6"),
+        (CharacterGroup.DIGITS, "12345" + "-" * 70_000 + "678"),
+    ],
+    ids=["sparse", "short", "short-split", "digits-split", "digits-below-min-length"],
+)
+def test_stream_of_sparse_alphabet_chars_equals_encrypt(alphabet: str, plaintext: str) -> None:
+    # Fewer alphabet characters than a chunk, or than the min length, between long runs of non-alphabet characters
+    fpe = FpeFf3(key=bytes(range(32)), alphabet=alphabet)
+    params = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+    ciphertext = b"".join(fpe.encrypt_stream(io.BytesIO(plaintext.encode()), params, read_size=4096))
+    assert ciphertext == fpe.encrypt(plaintext.encode(), params)
+    assert b"".join(fpe.decrypt_stream(io.BytesIO(ciphertext), params, read_size=4096)) == plaintext.encode()
+
+
+def test_encrypt_stream_with_fail(ff31_256_alphanumeric: Fpe) -> None:
+    fpe = ff31_256_alphanumeric
+    params = FpeParams(strategy=UnknownCharacterStrategy.FAIL)
+    assert b"".join(fpe.encrypt_stream([b"Foo", b"bar"], params)) == b"b7kOqd"
+    with pytest.raises(ValueError):
+        b"".join(fpe.encrypt_stream([b"Foo", b" bar"], params))
@@ -0,0 +1,82 @@
+"""Unit tests for the multi-tenant keyring."""
+import io
+import pathlib
+import typing as t
+
+import pytest
+import tink
+from tink import JsonKeysetWriter
+from tink import cleartext_keyset_handle
+
+import tink_fpe
+from tink_fpe import Fpe
+from tink_fpe import FpeKeyring
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import fpe_key_templates
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+TENANTS = ["acme", "globex", "initech"]
+
+
+def _new_keyset_json() -> str:
+    out = io.StringIO()
+    cleartext_keyset_handle.write(
+        JsonKeysetWriter(out), tink.new_keyset_handle(fpe_key_templates.FPE_FF31_256_ALPHANUMERIC)
+    )
+    return out.getvalue()
+
+
+@pytest.fixture(scope="module")
+def keysets() -> t.Dict[str, str]:
+    tink_fpe.register()
+    return {tenant: _new_keyset_json() for tenant in TENANTS}
+
+
+@pytest.fixture()
+def keyset_dir(tmp_path: pathlib.Path, keysets: t.Dict[str, str]) -> pathlib.Path:
+    for tenant, keyset in keysets.items():
+        (tmp_path / f"{tenant}.json").write_text(keyset)
+    return tmp_path
+
+
+def test_batch_uses_key_per_row(keyset_dir: pathlib.Path) -> None:
+    keyring = FpeKeyring(keyset_dir)
+    key_refs = ["acme", "globex", "acme", "initech", "globex", "acme"]
+    plaintexts = [b"Alice Liddell", b"Alice Liddell", b"Bob Builder", b"Alice Liddell", b"Charlie", b"Alice Liddell"]
+
+    ciphertexts = keyring.encrypt_batch(key_refs, plaintexts, PARAMS)
+    assert ciphertexts == [keyring.encrypt(k, p, PARAMS) for k, p in zip(key_refs, plaintexts)]
+    assert len({ciphertexts[0], ciphertexts[1], ciphertexts[3]}) == 3
+    assert keyring.decrypt_batch(key_refs, ciphertexts, PARAMS) == plaintexts
+
+
+def test_primitives_are_cached(keysets: t.Dict[str, str]) -> None:
+    loads: t.List[str] = []
+
+    def load(key_ref: str) -> str:
+        loads.append(key_ref)
+        return keysets[key_ref]
+
+    keyring = FpeKeyring(load, max_size=2)
+    acme: Fpe = keyring.primitive("acme")
+    assert keyring.primitive("acme") is acme
+    keyring.primitive("globex")
+    keyring.primitive("initech")  # evicts acme, the least recently used
+    keyring.primitive("globex")
+    keyring.primitive("acme")
+    assert loads == ["acme", "globex", "initech", "acme"]
+    assert keyring.metrics.get("keyring.hits") == 2
+    assert keyring.metrics.get("keyring.evictions") == 2
+    assert keyring.metrics.get("keyring.size") == 2
+
+
+def test_invalid_key_refs(keyset_dir: pathlib.Path) -> None:
+    keyring = FpeKeyring(keyset_dir)
+    with pytest.raises(ValueError):
+        keyring.primitive("../acme")
+    with pytest.raises(FileNotFoundError):
+        keyring.primitive("unknown")
+    with pytest.raises(ValueError):
+        keyring.encrypt_batch(["acme"], [b"Foo", b"Bar"], PARAMS)
@@ -0,0 +1,155 @@
+"""Unit tests for the cache of unwrapped keysets, using a local fake of a KMS backed AEAD."""
+import io
+import threading
+import typing as t
+
+import pytest
+import tink
+from tink import JsonKeysetWriter
+from tink import aead
+
+import tink_fpe
+from tink_fpe import FpeParams
+from tink_fpe import KeysetCache
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import fpe_key_templates
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+PLAINTEXT = b"Keysets unwrapped once"
+
+
+class _FakeKmsAead(aead.Aead):  # type: ignore
+    """An AEAD that counts the keysets it unwraps, and can be made to hang or fail like a remote KMS."""
+
+    def __init__(self) -> None:
+        self._aead = tink.new_keyset_handle(aead.aead_key_templates.AES128_GCM).primitive(aead.Aead)
+        self.decryptions = 0
+        self.started = threading.Event()
+        self.released = threading.Event()
+        self.released.set()
+        self.failing = False
+
+    def encrypt(self, plaintext: bytes, associated_data: bytes) -> bytes:
+        return t.cast(bytes, self._aead.encrypt(plaintext, associated_data))
+
+    def decrypt(self, ciphertext: bytes, associated_data: bytes) -> bytes:
+        self.decryptions += 1
+        self.started.set()
+        assert self.released.wait(5)
+        if self.failing:
+            raise tink.TinkError("KMS unavailable")
+        return t.cast(bytes, self._aead.decrypt(ciphertext, associated_data))
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _wrapped_keyset(kms: _FakeKmsAead) -> str:
+    out = io.StringIO()
+    tink.new_keyset_handle(fpe_key_templates.FPE_FF31_256_ALPHANUMERIC).write(JsonKeysetWriter(out), kms)
+    return out.getvalue()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def register_tink_fpe() -> None:
+    tink_fpe.register()
+    aead.register()
+
+
+@pytest.fixture()
+def kms() -> _FakeKmsAead:
+    return _FakeKmsAead()
+
+
+@pytest.fixture()
+def keysets(kms: _FakeKmsAead) -> t.Dict[str, str]:
+    wrapped = {tenant: _wrapped_keyset(kms) for tenant in ["acme", "globex"]}
+    kms.decryptions = 0  # wrapping a keyset decrypts it to verify it
+    return wrapped
+
+
+def test_concurrent_loads_are_collapsed(kms: _FakeKmsAead, keysets: t.Dict[str, str]) -> None:
+    cache = KeysetCache(keysets.__getitem__, master_key_aead=kms)
+    kms.released.clear()
+    primitives: t.List[t.Any] = []
+    threads = [threading.Thread(target=lambda: primitives.append(cache.primitive("acme"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    assert kms.started.wait(5)
+    kms.released.set()
+    for thread in threads:
+        thread.join()
+
+    assert kms.decryptions == 1
+    assert len(primitives) == 8 and all(p is primitives[0] for p in primitives)
+    assert cache.primitive("acme").decrypt(cache.primitive("acme").encrypt(PLAINTEXT, PARAMS), PARAMS) == PLAINTEXT
+    assert cache.metrics.get("keyset_cache.loads") == 1
+
+
+def test_keysets_are_refreshed_in_the_background(kms: _FakeKmsAead, keysets: t.Dict[str, str]) -> None:
+    clock = _Clock()
+    with KeysetCache(keysets.__getitem__, master_key_aead=kms, ttl=10, refresh_after=5, clock=clock) as cache:
+        loaded = cache.primitive("acme")
+        clock.now = 6
+        kms.started.clear()
+        kms.released.clear()
+        # The refresh hangs on the KMS, but the cached keyset is returned meanwhile
+        assert cache.primitive("acme") is loaded
+        assert kms.started.wait(5)
+        assert cache.primitive("acme") is loaded
+        kms.released.set()
+    assert kms.decryptions == 2
+    assert cache.metrics.get("keyset_cache.refreshes") == 1
+
+    refreshed = cache.primitive("acme")
+    assert refreshed is not loaded
+    clock.now = 12  # the refreshed keyset expires at 16
+    assert cache.primitive("acme") is refreshed
+    clock.now = 16
+    assert cache.primitive("acme") is not refreshed
+    assert kms.decryptions == 3
+
+
+def test_failed_refresh_keeps_keyset_until_expiry(kms: _FakeKmsAead, keysets: t.Dict[str, str]) -> None:
+    clock = _Clock()
+    failures: t.List[str] = []
+    cache = KeysetCache(keysets.__getitem__, master_key_aead=kms, ttl=10, refresh_after=5, clock=clock)
+    cache.metrics.add_listener(lambda event, attributes: failures.append(event))
+    loaded = cache.primitive("acme")
+    kms.failing = True
+    clock.now = 6
+    assert cache.primitive("acme") is loaded
+    cache.close()
+    assert failures == ["refresh_failed"]
+
+    clock.now = 10
+    with pytest.raises(tink.TinkError, match="KMS unavailable"):
+        cache.primitive("acme")
+    assert failures == ["refresh_failed", "load_failed"]
+
+
+def test_prefetch_and_eviction(kms: _FakeKmsAead, keysets: t.Dict[str, str]) -> None:
+    with KeysetCache(keysets.__getitem__, master_key_aead=kms, max_size=1) as cache:
+        cache.prefetch(["acme", "acme"])
+    assert kms.decryptions == 1
+    cache.primitive("acme")
+    assert cache.metrics.get("keyset_cache.hits") == 1
+    cache.primitive("globex")  # evicts acme
+    cache.primitive("acme")
+    assert kms.decryptions == 3
+    assert cache.metrics.get("keyset_cache.evictions") == 2
+
+
+def test_invalid_arguments() -> None:
+    with pytest.raises(ValueError):
+        KeysetCache(lambda key_ref: "", ttl=0)
+    with pytest.raises(ValueError):
+        KeysetCache(lambda key_ref: "", ttl=10, refresh_after=20)
+    with pytest.raises(ValueError):
+        KeysetCache(lambda key_ref: "", max_size=0)
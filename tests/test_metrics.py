@@ -0,0 +1,28 @@
+"""Unit tests for the metrics surface."""
+import typing as t
+
+from tink_fpe import Metrics
+
+
+def test_counters_and_gauges() -> None:
+    metrics = Metrics()
+    metrics.increment("calls")
+    metrics.increment("calls", 2)
+    metrics.set("duration", 0.5)
+    assert metrics.get("calls") == 3
+    assert metrics.get("missing") == 0
+    assert metrics.snapshot() == {"calls": 3, "duration": 0.5}
+
+
+def test_listeners() -> None:
+    metrics = Metrics()
+    events: t.List[t.Tuple[str, t.Mapping[str, t.Any]]] = []
+
+    def listener(event: str, attributes: t.Mapping[str, t.Any]) -> None:
+        events.append((event, attributes))
+
+    metrics.add_listener(listener)
+    metrics.emit("swap", duration_seconds=1.0)
+    metrics.remove_listener(listener)
+    metrics.emit("swap", duration_seconds=2.0)
+    assert events == [("swap", {"duration_seconds": 1.0})]
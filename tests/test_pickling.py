@@ -0,0 +1,90 @@
+"""Unit tests for pickling of Fpe primitives."""
+import pickle  # noqa: S403
+import typing as t
+from concurrent.futures import ProcessPoolExecutor
+from typing import cast
+
+import pytest
+import tink
+from tink import JsonKeysetReader
+from tink import aead
+from tink import cleartext_keyset_handle
+
+import tink_fpe
+from tink_fpe import Fpe
+from tink_fpe import FpeParams
+from tink_fpe import SealedFpe
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+KEYSET = '{"primaryKeyId":832997605,"key":[{"keyData":{"typeUrl":"type.googleapis.com/ssb.crypto.tink.FpeFfxKey","value":"EiCCNkK81HHmUY4IjEzXDrGLOT5t+7PGQ1eIyrGqGa4S3BpCEAIaPjAxMjM0NTY3ODlBQkNERUZHSElKS0xNTk9QUVJTVFVWV1hZWmFiY2RlZmdoaWprbG1ub3BxcnN0dXZ3eHl6","keyMaterialType":"SYMMETRIC"},"status":"ENABLED","keyId":832997605,"outputPrefixType":"RAW"}]}'
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+
+aead.register()
+_kek = tink.new_keyset_handle(aead.aead_key_templates.AES128_GCM).primitive(aead.Aead)
+_kek_calls: t.List[int] = []
+
+
+def local_kek() -> aead.Aead:
+    """Return a local AEAD, standing in for a KMS backed KEK."""
+    _kek_calls.append(1)
+    return _kek
+
+
+def _encrypt_in_worker(fpe: Fpe, plaintext: bytes) -> bytes:
+    return fpe.encrypt(plaintext, PARAMS)
+
+
+@pytest.fixture(scope="module")
+def wrapped_fpe() -> Fpe:
+    tink_fpe.register()
+    keyset_handle = cleartext_keyset_handle.read(JsonKeysetReader(KEYSET))
+    return cast(Fpe, keyset_handle.primitive(Fpe))
+
+
+def test_pickle_fpe_ff3() -> None:
+    fpe = FpeFf3(key=bytes(range(32)), alphabet=tink_fpe.CharacterGroup.ALPHANUMERIC)
+    restored = pickle.loads(pickle.dumps(fpe))  # noqa: S301
+    assert restored.encrypt(b"Foo bar", PARAMS) == fpe.encrypt(b"Foo bar", PARAMS)
+
+    # Unpickling the same primitive again within the process yields the same instance
+    assert pickle.loads(pickle.dumps(fpe)) is restored  # noqa: S301
+
+
+def test_pickle_wrapped_fpe(wrapped_fpe: Fpe) -> None:
+    restored = pickle.loads(pickle.dumps(wrapped_fpe))  # noqa: S301
+    ciphertext = restored.encrypt(b"Foo bar", PARAMS)
+    assert ciphertext == b"b7k Oqd"
+    assert restored.decrypt(ciphertext, PARAMS) == b"Foo bar"
+    assert pickle.loads(pickle.dumps(wrapped_fpe)) is restored  # noqa: S301
+
+
+def test_wrapped_fpe_in_worker_processes(wrapped_fpe: Fpe) -> None:
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        ciphertexts = list(executor.map(_encrypt_in_worker, [wrapped_fpe] * 3, [b"Foobar", b"Foo bar", b"abcd"]))
+    assert ciphertexts == [b"b7kOqd", b"b7k Oqd", b"NcFL"]
+
+
+def test_sealed_fpe(wrapped_fpe: Fpe) -> None:
+    sealed = SealedFpe(wrapped_fpe, local_kek)
+    payload = pickle.dumps(sealed)
+    assert tink_fpe.CharacterGroup.ALPHANUMERIC.encode() in pickle.dumps(wrapped_fpe)
+    assert tink_fpe.CharacterGroup.ALPHANUMERIC.encode() not in payload
+    assert sealed.encrypt(b"Foobar", PARAMS) == b"b7kOqd"
+
+    _kek_calls.clear()
+    restored = pickle.loads(payload)  # noqa: S301
+    assert not _kek_calls, "the KEK should not be used before the primitive is"
+    assert restored.encrypt(b"Foobar", PARAMS) == b"b7kOqd"
+    assert restored.decrypt(b"b7kOqd", PARAMS) == b"Foobar"
+    assert pickle.loads(payload).encrypt(b"Foobar", PARAMS) == b"b7kOqd"  # noqa: S301
+    assert len(_kek_calls) == 1
+
+
+def test_sealed_fpe_rejects_foreign_kek(wrapped_fpe: Fpe) -> None:
+    restored = pickle.loads(pickle.dumps(SealedFpe(wrapped_fpe, local_kek)))  # noqa: S301
+    other_kek = tink.new_keyset_handle(aead.aead_key_templates.AES128_GCM).primitive(aead.Aead)
+    restored._kek_provider = lambda: other_kek
+    with pytest.raises(tink.TinkError):
+        restored.encrypt(b"Foobar", PARAMS)
@@ -0,0 +1,169 @@
+"""Unit tests for the planner of ExecutionMode.AUTO."""
+
+import random
+import typing as t
+
+import pytest
+import tink
+
+import tink_fpe
+from tink_fpe import CharacterGroup
+from tink_fpe import ExecutionMode
+from tink_fpe import ExecutionPlan
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import _planner
+from tink_fpe import pin_plan
+from tink_fpe import planner_metrics
+from tink_fpe._batch import execute
+from tink_fpe._fpe_ff3 import FpeFf3
+from tink_fpe._planner import BatchProfile
+from tink_fpe._planner import choose_plan
+from tink_fpe._planner import profile_batch
+
+
+KEY = bytes(range(32))
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+
+
+def _profile(size: int, distinct_ratio: float = 1.0, length: int = 20, conforming_ratio: float = 1.0) -> BatchProfile:
+    return BatchProfile(size, min(size, 1024), distinct_ratio, conforming_ratio, float(length), frozenset([length]))
+
+
+def test_profile_batch() -> None:
+    values = [b"ab-cd", b"ab-cd", b"abcdef", b"xyz"] * 100
+    profile = profile_batch(values, "utf-8", known_chars="abcdefxyz")
+    assert profile.size == 400
+    assert profile.distinct_ratio == pytest.approx(3 / 400)
+    assert profile.conforming_ratio == pytest.approx(0.5)
+    assert profile.lengths == frozenset([3, 4, 6])
+    assert profile.distinct_estimate == 3
+
+
+def test_profile_samples_large_batches() -> None:
+    profile = profile_batch([str(i).encode() for i in range(100_000)], "utf-8", sample_size=100)
+    assert profile.sample_size == 100
+    assert profile.distinct_ratio == 1.0
+
+
+def test_profile_estimates_distinct_values_of_large_batches() -> None:
+    # Nearly all sampled values are distinct, but the batch has 20 duplicates of each value on average
+    rng = random.Random(0)  # noqa: S311 - reproducible test data, not key material
+    values = [b"%04d" % rng.randrange(10_000) for _ in range(200_000)]
+    profile = profile_batch(values, "utf-8")
+    assert profile.sample_size == 1024
+    assert 5_000 <= profile.distinct_estimate <= 20_000
+    plan = choose_plan(profile, radix=10, max_codebook_domain=10_000, min_length=4)
+    assert plan == ExecutionPlan(ExecutionMode.SERIAL, 1, dedup=True, codebook_threshold=10_000)
+    assert choose_plan(profile, max_workers=8).dedup
+
+
+def test_choose_vectorized_for_small_batches() -> None:
+    plan = choose_plan(_profile(1000), max_workers=8, radix=62, picklable=True)
+    assert plan == ExecutionPlan(ExecutionMode.SERIAL, 1, dedup=False)
+    assert plan.strategy == "vectorized"
+
+
+def test_choose_pool_for_large_batches() -> None:
+    assert choose_plan(_profile(20_000), max_workers=8) == ExecutionPlan(ExecutionMode.THREAD, 4, dedup=False)
+    assert choose_plan(_profile(20_000, distinct_ratio=0.5), max_workers=8).dedup
+    plan = choose_plan(_profile(1_000_000), max_workers=8, radix=62, picklable=True)
+    assert plan == ExecutionPlan(ExecutionMode.PROCESS, 8, dedup=False)
+    assert plan.strategy == "process"
+
+
+def test_choose_codebook_for_small_domains() -> None:
+    plan = choose_plan(_profile(50_000, length=4), radix=10, max_codebook_domain=10**6, min_length=4)
+    assert plan == ExecutionPlan(ExecutionMode.SERIAL, 1, dedup=False, codebook_threshold=10_000)
+    assert plan.strategy == "codebook"
+    # Building the codebook would cost more than encrypting the distinct values
+    assert choose_plan(_profile(2_000, length=4), radix=10, max_codebook_domain=10**6, min_length=4) == ExecutionPlan(
+        ExecutionMode.SERIAL, 1, dedup=False
+    )
+    assert choose_plan(_profile(2_000_000, length=7), radix=10, max_codebook_domain=10**8).codebook_threshold == 0
+    # The primitive does not allow codebooks for the domain
+    assert choose_plan(_profile(50_000, length=4), radix=10, min_length=4).codebook_threshold == 0
+    assert choose_plan(_profile(50_000, length=4), radix=10, max_codebook_domain=1000).codebook_threshold == 0
+
+
+def test_choose_serial_when_failing() -> None:
+    profile = _profile(1_000_000, conforming_ratio=0.99)
+    assert choose_plan(profile, max_workers=8, fail_fast=True).mode == ExecutionMode.SERIAL
+    assert choose_plan(profile, max_workers=8).mode == ExecutionMode.THREAD
+
+
+def test_auto_matches_serial() -> None:
+    fpe = FpeFf3(key=KEY, alphabet=CharacterGroup.ALPHANUMERIC)
+    plaintexts = [f"Value #{i % 3000}, with some padding".encode() for i in range(12_000)]
+    expected = fpe.encrypt_batch(plaintexts, PARAMS)
+    ciphertexts = fpe.encrypt_batch(plaintexts, PARAMS, mode=ExecutionMode.AUTO, max_workers=2)
+    assert ciphertexts == expected
+    assert fpe.decrypt_batch(ciphertexts, PARAMS, mode=ExecutionMode.AUTO, max_workers=2) == plaintexts
+
+
+def test_auto_builds_codebooks(monkeypatch: pytest.MonkeyPatch) -> None:
+    # FF3-1 domains are at least 10^6, so let a codebook pay off for a smaller batch than it normally would
+    monkeypatch.setattr(_planner, "_CODEBOOK_PAYOFF", 1000)
+    plaintexts = [f"{i * 397:06d}".encode() for i in range(1000)] * 2
+    fpe = FpeFf3(key=KEY, alphabet=CharacterGroup.DIGITS)
+    fpe.encrypt_batch(plaintexts, PARAMS, mode=ExecutionMode.AUTO)
+    assert not fpe._codebooks  # codebooks are only built up to the threshold of the primitive
+
+    fpe = FpeFf3(key=KEY, alphabet=CharacterGroup.DIGITS, codebook_threshold=10**6)
+    ciphertexts = fpe.encrypt_batch(plaintexts, PARAMS, mode=ExecutionMode.AUTO)
+    assert len(fpe._codebooks) == 1
+    assert ciphertexts == FpeFf3(key=KEY, alphabet=CharacterGroup.DIGITS).encrypt_batch(plaintexts, PARAMS)
+    assert fpe.decrypt_batch(ciphertexts, PARAMS, mode=ExecutionMode.AUTO) == plaintexts
+
+
+def test_auto_with_keyset() -> None:
+    tink_fpe.register()
+    fpe = tink.new_keyset_handle(tink_fpe.fpe_key_templates.FPE_FF31_256_ALPHANUMERIC).primitive(tink_fpe.Fpe)
+    plaintexts = [f"Value #{i}".encode() for i in range(100)]
+    ciphertexts = fpe.encrypt_batch(plaintexts, PARAMS, mode=ExecutionMode.AUTO)
+    assert ciphertexts == fpe.encrypt_batch(plaintexts, PARAMS)
+    assert fpe.decrypt_batch(ciphertexts, PARAMS, mode=ExecutionMode.AUTO) == plaintexts
+
+
+def test_pinned_plan_is_recorded() -> None:
+    fpe = FpeFf3(key=KEY, alphabet=CharacterGroup.ALPHANUMERIC)
+    plaintexts = [f"Value #{i}".encode() for i in range(100)]
+    events: t.List[t.Tuple[str, t.Mapping[str, t.Any]]] = []
+
+    def listener(event: str, attributes: t.Mapping[str, t.Any]) -> None:
+        events.append((event, attributes))
+
+    planner_metrics.add_listener(listener)
+    try:
+        before = planner_metrics.get("planner.plans.thread")
+        with pin_plan(ExecutionPlan(ExecutionMode.THREAD, max_workers=2)) as plan:
+            ciphertexts = fpe.encrypt_batch(plaintexts, PARAMS, mode=ExecutionMode.AUTO)
+    finally:
+        planner_metrics.remove_listener(listener)
+
+    assert ciphertexts == fpe.encrypt_batch(plaintexts, PARAMS)
+    assert planner_metrics.get("planner.plans.thread") == before + 1
+    assert planner_metrics.get("planner.last_throughput") > 0
+    [(event, attributes)] = events
+    assert event == "batch_plan"
+    assert attributes["plan"] == plan
+    assert attributes["profile"] is None
+    assert attributes["values"] == 100
+
+
+def test_pin_plan_requires_concrete_mode() -> None:
+    with pytest.raises(ValueError):
+        with pin_plan(ExecutionPlan(ExecutionMode.AUTO)):
+            pass
+
+
+def test_execute_without_dedup() -> None:
+    values = [b"a", b"b", b"a", b"c"]
+    assert execute(lambda batch: [v.upper() for v in batch], values, ExecutionMode.THREAD, 2, dedup=False) == [
+        b"A",
+        b"B",
+        b"A",
+        b"C",
+    ]
+    with pytest.raises(ValueError):
+        execute(lambda batch: batch, values, ExecutionMode.AUTO)
@@ -0,0 +1,76 @@
+"""Unit tests for filtering of encrypted data by plaintext values."""
+import io
+import json
+import pathlib
+import typing as t
+from typing import cast
+
+import pytest
+import tink
+from tink import JsonKeysetReader
+from tink import JsonKeysetWriter
+from tink import cleartext_keyset_handle
+
+import tink_fpe
+from tink_fpe import CharacterGroup
+from tink_fpe import Fpe
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import encrypt_dataset
+from tink_fpe import encrypt_filter
+from tink_fpe import fpe_key_templates
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+
+
+def _keyset_json(template: t.Any) -> t.Dict[str, t.Any]:
+    out = io.StringIO()
+    cleartext_keyset_handle.write(JsonKeysetWriter(out), tink.new_keyset_handle(template))
+    return cast(t.Dict[str, t.Any], json.loads(out.getvalue()))
+
+
+def _primitive_of(keyset: t.Dict[str, t.Any]) -> Fpe:
+    return cast(Fpe, cleartext_keyset_handle.read(JsonKeysetReader(json.dumps(keyset))).primitive(Fpe))
+
+
+@pytest.fixture(scope="module")
+def rotated_keysets() -> t.Tuple[Fpe, Fpe]:
+    """Return a primitive for an old keyset, and one for the keyset after a key rotation."""
+    tink_fpe.register()
+    old = _keyset_json(fpe_key_templates.FPE_FF31_256_ALPHANUMERIC)
+    rotated = _keyset_json(fpe_key_templates.FPE_FF31_256_ALPHANUMERIC)
+    rotated["key"] += old["key"]
+    return _primitive_of(old), _primitive_of(rotated)
+
+
+def test_filter_matches_data_encrypted_with_any_key(rotated_keysets: t.Tuple[Fpe, Fpe]) -> None:
+    old_fpe, rotated_fpe = rotated_keysets
+    data = [old_fpe.encrypt(b"Alice Liddell", PARAMS), rotated_fpe.encrypt(b"Alice Liddell", PARAMS)]
+    data += [old_fpe.encrypt(b"Bob Builder", PARAMS), rotated_fpe.encrypt(b"Bob Builder", PARAMS)]
+
+    encrypted_filter = encrypt_filter(rotated_fpe, [b"Alice Liddell", b"Alice Liddell", b"Nobody"], PARAMS)
+    assert len(encrypted_filter) == 4
+    assert [value in encrypted_filter for value in data] == [True, True, False, False]
+
+
+def test_filter_integers() -> None:
+    fpe = FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.DIGITS)
+    encrypted_filter = encrypt_filter(fpe, [123456, -987654], PARAMS)
+    assert len(encrypted_filter) == 2
+    assert all(isinstance(value, int) and abs(value) < 10**6 for value in encrypted_filter.ciphertexts)
+
+
+def test_filter_arrow_dataset(tmp_path: pathlib.Path) -> None:
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    ds = pytest.importorskip("pyarrow.dataset")
+    fpe = FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.ALPHANUMERIC)
+    names = [f"Person {i:05d}" for i in range(1000)]
+    pq.write_table(pa.table({"id": list(range(1000)), "name": names}), tmp_path / "source.parquet")
+    encrypt_dataset(fpe, tmp_path / "source.parquet", tmp_path / "encrypted.parquet", ["name"], PARAMS)
+
+    encrypted_filter = encrypt_filter(fpe, ["Person 00042", "Person 00999"], PARAMS)
+    dataset = ds.dataset(tmp_path / "encrypted.parquet")
+    assert dataset.to_table(filter=encrypted_filter.to_arrow("name")).column("id").to_pylist() == [42, 999]
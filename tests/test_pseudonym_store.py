@@ -0,0 +1,105 @@
+"""Unit tests for the persistent pseudonym store."""
+import pathlib
+import sqlite3
+import threading
+import typing as t
+
+import pytest
+
+from tink_fpe import CharacterGroup
+from tink_fpe import ExecutionMode
+from tink_fpe import FpeParams
+from tink_fpe import PseudonymStore
+from tink_fpe import StoredFpe
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+INDEX_KEY = bytes(range(100, 132))
+PLAINTEXTS = [b"Alice Liddell", b"Bob Builder", b"Alice Liddell", b"Charlie Brown"]
+
+
+@pytest.fixture(scope="module")
+def fpe() -> FpeFf3:
+    return FpeFf3(key=bytes(range(32)), alphabet=CharacterGroup.ALPHANUMERIC)
+
+
+def test_ciphertexts_are_stored_across_runs(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    path = tmp_path / "pseudonyms.db"
+    expected = [fpe.encrypt(plaintext, PARAMS) for plaintext in PLAINTEXTS]
+
+    first_run = StoredFpe(fpe, PseudonymStore(path), key_id="1", index_key=INDEX_KEY)
+    assert first_run.encrypt_batch(PLAINTEXTS, PARAMS) == expected
+    assert first_run.metrics.snapshot() == {"store.hits": 0, "store.misses": 3}
+
+    second_run = StoredFpe(fpe, PseudonymStore(path), key_id="1", index_key=INDEX_KEY)
+    assert second_run.encrypt_batch(PLAINTEXTS, PARAMS, mode=ExecutionMode.THREAD) == expected
+    assert second_run.encrypt(b"Bob Builder", PARAMS) == expected[1]
+    assert second_run.metrics.snapshot() == {"store.hits": 4, "store.misses": 0}
+    assert second_run.decrypt_batch(expected, PARAMS) == PLAINTEXTS
+
+
+def test_plaintexts_are_not_stored(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    path = tmp_path / "pseudonyms.db"
+    StoredFpe(fpe, PseudonymStore(path), key_id="1", index_key=INDEX_KEY).encrypt_batch(PLAINTEXTS, PARAMS)
+    assert b"Alice" not in path.read_bytes() + (tmp_path / "pseudonyms.db-wal").read_bytes()
+
+
+def test_entries_depend_on_key_id_and_params(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    store = PseudonymStore(tmp_path / "pseudonyms.db")
+    StoredFpe(fpe, store, key_id="1", index_key=INDEX_KEY).encrypt_batch(PLAINTEXTS, PARAMS)
+    StoredFpe(fpe, store, key_id="2", index_key=INDEX_KEY).encrypt_batch(PLAINTEXTS, PARAMS)
+    tweaked = FpeParams(strategy=UnknownCharacterStrategy.SKIP, tweak=b"1234567")
+    StoredFpe(fpe, store, key_id="1", index_key=INDEX_KEY).encrypt_batch(PLAINTEXTS, tweaked)
+    assert len(store) == 9
+
+    assert store.invalidate("1") == 6
+    assert len(store) == 3
+
+
+def test_warm_up_and_eviction(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    store = PseudonymStore(tmp_path / "pseudonyms.db", max_entries=100)
+    stored_fpe = StoredFpe(fpe, store, key_id="1", index_key=INDEX_KEY)
+    stored_fpe.warm_up((b"Person %06d" % i for i in range(250)), PARAMS, batch_size=60)
+    assert len(store) == 100
+
+    stored_fpe.encrypt_batch([b"Person %06d" % i for i in range(150, 250)], PARAMS)
+    assert stored_fpe.metrics.get("store.hits") == 100
+
+
+def test_eviction_is_first_in_first_out(tmp_path: pathlib.Path) -> None:
+    store = PseudonymStore(tmp_path / "pseudonyms.db", max_entries=3)
+    store.put_many("1", [(b"a", b"A"), (b"b", b"B"), (b"c", b"C")])
+    assert store.get_many("1", [b"a"]) == {b"a": b"A"}  # lookups do not keep an entry from being evicted
+    store.put_many("1", [(b"d", b"D"), (b"a", b"A")])
+    assert store.get_many("1", [b"a", b"b", b"c", b"d"]) == {b"b": b"B", b"c": b"C", b"d": b"D"}
+
+    store.put_many("1", [(b"e", b"E"), (b"f", b"F"), (b"g", b"G"), (b"h", b"H")])
+    assert sorted(store.get_many("1", [b"e", b"f", b"g", b"h"])) == [b"f", b"g", b"h"]
+    assert len(store) == 3
+
+
+def test_concurrent_use(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    stored_fpe = StoredFpe(fpe, PseudonymStore(tmp_path / "pseudonyms.db"), key_id="1", index_key=INDEX_KEY)
+    results: t.List[t.List[bytes]] = []
+    errors: t.List[BaseException] = []
+
+    def run() -> None:
+        try:
+            results.append(stored_fpe.encrypt_batch(PLAINTEXTS, PARAMS))
+        except sqlite3.Error as e:  # pragma: no cover
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert all(result == results[0] for result in results)
+
+
+def test_index_key_must_be_long_enough(tmp_path: pathlib.Path, fpe: FpeFf3) -> None:
+    with pytest.raises(ValueError):
+        StoredFpe(fpe, PseudonymStore(tmp_path / "pseudonyms.db"), key_id="1", index_key=b"short")
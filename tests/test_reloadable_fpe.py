@@ -0,0 +1,181 @@
+"""Unit tests for hot reloading of keysets."""
+import io
+import json
+import pathlib
+import threading
+import typing as t
+from typing import cast
+
+import pytest
+import tink
+from tink import JsonKeysetReader
+from tink import JsonKeysetWriter
+from tink import aead
+from tink import cleartext_keyset_handle
+
+import tink_fpe
+from tink_fpe import Fpe
+from tink_fpe import FpeParams
+from tink_fpe import Metrics
+from tink_fpe import ReloadableFpe
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import fpe_key_templates
+from tink_fpe._fpe_ff3 import FpeFf3
+from tink_fpe._reloadable_fpe import warm_up
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+PLAINTEXT = b"Hot reload of keysets"
+
+
+def _new_keyset() -> tink.KeysetHandle:
+    return tink.new_keyset_handle(fpe_key_templates.FPE_FF31_256_ALPHANUMERIC)
+
+
+def _to_json(keyset_handle: tink.KeysetHandle, master_key_aead: t.Optional[aead.Aead] = None) -> str:
+    out = io.StringIO()
+    if master_key_aead is None:
+        cleartext_keyset_handle.write(JsonKeysetWriter(out), keyset_handle)
+    else:
+        keyset_handle.write(JsonKeysetWriter(out), master_key_aead)
+    return out.getvalue()
+
+
+def _primitive_of(keyset_json: str) -> Fpe:
+    return cast(Fpe, cleartext_keyset_handle.read(JsonKeysetReader(keyset_json)).primitive(Fpe))
+
+
+def _swap_event(metrics: Metrics) -> threading.Event:
+    swapped = threading.Event()
+    metrics.add_listener(lambda event, attributes: swapped.set() if event == "swap" else None)
+    return swapped
+
+
+@pytest.fixture(scope="module", autouse=True)
+def register_tink_fpe() -> None:
+    tink_fpe.register()
+    aead.register()
+
+
+def test_reload_from_file(tmp_path: pathlib.Path) -> None:
+    old_keyset, new_keyset = _to_json(_new_keyset()), _to_json(_new_keyset())
+    path = tmp_path / "keyset.json"
+    path.write_text(old_keyset)
+    metrics = Metrics()
+
+    with ReloadableFpe(path, poll_interval=0.01, metrics=metrics) as fpe:
+        ciphertext = fpe.encrypt(PLAINTEXT, PARAMS)
+        assert ciphertext == _primitive_of(old_keyset).encrypt(PLAINTEXT, PARAMS)
+        assert fpe.decrypt_batch(fpe.encrypt_batch([PLAINTEXT], PARAMS), PARAMS) == [PLAINTEXT]
+
+        swapped = _swap_event(metrics)
+        path.write_text(new_keyset)
+        assert swapped.wait(timeout=10)
+
+        assert fpe.encrypt(PLAINTEXT, PARAMS) == _primitive_of(new_keyset).encrypt(PLAINTEXT, PARAMS)
+        assert metrics.get("reload.count") == 2
+        assert metrics.get("swap.count") == 2
+        assert metrics.get("reload.last_duration_seconds") > 0
+
+
+def test_reload_is_skipped_if_unchanged(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "keyset.json"
+    path.write_text(_to_json(_new_keyset()))
+    fpe = ReloadableFpe(path, poll_interval=0)
+    current = fpe.current
+    assert not fpe.reload()
+    assert fpe.current is current
+    assert fpe.metrics.get("reload.count") == 1
+
+
+def test_failed_reload_keeps_current_primitive(tmp_path: pathlib.Path) -> None:
+    keyset = _to_json(_new_keyset())
+    path = tmp_path / "keyset.json"
+    path.write_text(keyset)
+    metrics = Metrics()
+    failed = threading.Event()
+    metrics.add_listener(lambda event, attributes: failed.set() if event == "reload_failed" else None)
+
+    with ReloadableFpe(path, poll_interval=0.01, metrics=metrics) as fpe:
+        path.write_text("not a keyset")
+        assert failed.wait(timeout=10)
+        assert fpe.encrypt(PLAINTEXT, PARAMS) == _primitive_of(keyset).encrypt(PLAINTEXT, PARAMS)
+        assert metrics.get("reload.failures") >= 1
+
+
+def test_failed_reload_is_recorded_when_called_directly(tmp_path: pathlib.Path) -> None:
+    path = tmp_path / "keyset.json"
+    path.write_text(_to_json(_new_keyset()))
+    fpe = ReloadableFpe(path, poll_interval=0)
+    current = fpe.current
+    errors: t.List[BaseException] = []
+    fpe.metrics.add_listener(lambda event, attributes: errors.append(attributes["error"]))
+
+    path.write_text("not a keyset")
+    with pytest.raises(Exception) as e:  # noqa: B017 - whatever the keyset reader raises
+        fpe.reload()
+    assert fpe.current is current
+    assert fpe.metrics.get("reload.failures") == 1
+    assert errors == [e.value]
+
+
+def test_warm_up_exercises_every_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    old, rotated = json.loads(_to_json(_new_keyset())), json.loads(_to_json(_new_keyset()))
+    rotated["key"] += old["key"]
+    fpe = _primitive_of(json.dumps(rotated))
+    warmed_up: t.List[int] = []
+    encrypt = FpeFf3.encrypt
+
+    def recording_encrypt(self: FpeFf3, plaintext: bytes, params: FpeParams = PARAMS) -> bytes:
+        warmed_up.append(id(self))
+        return encrypt(self, plaintext, params)
+
+    monkeypatch.setattr(FpeFf3, "encrypt", recording_encrypt)
+    warm_up(fpe)
+    assert sorted(warmed_up) == sorted(id(primitive) for primitive in fpe._key_primitives())
+    assert len(set(warmed_up)) == 2
+
+
+def test_reload_encrypted_keyset_from_callable() -> None:
+    # A local AEAD stands in for a KMS backed master key
+    master_key_aead = tink.new_keyset_handle(aead.aead_key_templates.AES128_GCM).primitive(aead.Aead)
+    old_keyset, new_keyset = _new_keyset(), _new_keyset()
+    source = [_to_json(old_keyset, master_key_aead)]
+
+    fpe = ReloadableFpe(lambda: source[0], master_key_aead=master_key_aead, poll_interval=0)
+    assert fpe.encrypt(PLAINTEXT, PARAMS) == _primitive_of(_to_json(old_keyset)).encrypt(PLAINTEXT, PARAMS)
+
+    source[0] = _to_json(new_keyset, master_key_aead)
+    assert fpe.reload()
+    assert fpe.encrypt(PLAINTEXT, PARAMS) == _primitive_of(_to_json(new_keyset)).encrypt(PLAINTEXT, PARAMS)
+
+
+def test_in_flight_calls_complete_on_previous_primitive(tmp_path: pathlib.Path) -> None:
+    old_keyset, new_keyset = _to_json(_new_keyset()), _to_json(_new_keyset())
+    path = tmp_path / "keyset.json"
+    path.write_text(old_keyset)
+    fpe = ReloadableFpe(path, poll_interval=0)
+    previous = fpe.current
+    started, released = threading.Event(), threading.Event()
+    results: t.List[bytes] = []
+
+    def parts() -> t.Iterator[bytes]:
+        yield PLAINTEXT[:10]
+        started.set()
+        assert released.wait(timeout=10)
+        yield PLAINTEXT[10:]
+
+    # The stream is encrypted by the primitive current when the call started, and blocks halfway through
+    call = threading.Thread(target=lambda: results.append(b"".join(fpe.encrypt_stream(parts(), PARAMS))))
+    call.start()
+    assert started.wait(timeout=10)
+    path.write_text(new_keyset)
+    assert fpe.reload()
+    assert fpe.current is not previous
+    released.set()
+    call.join()
+
+    assert results == [b"".join(_primitive_of(old_keyset).encrypt_stream([PLAINTEXT], PARAMS))]
+    assert results[0] != b"".join(_primitive_of(new_keyset).encrypt_stream([PLAINTEXT], PARAMS))
+    assert fpe.decrypt(results[0], PARAMS) != PLAINTEXT
+    assert previous.decrypt(results[0], PARAMS) == PLAINTEXT
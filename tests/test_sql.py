@@ -0,0 +1,89 @@
+"""Unit tests for the FPE functions of SQL engines."""
+import secrets
+import sqlite3
+import typing as t
+
+import pytest
+
+from tink_fpe import CharacterGroup
+from tink_fpe import Fpe
+from tink_fpe import FpeParams
+from tink_fpe import UnknownCharacterStrategy
+from tink_fpe import register_duckdb
+from tink_fpe import register_sqlite
+from tink_fpe._fpe_ff3 import FpeFf3
+
+
+PARAMS = FpeParams(strategy=UnknownCharacterStrategy.SKIP)
+TWEAK = "tenant1"
+ROWS = [
+    ("Alice Liddell", "acme", None),
+    ("Bob Builder", "globex", None),
+    ("Alice Liddell", "acme", TWEAK),
+    (None, "acme", None),
+    ("Alice Liddell", None, None),
+    ("Alice Liddell", "acme", None),
+]
+
+
+@pytest.fixture(scope="module")
+def primitives() -> t.Dict[str, Fpe]:
+    return {
+        key_ref: FpeFf3(key=secrets.token_bytes(32), alphabet=CharacterGroup.ALPHANUMERIC)
+        for key_ref in ("acme", "globex")
+    }
+
+
+def _expected(primitives: t.Dict[str, Fpe]) -> t.List[t.Optional[str]]:
+    expected: t.List[t.Optional[str]] = []
+    for value, key_ref, tweak in ROWS:
+        if value is None or key_ref is None:
+            expected.append(None)
+            continue
+        params = FpeParams(PARAMS.unknown_character_strategy, tweak=(tweak or "").encode())
+        expected.append(primitives[key_ref].encrypt(value.encode(), params).decode())
+    return expected
+
+
+def test_duckdb_functions(primitives: t.Dict[str, Fpe]) -> None:
+    duckdb = pytest.importorskip("duckdb")
+    connection = duckdb.connect()
+    register_duckdb(connection, primitives.__getitem__, PARAMS)
+    connection.execute("CREATE TABLE people (id INTEGER, name VARCHAR, key_ref VARCHAR, tweak VARCHAR)")
+    connection.executemany("INSERT INTO people VALUES (?, ?, ?, ?)", [(i, *row) for i, row in enumerate(ROWS)])
+
+    ciphertexts = [
+        row[0]
+        for row in connection.execute("SELECT fpe_encrypt(name, key_ref, tweak) FROM people ORDER BY id").fetchall()
+    ]
+    assert ciphertexts == _expected(primitives)
+    assert connection.execute(
+        "SELECT count(*) FROM people WHERE fpe_decrypt(fpe_encrypt(name, key_ref, tweak), key_ref, tweak) = name"
+    ).fetchone() == (4,)
+
+
+def test_sqlite_functions(primitives: t.Dict[str, Fpe]) -> None:
+    resolved: t.List[str] = []
+
+    def keys(key_ref: str) -> Fpe:
+        resolved.append(key_ref)
+        return primitives[key_ref]
+
+    connection = sqlite3.connect(":memory:")
+    register_sqlite(connection, keys, PARAMS)
+    connection.execute("CREATE TABLE people (id INTEGER, name TEXT, key_ref TEXT, tweak TEXT)")
+    connection.executemany("INSERT INTO people VALUES (?, ?, ?, ?)", [(i, *row) for i, row in enumerate(ROWS)])
+
+    query = "SELECT fpe_encrypt(name, key_ref, tweak) FROM people ORDER BY id"
+    assert [row[0] for row in connection.execute(query)] == _expected(primitives)
+    assert sorted(resolved) == ["acme", "globex"]
+    assert [row[0] for row in connection.execute(query)] == _expected(primitives)
+    assert len(resolved) == 4  # resolved once per statement
+
+    assert connection.execute(
+        "SELECT fpe_decrypt(fpe_encrypt(?, 'acme', NULL), 'acme', NULL)", (b"Blob",)
+    ).fetchone() == (b"Blob",)
+    with pytest.raises(sqlite3.OperationalError):
+        connection.execute("SELECT fpe_encrypt(12345678, 'acme', NULL)").fetchone()
+    with pytest.raises(sqlite3.OperationalError):  # keys can be rotated, so the functions are not deterministic
+        connection.execute("CREATE INDEX people_pseudonym ON people (fpe_encrypt(name, key_ref, tweak))")
@@ -1,6 +1,9 @@
 """Unit tests for the _util module."""
+import typing as t
+
 import pytest
 
+from tink_fpe import UnknownCharacterStrategy
 from tink_fpe import _util
 
 
@@ -15,3 +18,46 @@ def test_redaction_char_of() -> None:
 
     assert _util.redaction_char_of(ALPHANUMERIC) == "X"
     assert _util.redaction_char_of(DIGITS) == "0"
+
+
+def test_inject_chars() -> None:
+    assert _util.inject_chars("abcd", [(0, "#"), (3, "--"), (8, "!")]) == "#ab--cd!"
+    assert _util.inject_chars("abcd", []) == "abcd"
+    skipper = _util.CharacterSkipper("a b-c!", ALPHANUMERIC)
+    assert skipper.inject_skipped_into(skipper.get_processed_text().upper()) == "A B-C!"
+
+
+def test_analyze() -> None:
+    analysis = _util.analyze(["Foobar", "Foo bar", "", "a - b"], ALPHANUMERIC)
+    assert analysis.valid == [True, False, True, False]
+    assert analysis.unknown_counts == [0, 1, 0, 3]
+
+    assert _util.analyze(["123", "12.3"], DIGITS).valid == [True, False]
+    assert _util.analyze(["", "a"], "").unknown_counts == [0, 1]
+
+
+@pytest.mark.parametrize(
+    "strategy, expected_texts",
+    [
+        (UnknownCharacterStrategy.FAIL, ["Foobar", "Foo bar", "a\\b-c]"]),
+        (UnknownCharacterStrategy.SKIP, ["Foobar", "Foobar", "abc"]),
+        (UnknownCharacterStrategy.DELETE, ["Foobar", "Foobar", "abc"]),
+        (UnknownCharacterStrategy.REDACT, ["Foobar", "Foo\\bar", "a\\b\\c\\"]),
+    ],
+)
+def test_preprocess(strategy: UnknownCharacterStrategy, expected_texts: t.List[str]) -> None:
+    texts = ["Foobar", "Foo bar", "a\\b-c]"]
+    column = _util.preprocess(texts, ALPHANUMERIC, strategy, redaction_char="\\")
+    assert column.texts == expected_texts
+    assert column.valid == [True, False, False]
+    assert column.unknown_counts == [0, 1, 3]
+    if strategy == UnknownCharacterStrategy.SKIP:
+        assert column.skipped == [(), [(3, " ")], [(1, "\\"), (3, "-"), (5, "]")]]
+        assert [_util.inject_chars(x, s) for x, s in zip(column.texts, column.skipped)] == texts
+    else:
+        assert column.skipped == []
+
+
+def test_preprocess_redact_requires_redaction_char() -> None:
+    with pytest.raises(ValueError):
+        _util.preprocess(["a b"], ALPHANUMERIC, UnknownCharacterStrategy.REDACT)